@@ -0,0 +1,478 @@
+"""
+Benchmarks for bigeo.
+
+startup : Runs each bigeo.py algorithm on a tiny input in a fresh interpreter with -X importtime and reports
+the wall time and the import time of the modules each algorithm loads.
+
+run : Generates synthetic point, line and polygon shapefiles at the given scales and vertex counts and times
+each bigeo operation on them in a fresh process. Reports features/sec, peak RSS and per phase timings.
+
+compare : Compares two run reports and lists the operations that got slower than a threshold.
+
+Syntax:
+
+>>>python benchmark.py startup --output startup.json
+
+>>>python benchmark.py run --scales 10000,100000 --vertices 8,64 --output run.json
+
+>>>python benchmark.py compare --baseline old.json --output new.json --threshold 0.1
+
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s :    %(message)s')
+
+BIGEO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bigeo.py')
+
+
+####################### BEGIN SECTION FOR SYNTHETIC DATA ##########################
+
+def _writeSynthetic(path, geometry_type, n, make_coordinates, seed=0, chunksize=10000):
+    """ Writes n synthetic features. make_coordinates(random, start, stop) returns the coordinates of a chunk. """
+
+    import fiona
+    import numpy as np
+    from fiona.crs import CRS
+
+    random = np.random.default_rng(seed)
+
+    schema = {'geometry': geometry_type, 'properties': {'id': 'int', 'name': 'str:16', 'value': 'float', 'day': 'date'}}
+
+    with fiona.open(path, 'w', driver='ESRI Shapefile', crs=CRS.from_epsg(4326), schema=schema) as dst:
+
+        for start in range(0, n, chunksize):
+
+            stop = min(start + chunksize, n)
+            coordinates = make_coordinates(random, start, stop)
+            values = random.random(stop - start).tolist()
+
+            dst.writerecords([{'geometry': {'type': geometry_type, 'coordinates': c}, \
+                'properties': {'id': i, 'name': 'f' + str(i % 1000), 'value': v, 'day': '2018-01-01'}} \
+                for i, c, v in zip(range(start, stop), coordinates, values)])
+
+    return path
+
+def _gridCenters(random, start, stop, n):
+    """ Centers of the features start to stop on a jittered grid of n cells over lon -180..180, lat -80..80. """
+
+    import numpy as np
+
+    side = int(np.ceil(np.sqrt(n)))
+    index = np.arange(start, stop)
+    cell_w, cell_h = 360.0 / side, 160.0 / side
+
+    x = -180 + (index % side + 0.5) * cell_w + random.uniform(-0.25, 0.25, len(index)) * cell_w
+    y = -80 + (index // side + 0.5) * cell_h + random.uniform(-0.25, 0.25, len(index)) * cell_h
+
+    return x, y, min(cell_w, cell_h)
+
+def generatePoints(path, n, seed=0):
+    """ Point shapefile of n points on a jittered grid. """
+
+    def make(random, start, stop):
+        x, y, cell = _gridCenters(random, start, stop, n)
+        return list(zip(x.tolist(), y.tolist()))
+
+    return _writeSynthetic(path, 'Point', n, make, seed)
+
+def generateLines(path, n, vertices=8, seed=0):
+    """ LineString shapefile of n random walks of vertices vertices, each within its grid cell. """
+
+    import numpy as np
+
+    def make(random, start, stop):
+        x, y, cell = _gridCenters(random, start, stop, n)
+        steps = random.uniform(-1, 1, (len(x), vertices, 2)) * cell / (4.0 * vertices)
+        coords = np.cumsum(steps, axis=1) + np.stack([x, y], axis=1)[:, None, :]
+        return coords.tolist()
+
+    return _writeSynthetic(path, 'LineString', n, make, seed)
+
+def generatePolygons(path, n, vertices=8, seed=0, overlap=0.0):
+    """
+    Polygon shapefile of n star shaped polygons of vertices vertices. Polygons have a radius of about a third of
+    their grid cell, overlap makes them larger so neighbours overlap. (ex. overlap=1.0 doubles the radius)
+    """
+
+    import numpy as np
+
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+
+    def make(random, start, stop):
+        x, y, cell = _gridCenters(random, start, stop, n)
+        radius = cell / 3.0 * (1 + overlap) * random.uniform(0.6, 1.0, (len(x), vertices))
+        px = x[:, None] + radius * np.cos(angles)
+        py = y[:, None] + radius * np.sin(angles)
+        rings = np.stack([np.concatenate([px, px[:, :1]], axis=1), np.concatenate([py, py[:, :1]], axis=1)], axis=2)
+        return [[ring] for ring in rings.tolist()]
+
+    return _writeSynthetic(path, 'Polygon', n, make, seed)
+
+####################### END SECTION FOR SYNTHETIC DATA ##########################
+
+
+####################### BEGIN SECTION FOR OPERATIONS ##########################
+
+def _reproject(data, out, metrics):
+    os.makedirs(out)
+    bigeo().Reprojector().reproject(os.path.dirname(data['polygon']), out, 'EPSG:3857', transform=True, metrics=metrics)
+
+def _perFeature(method, kind='polygon', **kwargs):
+
+    def run(data, out, metrics):
+        operation = method(bigeo())
+        operation(data[kind], out + '.shp', metrics=metrics, **kwargs)
+
+    return run
+
+def _snap(data, out, metrics):
+    os.makedirs(out)
+    bigeo().SnapLineToPoints().snapLineToPoints(data['point'], data['line'], out, tolerance=0.5, metrics=metrics)
+
+def _pipeline(data, out, metrics):
+    pipeline = bigeo().Pipeline(data['polygon'], metrics=metrics)
+    pipeline.reproject('EPSG:3857').centroids().buffer(1000).run(out + '.shp')
+
+def _multiOutput(data, out, metrics):
+    outputs = dict((kind, out + '_' + kind + '.shp') for kind in ('bbox', 'centroids', 'representativepoint'))
+    bigeo().MultiOutputCreator().getOutputs(data['polygon'], outputs, metrics=metrics)
+
+def _spatialJoin(data, out, metrics):
+    bigeo().SpatialJoiner().join(data['point'], data['polygon'], out + '.shp', prefix='poly_', metrics=metrics)
+
+def bigeo():
+
+    import bigeo
+    return bigeo
+
+# Operations by name: function(data, out, metrics) and the input layer whose features are counted.
+# data holds the paths of the 'point', 'line', 'polygon' and 'overlapping' layers.
+OPERATIONS = {
+    'reproject': (_reproject, 'polygon'),
+    'getBbox': (_perFeature(lambda b: b.BoundingBoxCreator().getBbox), 'polygon'),
+    'getCentroids': (_perFeature(lambda b: b.CentroidCreator().getCentroids), 'polygon'),
+    'getRepresentativePoint': (_perFeature(lambda b: b.RepresentativePointCreator().getRepresentativePoint), 'polygon'),
+    'snapLineToPoints': (_snap, 'line'),
+    'removeDuplicates': (_perFeature(lambda b: b.DuplicatesRemover().removeDuplicates), 'polygon'),
+    'removeOverlaps': (_perFeature(lambda b: b.PolygonOverlapsRemover().removeOverlaps, 'overlapping'), 'overlapping'),
+    'getBuffer': (_perFeature(lambda b: b.BufferCreator().getBuffer, 'point', distance=0.01), 'point'),
+    'removeInvalid': (_perFeature(lambda b: b.InvalidGeomRemover().removeInvalid), 'polygon'),
+    'explode': (_perFeature(lambda b: b.MultipartToSinglepart().explode), 'polygon'),
+    'removeFieldTypes': (_perFeature(lambda b: b.FieldTypeRemover().removeFieldTypes), 'polygon'),
+    'pipeline': (_pipeline, 'polygon'),
+    'multiOutput': (_multiOutput, 'polygon'),
+    'spatialJoin': (_spatialJoin, 'point'),
+}
+
+def _runOperation(name, data, out, result):
+    """ Runs an operation in a child process and puts its seconds, peak RSS and phases in result. """
+
+    function, kind = OPERATIONS[name]
+
+    # Import the dependencies before timing, startup is measured by the startup benchmark.
+    for module in (bigeo().fiona, bigeo().np, bigeo().shapely, bigeo().pyproj):
+        getattr(module, '__file__')
+
+    metrics = bigeo().Metrics()
+
+    start = time.time()
+    function(data, out, metrics)
+    seconds = time.time() - start
+
+    # ru_maxrss is in kilobytes on Linux.
+    result.put({'seconds': seconds, 'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, \
+        'phases': dict(metrics.timers), 'counters': dict(metrics.counters)})
+
+def timeOperation(name, data, out, features):
+    """ Times an operation in a fresh process so its peak RSS is its own. """
+
+    context = multiprocessing.get_context('spawn')
+    result = context.Queue()
+
+    process = context.Process(target=_runOperation, args=(name, data, out, result))
+    process.start()
+    measure = result.get()
+    process.join()
+
+    measure['features'] = features
+    measure['features_per_second'] = features / measure['seconds'] if measure['seconds'] else None
+
+    return measure
+
+def benchmarkRun(scales=(10000,), vertices=(8,), operations=None, keep=None):
+    """
+    Times the operations on synthetic layers of each scale and vertex count.
+
+    RETURN(S)
+
+    : report : Dict with the python version and a list of results, one per scale, vertex count and operation.
+
+    """
+
+    operations = operations or list(OPERATIONS)
+    tmpdir = keep or tempfile.mkdtemp(prefix='bigeo_benchmark_')
+    results = []
+
+    try:
+        for n in scales:
+            for v in vertices:
+
+                case = os.path.join(tmpdir, '{0}_{1}'.format(n, v))
+                os.makedirs(os.path.join(case, 'polygon'))
+
+                start = time.time()
+                data = {
+                    'point': generatePoints(os.path.join(case, 'point.shp'), n),
+                    'line': generateLines(os.path.join(case, 'line.shp'), n, v),
+                    'polygon': generatePolygons(os.path.join(case, 'polygon', 'polygon.shp'), n, v),
+                    'overlapping': generatePolygons(os.path.join(case, 'overlapping.shp'), n, v, overlap=1.0),
+                }
+                logging.info("Generated %s features with %s vertices in %.1f s", n, v, time.time() - start)
+
+                for name in operations:
+
+                    measure = timeOperation(name, data, os.path.join(case, 'out_' + name), n)
+                    measure.update({'operation': name, 'scale': n, 'vertices': v})
+                    results.append(measure)
+
+                    logging.info("%s %s x %s: %.0f features/s, %.0f MB", name, n, v, measure['features_per_second'], \
+                        measure['peak_rss_mb'])
+
+                if keep is None:
+                    shutil.rmtree(case)
+
+    finally:
+        if keep is None:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    return {'python': sys.version, 'results': results}
+
+def compareReports(baseline, report, threshold=0.1):
+    """
+    Lists the operations of report more than threshold (0.1 is 10%) slower than in baseline.
+
+    RETURN(S)
+
+    : regressions : List of dicts with the operation, scale, vertices and both features/sec.
+
+    """
+
+    def key(result):
+        return (result['operation'], result['scale'], result['vertices'])
+
+    before = dict((key(r), r) for r in baseline['results'])
+    regressions = []
+
+    for result in report['results']:
+        old = before.get(key(result))
+        if old and old['features_per_second'] and \
+            result['features_per_second'] < old['features_per_second'] * (1 - threshold):
+            regressions.append({'operation': result['operation'], 'scale': result['scale'], \
+                'vertices': result['vertices'], 'baseline_features_per_second': old['features_per_second'], \
+                'features_per_second': result['features_per_second']})
+
+    return regressions
+
+####################### END SECTION FOR OPERATIONS ##########################
+
+
+def writeTinyInputs(tmpdir):
+    """ Writes the small point, line and polygon shapefiles used by the startup benchmark. """
+
+    import fiona
+    from fiona.crs import CRS
+
+    os.makedirs(os.path.join(tmpdir, 'in'))
+    os.makedirs(os.path.join(tmpdir, 'out'))
+
+    layers = {
+        'polygon.shp': ('Polygon', [[[(i, 0), (i + 1, 0), (i + 1, 1), (i, 1), (i, 0)]] for i in range(10)]),
+        'line.shp': ('LineString', [[(i, 0), (i + 0.9, 0.1)] for i in range(10)]),
+        'point.shp': ('Point', [(i, 0) for i in range(10)]),
+    }
+
+    for name, (geometry_type, coordinates) in layers.items():
+        schema = {'geometry': geometry_type, 'properties': {'id': 'int'}}
+        with fiona.open(os.path.join(tmpdir, 'in', name), 'w', driver='ESRI Shapefile', crs=CRS.from_epsg(4326), \
+            schema=schema) as dst:
+            dst.writerecords([{'geometry': {'type': geometry_type, 'coordinates': c}, 'properties': {'id': i}} \
+                for i, c in enumerate(coordinates)])
+
+    with open(os.path.join(tmpdir, 'ids.txt'), 'w') as f:
+        f.write('1701668,7521309,1724089')
+
+def startupCommands(tmpdir, openweather_url=None):
+    """ Arguments of each bigeo.py algorithm run by the startup benchmark. """
+
+    def path(*names):
+        return os.path.join(tmpdir, *names)
+
+    def io(algo, src='polygon.shp'):
+        return [algo, '--srcfile', path('in', src), '--outfile', path('out', algo + '.shp')]
+
+    commands = {
+        'reprojector': ['reprojector', '--indir', path('in'), '--outdir', path('out'), '--crs', 'EPSG:3857', '--transform'],
+        'boundingbox': io('boundingbox'),
+        'centroids': io('centroids'),
+        'representativepoint': io('representativepoint'),
+        'snaplinetopoints': ['snaplinetopoints', '--pointfile', path('in', 'point.shp'), '--srcfile', path('in', 'line.shp'), \
+            '--outdir', path('out')],
+        'duplicatesremover': io('duplicatesremover'),
+        'overlapsremover': io('overlapsremover'),
+        'buffer': io('buffer', 'point.shp') + ['--distance', '1'],
+        'invalidgeomremover': io('invalidgeomremover'),
+        'multiparttosinglepart': io('multiparttosinglepart'),
+        'fieldtyperemover': io('fieldtyperemover'),
+        'pipeline': io('pipeline') + ['--steps', 'reproject:EPSG:3857;centroids'],
+        'spatialjoin': io('spatialjoin', 'point.shp') + ['--polygonfile', path('in', 'polygon.shp'), '--prefix', 'poly_'],
+        'multioutput': ['multioutput', '--srcfile', path('in', 'polygon.shp'), '--bbox_outfile', path('out', 'mo_bbox.shp'), \
+            '--centroids_outfile', path('out', 'mo_centroids.shp')],
+    }
+
+    if openweather_url:
+        commands['openweather'] = ['openweather', '--path_ids_file', path('ids.txt'), '--ow_api', 'KEY', \
+            '--outfile', path('out', 'wx.shp'), '--ow_url', openweather_url]
+
+    return commands
+
+def parseImportTime(stderr):
+    """
+    Parses the -X importtime output of a run.
+
+    RETURN(S)
+
+    : imports : Dict of the cumulative import time in seconds of each top level import.
+
+    """
+
+    imports = {}
+
+    for line in stderr.splitlines():
+
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+
+        _, cumulative, name = line[len('import time:'):].split('|')
+
+        # Top level imports are indented by a single space.
+        if name.startswith(' ') and not name.startswith('  '):
+            imports[name.strip()] = int(cumulative) / 1e6
+
+    return imports
+
+def runStartup(command):
+    """ Runs bigeo.py with command in a fresh interpreter. Returns its wall time and import times. """
+
+    start = time.time()
+
+    process = subprocess.run([sys.executable, '-X', 'importtime', BIGEO] + command, capture_output=True, text=True)
+
+    wall = time.time() - start
+
+    if process.returncode != 0:
+        raise RuntimeError('bigeo.py ' + ' '.join(command) + ' failed:\n' + process.stderr[-2000:])
+
+    imports = parseImportTime(process.stderr)
+    heaviest = sorted(imports.items(), key=lambda item: -item[1])[:10]
+
+    return {'wall_seconds': wall, 'import_seconds': sum(imports.values()), 'heaviest_imports': dict(heaviest)}
+
+def benchmarkStartup(repeat=3):
+    """
+    Startup benchmark of every bigeo.py algorithm. The best of repeat runs is reported.
+
+    RETURN(S)
+
+    : report : Dict with the python version and the startup of 'import' (import bigeo only) and each algorithm.
+
+    """
+
+    # The openweather algorithm runs against the local stand-in of the API used by the tests.
+    from openweather_stub import StubOpenWeatherServer
+
+    tmpdir = tempfile.mkdtemp(prefix='bigeo_startup_')
+
+    try:
+        writeTinyInputs(tmpdir)
+
+        results = {}
+
+        start = time.time()
+        process = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import bigeo'], capture_output=True, \
+            text=True, cwd=os.path.dirname(BIGEO))
+        imports = parseImportTime(process.stderr)
+        results['import'] = {'wall_seconds': time.time() - start, 'import_seconds': sum(imports.values()), \
+            'heaviest_imports': dict(sorted(imports.items(), key=lambda item: -item[1])[:10])}
+
+        with StubOpenWeatherServer() as stub:
+
+            for algo, command in startupCommands(tmpdir, stub.url).items():
+
+                runs = [runStartup(command) for _ in range(repeat)]
+                results[algo] = min(runs, key=lambda run: run['wall_seconds'])
+
+                logging.info("%s: %.3f s wall, %.3f s imports", algo, results[algo]['wall_seconds'], \
+                    results[algo]['import_seconds'])
+
+    finally:
+        shutil.rmtree(tmpdir)
+
+    return {'python': sys.version, 'repeat': repeat, 'startup': results}
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("benchmark", help="The benchmark to run: startup, run or compare.")
+
+    parser.add_argument("--output", help="JSON report file. Printed if not given. For compare, the new report.")
+
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs of each startup measure.")
+
+    parser.add_argument("--scales", default="10000", help="Comma separated numbers of features. (ex. 10000,1000000)")
+
+    parser.add_argument("--vertices", default="8", help="Comma separated numbers of vertices of lines and polygons.")
+
+    parser.add_argument("--operations", help="Comma separated operations to time. All by default.")
+
+    parser.add_argument("--keep", help="Directory where the synthetic data is kept instead of a temporary one.")
+
+    parser.add_argument("--baseline", help="Baseline report for compare.")
+
+    parser.add_argument("--threshold", type=float, default=0.1, help="Slowdown reported as a regression by compare.")
+
+    args = parser.parse_args()
+
+    if args.benchmark == 'startup':
+        report = benchmarkStartup(args.repeat)
+
+    elif args.benchmark == 'run':
+        report = benchmarkRun([int(n) for n in args.scales.split(',')], [int(v) for v in args.vertices.split(',')], \
+            args.operations.split(',') if args.operations else None, args.keep)
+
+    elif args.benchmark == 'compare':
+        with open(args.baseline) as f, open(args.output) as g:
+            regressions = compareReports(json.load(f), json.load(g), args.threshold)
+        print(json.dumps(regressions, indent=2))
+        sys.exit(1 if regressions else 0)
+
+    else:
+        parser.error('Unknown benchmark: ' + args.benchmark)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
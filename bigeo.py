@@ -35,7 +35,11 @@
 
 # =========================== DEPENDENCIES / REQUIREMENTS ======================
 # pip install fiona         
-# pip install shapely
+# pip install "shapely>=2.0"
+# pip install numpy
+# pip install pyproj
+# pip install aiohttp       (openweather only)
+# pip install pyarrow       (GeoParquet / Feather only)
 # =========================== DEPENDENCIES / REQUIREMENTS ======================
 
 """
@@ -48,16 +52,25 @@ Refer to bigeo library documentation.
 
 """
 
-import fiona
 import logging
 import os
 import argparse
-from fiona.crs import from_epsg
-from shapely.geometry import Point, Polygon, shape, mapping, LineString
-from shapely.ops import cascaded_union
+import collections
+import contextlib
+import csv
+import itertools
+import time
+import hashlib
+import shutil
+import sqlite3
+import tempfile
+import weakref
+import threading
+import concurrent.futures
 import json
-import requests
-import matplotlib.pyplot as plt
+import copy
+import functools
+import math
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s :    %(message)s')
 
@@ -68,12 +81,14 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s :
 class Reprojector:
     """ Class for reprojecting shp files."""
 
-    def reproject(self, inshpdir, outshpdir, crs):
+    def reproject(self, inshpdir, outshpdir, crs, transform=False, workers=1, chunksize=10000, fields=None, \
+        metrics=None, bbox=None, mask=None, incremental=False, read_queue=0, write_queue=0):
         """ 
         Function that reprojects shp file crs to a given crs. 
 
         Reprojected .shp files will be on the outshp \
-        directory. Reprojected .shp files will have the same name and all attributes from inshpdir.
+        directory. Reprojected .shp files will have the same name and all attributes from inshpdir. \
+        GeoParquet (.parquet) and Feather (.feather) files in inshpdir are reprojected too.
 
         PARAMETER(S):
 
@@ -83,11 +98,31 @@ class Reprojector:
 
         : crs : Projection to use. See fiona crs documentation.
 
+        : transform : If True, coordinates are transformed from the source crs to crs. If False, only \
+        the crs of the output header is changed.
+
+        : workers : Number of processes used to reproject the files in inshpdir. With transform and a single \
+        file, the file is split into partitions of consecutive features instead.
+
+        : chunksize, fields, metrics, bbox, mask : Shared options, described in Pipeline.
+
+        : incremental : If True, only the features added or changed since the last incremental run of a file are \
+        reprojected, the others are copied from its output. See Pipeline.run.
+
+        : read_queue : Number of chunks a reader thread reads ahead of the transformation. 0 reads in turn.
+
+        : write_queue : Number of chunks a writer thread writes behind the transformation. 0 writes in turn.
+
+        RETURN(S)
+
+        : summary : A list with a dict per file containing the file, number of features, seconds spent and metrics.
+
         EXAMPLE(S):
 
         import bigeo
         reproj = bigeo.Reprojector()
         reproj.reproject("home/path/unprojecteddirectory" , "home/path/projecteddirectory", 'EPSG:4326')
+        reproj.reproject("home/path/unprojecteddirectory" , "home/path/projecteddirectory", 'EPSG:3857', transform=True, workers=8)
 
         """
 
@@ -102,42 +137,51 @@ class Reprojector:
         # Getting all the path of .shp files
         path_of_shp_files= []
 
-        for filename in os.listdir(self.inshpdir):
-            if filename.endswith(".shp"): 
-                path_of_shp_files.append(os.path.join(self.inshpdir +"/", filename))
-                logging.info('%s %s', "shp file found: ", filename)
-
-        # Reading the input .shp files.
-        for shpf in path_of_shp_files:
+        if _catalog() is not None:
+            layers = _catalog().layers(self.inshpdir, workers=workers)
+            filenames = [os.path.basename(layer['path']) for layer in layers]
+        else:
+            filenames = sorted(os.listdir(self.inshpdir))
 
-            output_file_name = (os.path.basename(shpf))
-
-            with fiona.open(shpf) as input_shp:
+        for filename in filenames:
+            if filename.endswith(".shp") or _columnarFormat(filename): 
+                path_of_shp_files.append(os.path.join(self.inshpdir, filename))
+                logging.info('%s %s', "shp file found: ", filename)
 
-                meta = input_shp.meta
-                schema = input_shp.schema
+        logging.info('%s %s', "Writing reprojected files to :", self.outshpdir)
 
-            # Writing the output .shp files
-            logging.info('%s %s', "Writing reprojected files to :", self.outshpdir)
+        where = spatialFilter(bbox, mask)
 
-            with fiona.open(self.outshpdir + '/' + output_file_name, 'w', crs=self.crs, \
-                driver='ESRI Shapefile', schema=schema) as output_shp:
+        jobs = [(shpf, os.path.join(self.outshpdir, os.path.basename(shpf)), self.crs, transform, chunksize, fields, \
+            where) for shpf in path_of_shp_files]
+        queues = {'read_queue': read_queue, 'write_queue': write_queue}
 
-                with fiona.open(shpf) as input_shp:
+        if workers > 1 and len(jobs) > 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_reprojectPipeline, *job, incremental=True, **queues) if incremental else \
+                    pool.submit(_reprojectFile, *job, **queues) for job in jobs]
+                self.summary = [future.result() for future in futures]
+        elif incremental or (workers > 1 and transform):
+            self.summary = [_reprojectPipeline(*job, workers=workers, incremental=incremental, **queues) \
+                for job in jobs]
+        else:
+            self.summary = [_reprojectFile(*job, **queues) for job in jobs]
 
-                    meta = input_shp.meta
+        self.metrics = metrics or Metrics()
 
-                    for f in input_shp:
+        for file_summary in self.summary:
+            self.metrics.merge(file_summary['metrics'])
 
-                        output_shp.write(f)
+        logging.info('%s', "Reprojecting done.")
 
-            logging.info('%s', "Reprojecting done.")
+        return self.summary
 
 
 class BoundingBoxCreator():
     """ Class for creating a bounding box from polygon geometries"""
 
-    def getBbox(self, srcfile, outfile):
+    def getBbox(self, srcfile, outfile, chunksize=10000, fields=None, metrics=None, bbox=None, mask=None, workers=1, \
+        partition='range', keep_order=True, incremental=False, read_queue=0, write_queue=0):
         """
         Creates a bounding box of polygon.
 
@@ -151,14 +195,32 @@ class BoundingBoxCreator():
 
         : outfile : The name of the bounding box shapefile to be created. 
 
+        : chunksize, fields, metrics, bbox, mask : Shared options, described in Pipeline.
+
+        : workers : Number of processes. The source is split into partitions whose outputs are merged into outfile.
+
+        : partition : 'range' partitions of consecutive features or 'tile' partitions of a grid over the extent.
+
+        : keep_order : If True, the features of outfile are in the order of srcfile.
+
+        : incremental : If True, only the features added or changed since the last incremental run are computed, \
+        the others are copied from outfile. See Pipeline.run.
+
+        : read_queue : Number of chunks a reader thread reads ahead of the computation. 0 reads in turn.
+
+        : write_queue : Number of chunks a writer thread writes behind the computation. 0 writes in turn.
+
         EXAMPLE(S):
 
         import bigeo
         bb = bigeo.BoundingBoxCreator()
         bb.getBbox('/home/polygon.shp', '/home/boundingbox.shp')
+        bb.getBbox('/home/polygon.shp', '/home/boundingbox.shp', workers=8, partition='tile')
 
         """
 
+        import fiona
+
         self.srcfile = srcfile
         self.outfile = outfile
 
@@ -166,29 +228,26 @@ class BoundingBoxCreator():
 
             logging.info("Reading file: " + self.srcfile)
 
-            with fiona.open(self.srcfile) as src:
-                self.meta = src.meta
+            pipeline = Pipeline(self.srcfile, chunksize, fields=fields, metrics=metrics, bbox=bbox, mask=mask, \
+                read_queue=read_queue, write_queue=write_queue)
+            pipeline.add('bbox')
 
-                logging.info("Creating output file: " + self.outfile)
+            logging.info("Creating output file: " + self.outfile)
 
-                with fiona.open(self.outfile, 'w', **self.meta) as dst:
+            pipeline.run(self.outfile, workers, partition, keep_order, incremental)
 
-                    for f in src:
+            self.meta = pipeline.meta
+            self.metrics = pipeline.metrics
 
-                        logging.info("Creating bounds: " + str(fiona.bounds(f)))
-
-                        bbox = Polygon.from_bounds(fiona.bounds(f)[0], fiona.bounds(f)[1],fiona.bounds(f)[2],fiona.bounds(f)[3])
-                        f['geometry'] = mapping(bbox)
-                        dst.write(f)
-
-                    logging.info("Done creating bounds for all features. Writing to the specified output file.")
+            logging.info("Done creating bounds for all features. Writing to the specified output file.")
 
 
 class CentroidCreator():
     """ A class for creating centroids from a polygon shp file. """
 
 
-    def getCentroids(self, srcfile, outfile):
+    def getCentroids(self, srcfile, outfile, chunksize=10000, fields=None, metrics=None, bbox=None, mask=None, \
+        workers=1, partition='range', keep_order=True, incremental=False, read_queue=0, write_queue=0):
         """
         Takes a polygon shp file as an input and creates a point shapefile of centroids.
 
@@ -201,6 +260,21 @@ class CentroidCreator():
 
         : outfile : The name of the point shapefile to be created.
 
+        : chunksize, fields, metrics, bbox, mask : Shared options, described in Pipeline.
+
+        : workers : Number of processes. The source is split into partitions whose outputs are merged into outfile.
+
+        : partition : 'range' partitions of consecutive features or 'tile' partitions of a grid over the extent.
+
+        : keep_order : If True, the features of outfile are in the order of srcfile.
+
+        : incremental : If True, only the features added or changed since the last incremental run are computed, \
+        the others are copied from outfile. See Pipeline.run.
+
+        : read_queue : Number of chunks a reader thread reads ahead of the computation. 0 reads in turn.
+
+        : write_queue : Number of chunks a writer thread writes behind the computation. 0 writes in turn.
+
         EXAMPLE(S):
 
         import bigeo
@@ -209,6 +283,8 @@ class CentroidCreator():
 
         """
 
+        import fiona
+
         self.srcfile = srcfile
         self.outfile = outfile
 
@@ -216,27 +292,26 @@ class CentroidCreator():
 
             logging.info("Reading file: " + self.srcfile)
 
-            with fiona.open(self.srcfile) as src:
-                self.meta = src.meta
-                self.meta['schema']['geometry'] = 'Point'
+            pipeline = Pipeline(self.srcfile, chunksize, fields=fields, metrics=metrics, bbox=bbox, mask=mask, \
+                read_queue=read_queue, write_queue=write_queue)
+            pipeline.add('centroids')
 
-                logging.info("Creating output file: " + self.outfile)
+            logging.info("Creating output file: " + self.outfile)
 
-                with fiona.open(self.outfile, 'w', **self.meta) as dst:
+            pipeline.run(self.outfile, workers, partition, keep_order, incremental)
 
-                    for f in src:
-                        centroid = shape(f['geometry']).centroid
-                        f['geometry'] = mapping(centroid)
-                        dst.write(f)
+            self.meta = pipeline.meta
+            self.metrics = pipeline.metrics
 
-                    logging.info("Done creating centroids for all features. Writing to the specified output file.")
+            logging.info("Done creating centroids for all features. Writing to the specified output file.")
 
 
 class RepresentativePointCreator():
     """ A class for creating Representative Point from a polygon shp file. """
 
 
-    def getRepresentativePoint(self, srcfile, outfile):
+    def getRepresentativePoint(self, srcfile, outfile, chunksize=10000, fields=None, metrics=None, bbox=None, \
+        mask=None, workers=1, partition='range', keep_order=True, incremental=False, read_queue=0, write_queue=0):
         """
         Takes a polygon shp file as an input and creates a point shapefile of Representative Point.
 
@@ -249,6 +324,21 @@ class RepresentativePointCreator():
 
         : outfile : The name of the point shapefile to be created.
 
+        : chunksize, fields, metrics, bbox, mask : Shared options, described in Pipeline.
+
+        : workers : Number of processes. The source is split into partitions whose outputs are merged into outfile.
+
+        : partition : 'range' partitions of consecutive features or 'tile' partitions of a grid over the extent.
+
+        : keep_order : If True, the features of outfile are in the order of srcfile.
+
+        : incremental : If True, only the features added or changed since the last incremental run are computed, \
+        the others are copied from outfile. See Pipeline.run.
+
+        : read_queue : Number of chunks a reader thread reads ahead of the computation. 0 reads in turn.
+
+        : write_queue : Number of chunks a writer thread writes behind the computation. 0 writes in turn.
+
         EXAMPLE(S):
 
         import bigeo
@@ -257,6 +347,8 @@ class RepresentativePointCreator():
 
         """
 
+        import fiona
+
         self.srcfile = srcfile
         self.outfile = outfile
 
@@ -264,305 +356,5314 @@ class RepresentativePointCreator():
 
             logging.info("Reading file: " + self.srcfile)
 
-            with fiona.open(self.srcfile) as src:
-                self.meta = src.meta
-                self.meta['schema']['geometry'] = 'Point'
+            pipeline = Pipeline(self.srcfile, chunksize, fields=fields, metrics=metrics, bbox=bbox, mask=mask, \
+                read_queue=read_queue, write_queue=write_queue)
+            pipeline.add('representativepoint')
 
-                logging.info("Creating output file: " + self.outfile)
+            logging.info("Creating output file: " + self.outfile)
 
-                with fiona.open(self.outfile, 'w', **self.meta) as dst:
+            pipeline.run(self.outfile, workers, partition, keep_order, incremental)
 
-                    for f in src:
-                        r_points = shape(f['geometry']).representative_point()
-                        f['geometry'] = mapping(r_points)
-                        dst.write(f)
+            self.meta = pipeline.meta
+            self.metrics = pipeline.metrics
 
-                    logging.info("Done creating Representative Point for all features. Writing to the specified output file.")
+            logging.info("Done creating Representative Point for all features. Writing to the specified output file.")
 
 
-class OpenWeather():
-    """ Class for requesting weather data from open weather and creates a shapefile with that data on its location."""
+class MultiOutputCreator():
+    """ Class for creating bounding boxes, centroids and representative points of a layer in a single pass. """
 
-    def getWeather(self, path_ids_file, ow_api, outputshp):
+    # Kinds of output, each made by the pipeline stage of the same name.
+    OUTPUTS = ('bbox', 'centroids', 'representativepoint')
+
+    def getOutputs(self, srcfile, outputs, chunksize=10000, fields=None, metrics=None, bbox=None, mask=None):
         """
-        Requests for the current weather data to openweather.com and generates a shapefile.
+        Reads srcfile once and writes its bounding boxes, centroids and / or representative points.
+
+        Each feature is read and its geometry decoded once, then fanned out to all the output files, which are \
+        written at the same time. Outputs have the attributes of their respective features.
 
-        IMPORTANT: This requires api key from openweather. Please register for a free account.
-        
         PARAMETER(S):
 
-        : path_ids_file : Path to a file consist of city ids separated by comma with no spaces. (Ex: 1701668,7521309,1724089) See openweather documentation for city ids. 
+        : srcfile : The source polygon shapefile.
 
-        : ow_api : Your api key from openweather.
+        : outputs : Dict of the output file of each kind of output: 'bbox', 'centroids' or 'representativepoint'.
 
-        : outputshp : Output Shapefile.
+        : chunksize, fields, metrics, bbox, mask : Shared options, described in Pipeline.
+
+        RETURN(S)
+
+        : counts : Dict of the number of features written to each kind of output.
 
         EXAMPLE(S):
 
         import bigeo
-        ow = bigeo.OpenWeather()
-        ow.getWeather('/home/openweather_id.txt', '462c34bsdgddgded8643643f352a', "/home/output_weather/wx.shp")
+        mo = bigeo.MultiOutputCreator()
+        mo.getOutputs('/home/polygon.shp', {'bbox': '/home/bbox.shp', 'centroids': '/home/centroids.shp', \
+            'representativepoint': '/home/reppoints.shp'})
 
         """
 
-        logging.info("Reading file for city ids: " + path_ids_file)
+        import fiona
 
-        f = open(path_ids_file,"r")        
+        self.srcfile = srcfile
 
-        self.api_id = ow_api
+        outputs = dict((kind, outfile) for kind, outfile in outputs.items() if outfile)
+        unknown = set(outputs) - set(self.OUTPUTS)
 
-        self.ids_txt = f.readline().strip()
+        if unknown or not outputs:
+            raise ValueError("Unknown or no outputs: " + ', '.join(sorted(unknown)) + ". Use " + \
+                ', '.join(self.OUTPUTS) + ".")
 
-        self.outputshp = outputshp
+        outfiles = [os.path.abspath(outfile) for outfile in outputs.values()]
 
-        logging.info("City ids found: " + str(f.readline().strip()))
+        if len(set(outfiles)) < len(outfiles):
+            raise ValueError("Outputs must be written to different files: " + ', '.join(outputs.values()) + ".")
 
-        logging.info("Requesting using API KEY: " + self.api_id)
+        with fiona.drivers():
 
-        logging.info('Request URL: '+'http://api.openweathermap.org/data/2.5/group?id={ids}&APPID={appid}&units=metric'.format(ids=self.ids_txt, appid=self.api_id))
+            logging.info("Reading file: " + self.srcfile)
 
-        self.r = requests.get('http://api.openweathermap.org/data/2.5/group?id={ids}&APPID={appid}&units=metric'.format(ids=self.ids_txt, appid=self.api_id))
+            pipeline = Pipeline(self.srcfile, chunksize, fields=fields, metrics=metrics, bbox=bbox, mask=mask)
 
-        logging.info("Recieved weather response.") 
+            counts = pipeline.runOutputs(dict((outfile, [(kind, ())]) for kind, outfile in outputs.items()))
+            self.counts = dict((kind, counts[outfile]) for kind, outfile in outputs.items())
 
-        wx_json = self.r.json()
+            self.metrics = pipeline.metrics
 
-        crs = from_epsg(4326)
+            logging.info("Done creating %s for all features.", ', '.join(outputs))
 
-        schema = {
-                'geometry': 'Point',
-                'properties': 
-                        {
-                          'city' :'str', 
-                          'humidity': 'int',
-                          'pressure': 'int',
-                          'temp': 'int',
-                          'weather_de': 'str',
-                          'wind_dir': 'float',
-                          'wind_speed': 'float', 
-                        }
-                    }
+        return self.counts
 
-        logging.info("Creating output shapefile: " + self.outputshp)
 
-        with fiona.open(self.outputshp, 'w', crs=crs, schema=schema, driver="ESRI Shapefile") as shpfile:
+class Metrics():
+    """ Class collecting counters and phase timers of bigeo operations. """
 
-            for i in wx_json['list']:
+    def __init__(self, progress_interval=None):
+        """
+        Creates empty metrics.
 
-                point = {u"type": u"Point", u"coordinates": [i['coord']['lon'], i['coord']['lat']]}
-                properties = {
-                              'city' : i['name'], 
-                              'humidity': i['main']['humidity'],
-                              'pressure': i['main']['pressure'],
-                              'temp': i['main']['temp'],
-                              'weather_de': i['weather'][0]['main'],
-                              'wind_dir': i['wind']['deg'],
-                              'wind_speed': i['wind']['speed'],
-                            }
+        Operations time their read, compute and write phases, count the features they write, the size of the \
+        datasets they read from (dataset_bytes) and the bytes they write. Nothing is logged per feature.
 
-                shpfile.write({'geometry': point, 'properties': properties})
+        PARAMETER(S):
 
-        logging.info("Writing output shapefile: " + self.outputshp)
-        logging.info("Closing file: " + path_ids_file)        
-        f.close()
+        : progress_interval : If given, progress is logged at most once every progress_interval seconds.
 
+        EXAMPLE(S):
 
-class SnapLineToPoints():
-    """ Class to snap lines to points. """
+        import bigeo
+        metrics = bigeo.Metrics(progress_interval=10)
+        bigeo.CentroidCreator().getCentroids('/home/polygon.shp', '/home/centroids.shp', metrics=metrics)
+        metrics.dump('/home/centroids_metrics.json')
+
+        """
+
+        self.counters = collections.Counter()
+        self.timers = collections.Counter()
+        self.progress_interval = progress_interval
+        self.started = time.time()
+        self.last_progress = self.started
+
+    @contextlib.contextmanager
+    def timer(self, phase):
+        """ Context manager adding the time spent in its block to phase. """
+
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.timers[phase] += time.perf_counter() - start
+
+    def count(self, name, n=1):
+        """ Adds n to the counter name. """
 
-    # object.convex_hull
+        self.counters[name] += n
 
-    def snapLineToPoints(self, pointshp, lineshp, outshpdir):
+    def features(self, n):
+        """ Counts n features written and logs progress if progress_interval has elapsed. """
+
+        self.counters['features'] += n
+
+        if self.progress_interval is not None:
+            now = time.time()
+            if now - self.last_progress >= self.progress_interval:
+                self.last_progress = now
+                logging.info("Processed %s features, %.0f features/s.", self.counters['features'], \
+                    self.counters['features'] / max(now - self.started, 1e-9))
+
+    def read(self, path):
         """
-        Function to snap lines to points.
+        Counts the size of the files of the dataset path as dataset_bytes. A filter, a field projection or a \
+        memory map may read only part of them.
         """
-        pass
 
+        self.counters['dataset_bytes'] += _datasetBytes(path)
 
-# TODO
-class DuplicatesRemover():
-    # Class to remove duplicates in shapefiles
-    # Might just use set() function of python
-    pass
+    def written(self, path):
+        """ Counts the bytes of the files of the dataset path as written. """
 
-# TODO
-class PolygonOverlapsRemover():
-    # Class to remove overlaps in polygons
-    pass
+        self.counters['bytes_written'] += _datasetBytes(path)
 
-# TODO
-class BufferCreator():
-    # Class to create a fixed distance buffer
-    pass
+    def merge(self, report):
+        """ Adds the counters and timers of a report, for instance one made in a worker process. """
 
-# TODO
-class InvalidGeomRemover():
-    # Class to check for invalid geometries
-    # might use shapely is_valid and validation.explain_validity(object)
-    # buffer(0) will remove invalid geoms. Be cautious as tiny polygons might be created
-    pass
+        self.counters.update(report['counters'])
+        self.timers.update(report['timers'])
 
-# TODO
-class MultipartToSinglepart():
-    # Convert multipart to singlepart
-    pass
+    def report(self):
+        """
+        RETURN(S)
 
-# TODO
-class FieldTypeRemover():
-    # Removes unnecessary fields accordin to type. (ex. DATE TYPE FIELD)
-    pass
+        : report : Dict with the seconds since creation, features, features/sec, counters and timers.
 
-# TODO
+        """
 
+        seconds = time.time() - self.started
 
-####################### END SECTION FOR CLASSES ##########################
+        return {
+            'seconds': seconds,
+            'features': self.counters['features'],
+            'features_per_second': self.counters['features'] / seconds if seconds else None,
+            'counters': dict(self.counters),
+            'timers': dict(self.timers),
+        }
 
+    def dump(self, path):
+        """ Writes the report as JSON to path. """
 
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
 
-####################### BEGIN SECTION FOR HELPER FUNCTIONS ##########################
 
-def getSchema(path):
-    """
-    Get the schema of a shapefile.
+class SpatialIndex():
+    """ Packed R-tree of the bounds of the features of a layer, saved in a sidecar file next to the layer. """
 
-    PARAMETER(S)
+    MAGIC = b'BIGEOIDX'
 
-    : path : Path to the .shp file where to copy the schema.
+    # Header after the magic: source size, source mtime in ns, features, indexed features, node size, levels,
+    # then the number of nodes of each level from the root down.
+    HEADER_SIZE = 32
 
-    RETURN(S)
+    NODE_SIZE = 16
 
-    : schema :  The schema from source .shp
+    # Queries are run this many at a time to bound the memory of the candidate pairs.
+    BATCH_SIZE = 65536
 
-    """
+    def __init__(self, path, build=True):
+        """
+        Opens the spatial index of the layer path. The index is memory mapped from the sidecar file \
+        (ex. layer.bgx for layer.shp). A missing sidecar, or one made before the layer was last modified \
+        (size or mtime changed), is rebuilt when build is True.
 
-    path = path
+        PARAMETER(S):
 
-    with fiona.open(path) as shpfile:
+        : path : Path of the layer (.shp, .parquet, .feather).
 
-        schema = shpfile.schema.copy()
+        : build : If False, raises ValueError instead of building a missing or stale index.
 
-        return schema
+        EXAMPLE(S):
 
-def getCrs(path):
-    """
-    Gets the crs of the given .shp file.
-    
-    PARAMETER(S)
+        import bigeo
+        index = bigeo.SpatialIndex('/home/parcels.shp')
+        query_index, feature_ids = index.queryBulk([[0, 0, 10, 10], [20, 20, 30, 30]])
 
-    : path : Path to the .shp file where to copy the crs.
+        """
 
-    RETURN(S)
+        self.path = path
+        self.sidecar = SpatialIndex.sidecarPath(path)
 
-    : crs :  The crs from source .shp
+        if not SpatialIndex.isFresh(path):
 
-    """
+            if not build:
+                raise ValueError("No up to date spatial index for " + path)
 
-    path = path
+            SpatialIndex.build(path)
 
-    with fiona.open(path) as shpfile:
+        self._map()
 
-        crs = shpfile.crs
+    @staticmethod
+    def sidecarPath(path):
+        """ Path of the sidecar index of the layer path. """
 
-        return crs
+        base, extension = os.path.splitext(path)
 
-####################### END SECTION FOR HELPER FUNCTIONS ##########################
+        return (base if extension.lower() == '.shp' else path) + '.bgx'
 
-#################### BEGIN SECTION FOR RUNNING PROCESSING FUNCTIONS ###################
+    @staticmethod
+    def isFresh(path):
+        """ True if the sidecar index of path exists and was built from the current file. """
 
-def __run_reprojection():
+        import numpy as np
 
-    logging.info("Running reprojection algorithm.")
+        sidecar = SpatialIndex.sidecarPath(path)
 
-    projector = Reprojector()
+        if not os.path.exists(sidecar):
+            return False
 
-    projector.reproject(args.indir, args.outdir, args.crs)
+        with open(sidecar, 'rb') as f:
+            magic = f.read(len(SpatialIndex.MAGIC))
+            header = np.frombuffer(f.read(16), dtype='<i8')
 
-def __run_boundingbox():
+        stat = os.stat(path)
 
-    logging.info("Running bounding box algorithm.")
+        return magic == SpatialIndex.MAGIC and len(header) == 2 and \
+            header.tolist() == [stat.st_size, stat.st_mtime_ns]
 
-    bb = BoundingBoxCreator()
+    @staticmethod
+    def build(path, node_size=NODE_SIZE):
+        """
+        Builds the sidecar index of the layer path.
 
-    bb.getBbox(args.srcfile, args.outfile)
+        RETURN(S)
 
-def __run_centroids():
+        : sidecar : Path of the sidecar index.
 
-    logging.info("Running centroids algorithm.")
+        """
 
-    cc = CentroidCreator()
+        import numpy as np
 
-    cc.getCentroids(args.srcfile, args.outfile)
+        stat = os.stat(path)
+        bounds = _layerBounds(path)
 
-def __run_representativepoint():
+        # Sort-Tile-Recursive packing: vertical slices by x center, leaves by y center inside each slice.
+        ids = np.flatnonzero(~np.isnan(bounds).any(axis=1))
+        centers = (bounds[ids, :2] + bounds[ids, 2:]) / 2
 
-    logging.info("Running representative point algorithm.")
+        leaves = -(-len(ids) // node_size)
+        per_slice = node_size * max(1, -(-leaves // max(1, int(np.ceil(np.sqrt(leaves))))))
+        by_x = np.argsort(centers[:, 0], kind='stable')
+        ids = ids[by_x[np.lexsort((centers[by_x, 1], np.arange(len(ids)) // per_slice))]]
 
-    rp = RepresentativePointCreator()
+        levels = []
+        level = bounds[ids]
 
-    rp.getRepresentativePoint(args.srcfile, args.outfile)
+        while len(level) > 1 or not levels:
+            starts = np.arange(0, len(level), node_size)
+            level = np.column_stack([np.minimum.reduceat(level[:, 0], starts), \
+                np.minimum.reduceat(level[:, 1], starts), np.maximum.reduceat(level[:, 2], starts), \
+                np.maximum.reduceat(level[:, 3], starts)]) if len(level) else np.empty((0, 4))
+            levels.append(level)
 
-def __run_openweather():
+        levels.reverse()
 
-    logging.info("Running openweather algorithm.")
+        header = np.zeros(SpatialIndex.HEADER_SIZE, dtype='<i8')
+        header[:6] = [stat.st_size, stat.st_mtime_ns, len(bounds), len(ids), node_size, len(levels)]
+        header[6:6 + len(levels)] = [len(level) for level in levels]
 
-    ow = OpenWeather()
+        sidecar = SpatialIndex.sidecarPath(path)
+        tmp = sidecar + '.tmp'
 
-    ow.getWeather(args.path_ids_file, args.ow_api, args.outfile)
+        with open(tmp, 'wb') as f:
+            f.write(SpatialIndex.MAGIC)
+            f.write(header.tobytes())
+            f.write(np.ascontiguousarray(bounds, dtype='<f8').tobytes())
+            f.write(ids.astype('<i8').tobytes())
+            for level in levels:
+                f.write(np.ascontiguousarray(level, dtype='<f8').tobytes())
 
+        os.replace(tmp, sidecar)
 
+        logging.info("Built spatial index of %s features: %s", len(ids), sidecar)
 
-#################### END SECTION FOR RUNNING PROCESSING FUNCTIONS #####################
+        return sidecar
 
+    def _map(self):
 
-#################### BEGIN MAIN #####################
+        import numpy as np
 
+        data = np.memmap(self.sidecar, dtype=np.uint8, mode='r')
+        offset = len(self.MAGIC)
 
-def main(algo):
+        header = data[offset:offset + self.HEADER_SIZE * 8].view('<i8')
+        offset += self.HEADER_SIZE * 8
 
-    if algo == 'reprojector':
-        __run_reprojection()
+        features, items, self.node_size, levels = header[2:6].tolist()
 
-    elif algo == 'boundingbox':
-        __run_boundingbox()
+        #: Bounds of each feature in file order, NaN for features without geometry.
+        self.bounds = data[offset:offset + features * 32].view('<f8').reshape(features, 4)
+        offset += features * 32
 
-    elif algo == 'centroids':
-        __run_centroids()
+        self.ids = data[offset:offset + items * 8].view('<i8')
+        offset += items * 8
 
-    elif algo == 'representativepoint':
-        __run_representativepoint()
+        self.levels = []
 
-    elif algo == 'openweather':
-        __run_openweather()
+        for nodes in header[6:6 + levels].tolist():
+            self.levels.append(data[offset:offset + nodes * 32].view('<f8').reshape(nodes, 4))
+            offset += nodes * 32
 
-    else:
-        logging.error('Unkown algorithm: ' + algo)
+    def __len__(self):
 
-if __name__ == "__main__":
+        return len(self.bounds)
 
-    parser = argparse.ArgumentParser()
+    def queryBulk(self, bounds):
+        """
+        Finds the features whose bounds intersect each of the given bounds.
 
-    parser.add_argument("algo_processor", help="The processing algorithm to use.")
+        PARAMETER(S):
 
-    parser.add_argument("--indir", help="Directory of shapefiles to reproject.")
+        : bounds : Array like of minx, miny, maxx, maxy rows.
 
-    parser.add_argument("--outdir", help="Directory to store the reprojected shapefiles.")
+        RETURN(S)
 
-    parser.add_argument("--crs", help="CRS string to use. See fiona documentation for crs available")
+        : query_index, feature_ids : Arrays of the row of bounds and the feature id of each intersecting pair, \
+        sorted by row and feature id.
 
-    parser.add_argument("--srcfile", help="Source shapefile.")
+        """
 
-    parser.add_argument("--outfile", help="Output shapefile.")
+        import numpy as np
 
-    parser.add_argument("--path_ids_file", help="Open weather city ids text file.")
+        bounds = np.asarray(bounds, dtype=float).reshape(-1, 4)
+        results = [self._query(bounds[start:start + self.BATCH_SIZE], start) \
+            for start in range(0, len(bounds), self.BATCH_SIZE)]
 
-    parser.add_argument("--ow_api", help="Your open weather API key.")
+        query_index = np.concatenate([r[0] for r in results]) if results else np.empty(0, dtype=np.int64)
+        feature_ids = np.concatenate([r[1] for r in results]) if results else np.empty(0, dtype=np.int64)
 
+        return query_index, feature_ids
 
-    args = parser.parse_args()
+    def _query(self, bounds, offset=0):
 
-    algo = args.algo_processor
-    
-    main(algo)
+        import numpy as np
+
+        query = np.arange(len(bounds))
+        nodes = np.zeros(len(bounds), dtype=np.int64)
+
+        if not len(self.ids):
+            return query[:0], nodes[:0]
+
+        # Walk down the levels, the children of node i are i * node_size to (i + 1) * node_size.
+        for depth in range(len(self.levels) + 1):
+
+            if depth:
+                size = len(self.levels[depth]) if depth < len(self.levels) else len(self.ids)
+                starts = nodes * self.node_size
+                counts = np.minimum(self.node_size, size - starts)
+                firsts = np.cumsum(counts) - counts
+                query = np.repeat(query, counts)
+                nodes = np.repeat(starts - firsts, counts) + np.arange(counts.sum())
+
+            if depth < len(self.levels):
+                boxes = self.levels[depth][nodes]
+            else:
+                nodes = self.ids[nodes]
+                boxes = self.bounds[nodes]
+
+            q = bounds[query]
+            hit = (boxes[:, 0] <= q[:, 2]) & (boxes[:, 2] >= q[:, 0]) & (boxes[:, 1] <= q[:, 3]) & (boxes[:, 3] >= q[:, 1])
+            query, nodes = query[hit], nodes[hit]
+
+        order = np.lexsort((nodes, query))
+
+        return query[order] + offset, nodes[order]
+
+    def nearest(self, coords, max_distance):
+        """
+        Finds the feature with the nearest bounds within max_distance of each coordinate. For point layers \
+        this is the nearest point. Ties go to the lowest feature id.
+
+        RETURN(S)
+
+        : query_index, feature_ids : Arrays of the coordinates with a feature within max_distance and their feature.
+
+        """
+
+        import numpy as np
+
+        coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        query_index, feature_ids = self.queryBulk(np.column_stack([coords - max_distance, coords + max_distance]))
+
+        boxes = self.bounds[feature_ids]
+        points = coords[query_index]
+        dx = np.maximum(np.maximum(boxes[:, 0] - points[:, 0], points[:, 0] - boxes[:, 2]), 0)
+        dy = np.maximum(np.maximum(boxes[:, 1] - points[:, 1], points[:, 1] - boxes[:, 3]), 0)
+        distance = np.hypot(dx, dy)
+
+        within = distance <= max_distance
+        query_index, feature_ids, distance = query_index[within], feature_ids[within], distance[within]
+
+        order = np.lexsort((feature_ids, distance, query_index))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = query_index[order][1:] != query_index[order][:-1]
+
+        return query_index[order][first], feature_ids[order][first]
+
+
+class Pipeline():
+    """ Class for chaining bigeo operations without writing intermediate shapefiles. """
+
+    def __init__(self, srcfile, chunksize=10000, fields=None, drop_types=None, metrics=None, bbox=None, mask=None, \
+        read_queue=0, write_queue=0):
+        """
+        Creates a pipeline reading from srcfile.
+
+        Features flow through the stages in chunks of chunksize features, so memory use depends on the \
+        chunk size and not on the size of the layer. Only the final output is written. The chunksize, fields, \
+        metrics, bbox and mask options of the other operations are the ones described here.
+
+        PARAMETER(S):
+
+        : srcfile : The source shapefile.
+
+        : chunksize : Number of features that flow between stages at a time.
+
+        : fields : List of the attribute fields to keep. The other fields are never decoded. None keeps all fields.
+
+        : drop_types : List of field types (ex. 'date', 'datetime') whose fields are never decoded.
+
+        : metrics : Metrics collecting counters and timers of the run. (ex. bigeo.Metrics())
+
+        : bbox : Only the features intersecting (minx, miny, maxx, maxy), in the crs of the source, are read.
+
+        : mask : Only the features intersecting mask are read. A shapely geometry, WKT or the path of a polygon layer.
+
+        : read_queue : Number of chunks a reader thread reads ahead of the stages. 0 reads in turn with the stages.
+
+        : write_queue : Number of chunks a writer thread writes behind the stages. 0 writes in turn with the stages. \
+        The time each thread waits on the queues is in the *_stall timers of the metrics.
+
+        EXAMPLE(S):
+
+        import bigeo
+        pipeline = bigeo.Pipeline('/home/polygon.shp')
+        pipeline.reproject('EPSG:3857').centroids().run('/home/centroids_3857.shp')
+
+        """
+
+        self.srcfile = srcfile
+        self.chunksize = chunksize
+        self.fields = fields
+        self.drop_types = drop_types
+        self.metrics = metrics or Metrics()
+        self.where = spatialFilter(bbox, mask)
+        self.read_queue = read_queue
+        self.write_queue = write_queue
+        self.stages = []
+        self.meta = None
+
+    def add(self, name, *args):
+        """
+        Adds a stage to the pipeline. See PIPELINE_STAGES for the stage names.
+
+        : name : Name of the stage. (ex. 'reproject', 'centroids')
+
+        : args : Arguments of the stage. (ex. the crs for 'reproject')
+
+        """
+
+        if name not in PIPELINE_STAGES:
+            raise ValueError('Unknown pipeline stage: ' + name)
+
+        self.stages.append((name, args))
+
+        return self
+
+    def reproject(self, crs):
+        """ Transforms the geometries to crs. """
+
+        return self.add('reproject', crs)
+
+    def setCrs(self, crs):
+        """ Sets the crs of the output to crs without transforming the coordinates. """
+
+        return self.add('setcrs', crs)
+
+    def bbox(self):
+        """ Replaces the geometries by their bounding boxes. """
+
+        return self.add('bbox')
+
+    def centroids(self):
+        """ Replaces the geometries by their centroids. """
+
+        return self.add('centroids')
+
+    def representativePoint(self):
+        """ Replaces the geometries by a point guaranteed to be within them. """
+
+        return self.add('representativepoint')
+
+    def snap(self, pointshp, tolerance, endpoints_only=False):
+        """ Snaps the vertices to the nearest point of pointshp within tolerance. """
+
+        return self.add('snap', pointshp, tolerance, 'endpoints' if endpoints_only else 'vertices')
+
+    def buffer(self, distance):
+        """ Buffers the geometries by distance, or by the value of the field if distance is a field name. """
+
+        return self.add('buffer', distance)
+
+    def repair(self, method='make_valid'):
+        """ Repairs invalid geometries with method ('make_valid' or 'buffer'), or drops them ('remove'). """
+
+        return self.add('repair', method)
+
+    def join(self, polygonfile, how='inner', prefix='', predicate='within', fields=()):
+        """ Joins the fields of the polygons of polygonfile to the points within them. See SpatialJoiner.join. """
+
+        return self.add('join', polygonfile, how, prefix, predicate, *fields)
+
+    def explode(self, partfield=None):
+        """ Writes each part of multipart features as a feature of its own. """
+
+        return self.add('explode', *([partfield] if partfield else []))
+
+    def removeDuplicates(self, tolerance=None, fields=()):
+        """ Drops features whose geometry and fields are equal to an earlier feature. """
+
+        return self.add('dedup', tolerance, *fields)
+
+    def chunks(self):
+        """
+        Generator of the _Chunk coming out of the last stage.
+
+        self.meta is set to the meta of the output once the first chunk is requested.
+
+        """
+
+        # Bounding boxes come from the record headers and points from the coordinates of the .shp, fiona only
+        # reads the attributes.
+        mapped = _MappedShapefile.open(self.srcfile)
+        bbox_first = bool(self.stages) and self.stages[0][0] == 'bbox'
+        exact = self.where is not None and self.where.geometry is not None
+
+        if mapped is not None and not (mapped.isXYPoint() or (bbox_first and not exact)):
+            mapped = None
+
+        with _openSource(self.srcfile, self.fields, self.drop_types, ignore_geometry=mapped is not None) as src:
+
+            meta = mapped.meta(src) if mapped is not None else src.meta
+            functions = []
+
+            for name, args in self.stages:
+                meta, function = PIPELINE_STAGES[name](meta, *args)
+                functions.append(function)
+
+            self.meta = meta
+            self.metrics.read(self.srcfile)
+
+            if mapped is None:
+                chunks = _readChunks(src, self.chunksize, self.where)
+            elif bbox_first:
+                chunks = _mappedChunks(src, mapped, mapped.boxes, self.chunksize, self.where)
+                functions = functions[1:]
+            else:
+                chunks = _mappedChunks(src, mapped, mapped.points, self.chunksize, self.where)
+
+            with contextlib.closing(_readAhead(chunks, self.read_queue, self.metrics)) as chunks:
+
+                for chunk in chunks:
+
+                    with self.metrics.timer('compute'):
+                        for function in functions:
+                            chunk = function(chunk)
+
+                    if len(chunk):
+                        yield chunk
+
+    def run(self, outfile, workers=1, partition='range', keep_order=True, incremental=False):
+        """
+        Runs the pipeline and writes the output to outfile.
+
+        With workers > 1, the source is split into partitions run by a pool of processes. Each process writes \
+        a partial output and the partial outputs are merged into outfile.
+
+        PARAMETER(S)
+
+        : outfile : The output file.
+
+        : workers : Number of processes. 1 runs the pipeline in this process.
+
+        : partition : 'range' splits the source into ranges of consecutive features. 'tile' splits it into a grid \
+        of tiles by the center of the feature bounds, so each process reads a compact area of the layer.
+
+        : keep_order : If True the features of outfile are in the order of the source, else tiles are written \
+        one after another. Ranges always keep the order.
+
+        : incremental : If True, a manifest of the hash of each source feature is kept next to outfile. The next \
+        incremental run recomputes only the added and changed features and copies the records of the unchanged \
+        ones from the previous outfile. Runs in this process.
+
+        RETURN(S)
+
+        : count : Number of features written.
+
+        """
+
+        whole_layer = [name for name, _ in self.stages if name in _WHOLE_LAYER_STAGES]
+
+        if whole_layer and (workers > 1 or incremental):
+            logging.warning("Stage %s needs all the features, running the pipeline on the whole layer in one " \
+                "process.", whole_layer[0])
+        elif incremental:
+            return self._runIncremental(outfile)
+        elif workers > 1:
+            return self._runPartitioned(outfile, workers, partition, keep_order)
+
+        count = self._write(outfile)[0]
+
+        self.metrics.written(outfile)
+
+        logging.info("Pipeline wrote %s features to %s", count, outfile)
+
+        return count
+
+    def runOutputs(self, outputs):
+        """
+        Runs the pipeline once and writes several outputs. Each output applies its own stages to the features \
+        coming out of the pipeline, so the source is read and its geometries are decoded once for all outputs.
+
+        PARAMETER(S)
+
+        : outputs : Dict of the stages of each output file, as a list of (stage name, args) or a pipeline spec. \
+        (ex. {'/home/bbox.shp': 'bbox', '/home/centroids.shp': [('centroids', ())]})
+
+        RETURN(S)
+
+        : counts : Dict of the number of features written to each output file.
+
+        EXAMPLE(S):
+
+        import bigeo
+        pipeline = bigeo.Pipeline('/home/polygon.shp')
+        pipeline.runOutputs({'/home/bbox.shp': 'bbox', '/home/centroids.parquet': 'reproject:EPSG:3857;centroids'})
+
+        """
+
+        branches = []
+
+        for outfile, stages in outputs.items():
+
+            stages = parsePipelineSpec(stages) if isinstance(stages, str) else list(stages)
+
+            for name, args in stages:
+                if name not in PIPELINE_STAGES:
+                    raise ValueError('Unknown pipeline stage: ' + name)
+
+            branches.append((outfile, stages))
+
+        counts = dict((outfile, 0) for outfile, _ in branches)
+        chunks = self.chunks()
+        metrics = self.metrics
+
+        try:
+            first = next(chunks)
+        except StopIteration:
+            first = None
+
+        with contextlib.ExitStack() as stack:
+
+            sinks = []
+
+            for outfile, stages in branches:
+
+                meta, functions = self.meta, []
+
+                for name, args in stages:
+                    meta, function = PIPELINE_STAGES[name](meta, *args)
+                    functions.append(function)
+
+                dst = stack.enter_context(_openSink(outfile, meta))
+                write = stack.enter_context(_writeBehind(lambda chunk, dst=dst: _writeChunk(dst, chunk, metrics), \
+                    self.write_queue, metrics))
+                sinks.append((outfile, functions, write))
+
+            for chunk in itertools.chain([first] if first is not None else [], chunks):
+                for outfile, functions, write in sinks:
+
+                    derived = chunk
+
+                    with metrics.timer('compute'):
+                        for function in functions:
+                            derived = function(derived)
+
+                    if len(derived):
+                        write(derived)
+                        counts[outfile] += len(derived)
+
+        for outfile, count in counts.items():
+            metrics.written(outfile)
+            logging.info("Pipeline wrote %s features to %s", count, outfile)
+
+        return counts
+
+    def _write(self, outfile):
+        """ Runs the pipeline in this process. Returns the number of features written and their ids in the source. """
+
+        import numpy as np
+
+        count = 0
+        fids = []
+        chunks = self.chunks()
+        metrics = self.metrics
+
+        try:
+            first = next(chunks)
+        except StopIteration:
+            first = None
+
+        with _openSink(outfile, self.meta) as dst, \
+            _writeBehind(lambda chunk: _writeChunk(dst, chunk, metrics), self.write_queue, metrics) as write:
+
+            for chunk in itertools.chain([first] if first is not None else [], chunks):
+                write(chunk)
+                count += len(chunk)
+                fids.append(chunk.fids)
+
+        fids = np.concatenate(fids + [np.empty(0, dtype=np.int64)]) if all(f is not None for f in fids) else None
+
+        return count, fids
+
+    def _runIncremental(self, outfile):
+
+        import numpy as np
+
+        metrics = self.metrics
+
+        with metrics.timer('hash'):
+            hashes = _featureHashes(self.srcfile)
+
+        key = self._fingerprint()
+        manifest = _loadManifest(outfile, key)
+        fids = np.arange(len(hashes))
+
+        changed = fids
+
+        if manifest is not None:
+
+            old_hashes, old_first, old_count = manifest
+
+            if len(old_hashes) == len(hashes) and (old_hashes == hashes).all():
+                logging.info("%s is up to date with %s", outfile, self.srcfile)
+                metrics.count('features_reused', len(hashes))
+                return int(old_count.sum())
+
+            # Features are matched with a previous feature of the same hash, wherever it was in the source.
+            matched = np.zeros(len(hashes), dtype=bool)
+            previous = np.zeros(len(hashes), dtype=np.int64)
+
+            if len(old_hashes):
+                order = np.argsort(old_hashes, kind='stable')
+                previous = order[np.minimum(np.searchsorted(old_hashes[order], hashes), len(order) - 1)]
+                matched = old_hashes[previous] == hashes
+
+            changed = fids[~matched]
+
+        delta = copy.copy(self)
+        delta.where = self.where.restrict(changed) if self.where is not None else _SpatialFilter(fids=changed)
+
+        tmpdir = tempfile.mkdtemp(prefix='.bigeo-', dir=os.path.dirname(os.path.abspath(outfile)))
+
+        try:
+            deltafile = os.path.join(tmpdir, 'delta' + os.path.splitext(outfile)[1])
+            count, delta_fids = delta._write(deltafile if manifest is not None else outfile)
+            self.meta = delta.meta
+
+            counts = np.bincount(delta_fids, minlength=len(hashes)).astype(np.int64)
+            starts = np.cumsum(counts) - counts
+            parts = np.ones(len(hashes), dtype=np.int64)
+
+            if manifest is not None:
+
+                reused = np.flatnonzero(matched)
+                counts[reused] = old_count[previous[reused]]
+                starts[reused] = old_first[previous[reused]]
+                parts[reused] = 0
+
+                # Output features in source order, each from the previous output (part 0) or the delta (part 1).
+                part = np.repeat(parts, counts)
+                feature = np.repeat(starts, counts) + np.arange(counts.sum()) - \
+                    np.repeat(np.cumsum(counts) - counts, counts)
+
+                with metrics.timer('merge'):
+                    mergedfile = os.path.join(tmpdir, 'merged' + os.path.splitext(outfile)[1])
+                    count = _mergeParts([outfile, deltafile], mergedfile, self.meta, (part, feature))
+                    _replaceDataset(mergedfile, outfile)
+
+                metrics.count('features_reused', len(reused))
+
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+        _saveManifest(outfile, key, hashes, np.cumsum(counts) - counts, counts)
+
+        metrics.count('features_recomputed', len(changed))
+        metrics.written(outfile)
+
+        logging.info("Pipeline recomputed %s of %s features and wrote %s features to %s", len(changed), len(hashes), \
+            count, outfile)
+
+        return count
+
+    def _fingerprint(self):
+        """ Hash of everything but the source features that the output depends on. """
+
+        import shapely
+
+        def stamp(value):
+            if isinstance(value, str) and os.path.exists(value):
+                return [value, os.path.getsize(value), os.stat(value).st_mtime_ns]
+            return value
+
+        where = self.where
+        spec = {
+            'stages': [[name, [stamp(arg) for arg in args]] for name, args in self.stages],
+            'fields': self.fields,
+            'drop_types': self.drop_types,
+            'where': shapely.to_wkb(where.geometry, hex=True) if where is not None and where.geometry is not None \
+                else None,
+            'selection': where.selection.tolist() if where is not None and where.selection is not None else None,
+        }
+
+        return hashlib.sha1(json.dumps(spec, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def _runPartitioned(self, outfile, workers, partition, keep_order):
+
+        metrics = self.metrics
+
+        with metrics.timer('partition'):
+            partitions = _partitions(self.srcfile, self.where, workers * 4, partition)
+
+        logging.info("Running the pipeline on %s %s partitions with %s workers.", len(partitions), partition, workers)
+
+        tmpdir = tempfile.mkdtemp(prefix='.bigeo-', dir=os.path.dirname(os.path.abspath(outfile)))
+        extension = os.path.splitext(outfile)[1]
+
+        try:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+
+                futures = []
+
+                for i, fids in enumerate(partitions):
+
+                    part = copy.copy(self)
+                    part.where = self.where.restrict(fids) if self.where is not None else _SpatialFilter(fids=fids)
+                    part.metrics = Metrics()
+
+                    partfile = os.path.join(tmpdir, 'part%05d%s' % (i, extension))
+                    futures.append(pool.submit(_runPartition, part, partfile))
+
+                results = [future.result() for future in futures]
+
+            for result in results:
+                metrics.merge(result['metrics'])
+
+            self.meta = results[0]['meta']
+            order = None
+
+            if keep_order and partition == 'tile':
+                order = _sourceOrder([result['fids'] for result in results])
+
+            with metrics.timer('merge'):
+                count = _mergeParts([result['file'] for result in results], outfile, self.meta, order)
+
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+        metrics.read(self.srcfile)
+        metrics.written(outfile)
+
+        logging.info("Pipeline wrote %s features to %s", count, outfile)
+
+        return count
+
+
+class OpenWeather():
+    """ Class for requesting weather data from open weather and creates a shapefile with that data on its location."""
+
+    # The group endpoint accepts at most 20 city ids per call.
+    URL = 'http://api.openweathermap.org/data/2.5/group'
+    BATCH_SIZE = 20
+
+    def getWeather(self, path_ids_file, ow_api, outputshp, batch_size=BATCH_SIZE, concurrency=4, cache_dir=None, \
+        ttl=600, url=URL, metrics=None):
+        """
+        Requests for the current weather data to openweather.com and generates a shapefile.
+
+        The city ids are split in batches of batch_size ids that are requested concurrently over a pool \
+        of connections. Responses can be cached on disk so a re-run within ttl seconds skips the network.
+
+        IMPORTANT: This requires api key from openweather. Please register for a free account.
+        
+        PARAMETER(S):
+
+        : path_ids_file : Path to a file consist of city ids separated by comma with no spaces. (Ex: 1701668,7521309,1724089) See openweather documentation for city ids. 
+
+        : ow_api : Your api key from openweather.
+
+        : outputshp : Output Shapefile.
+
+        : batch_size : Number of city ids per request. The group endpoint accepts at most 20.
+
+        : concurrency : Maximum number of requests in flight.
+
+        : cache_dir : Directory of the response cache. None disables the cache.
+
+        : ttl : Seconds a cached response stays fresh.
+
+        : url : URL of the group endpoint.
+
+        : metrics : Shared option, described in Pipeline.
+
+        EXAMPLE(S):
+
+        import bigeo
+        ow = bigeo.OpenWeather()
+        ow.getWeather('/home/openweather_id.txt', '462c34bsdgddgded8643643f352a', "/home/output_weather/wx.shp")
+        ow.getWeather('/home/openweather_id.txt', '462c34bsdgddgded8643643f352a', "/home/output_weather/wx.shp", cache_dir='/home/wx_cache')
+
+        """
+
+        import fiona
+        import asyncio
+
+        logging.info("Reading file for city ids: " + path_ids_file)
+
+        with open(path_ids_file, "r") as f:
+            self.ids = [i.strip() for i in f.read().replace('\n', ',').split(',') if i.strip()]
+
+        self.api_id = ow_api
+
+        self.outputshp = outputshp
+
+        logging.info("City ids found: %s", len(self.ids))
+
+        self.metrics = metrics = metrics or Metrics()
+
+        with metrics.timer('fetch'):
+            cities = asyncio.run(self.fetchWeather(self.ids, ow_api, batch_size, concurrency, cache_dir, ttl, url))
+
+        logging.info("Recieved weather of %s cities.", len(cities))
+
+        crs = fiona.crs.from_epsg(4326)
+
+        schema = {
+                'geometry': 'Point',
+                'properties': 
+                        {
+                          'city' :'str', 
+                          'humidity': 'int',
+                          'pressure': 'int',
+                          'temp': 'int',
+                          'weather_de': 'str',
+                          'wind_dir': 'float',
+                          'wind_speed': 'float', 
+                        }
+                    }
+
+        logging.info("Creating output shapefile: " + self.outputshp)
+
+        with _openSink(self.outputshp, {'crs': crs, 'schema': schema, 'driver': "ESRI Shapefile"}) as shpfile:
+
+            records = []
+
+            for i in cities:
+
+                point = {u"type": u"Point", u"coordinates": [i['coord']['lon'], i['coord']['lat']]}
+                properties = {
+                              'city' : i['name'], 
+                              'humidity': i['main']['humidity'],
+                              'pressure': i['main']['pressure'],
+                              'temp': i['main']['temp'],
+                              'weather_de': i['weather'][0]['main'],
+                              'wind_dir': i['wind'].get('deg'),
+                              'wind_speed': i['wind']['speed'],
+                            }
+
+                records.append({'geometry': point, 'properties': properties})
+
+            with metrics.timer('write'):
+                shpfile.writerecords(records)
+
+            metrics.features(len(records))
+
+        metrics.written(self.outputshp)
+
+        logging.info("Writing output shapefile: " + self.outputshp)
+
+        return len(cities)
+
+    async def fetchWeather(self, ids, ow_api, batch_size=BATCH_SIZE, concurrency=4, cache_dir=None, ttl=600, url=URL):
+        """
+        Requests the current weather of the city ids in batches.
+
+        RETURN(S)
+
+        : cities : List of the weather of each city as returned by the group endpoint.
+
+        """
+
+        import asyncio
+        import aiohttp
+
+        cache = _ResponseCache(cache_dir, ttl) if cache_dir else None
+        semaphore = asyncio.Semaphore(concurrency)
+        batches = [ids[i:i + batch_size] for i in range(0, len(ids), batch_size)]
+
+        async def fetch(session, batch):
+
+            params = {'id': ','.join(batch), 'units': 'metric'}
+
+            if cache is not None:
+                cached = cache.get(url, params)
+                if cached is not None:
+                    return cached
+
+            async with semaphore:
+                async with session.get(url, params=dict(params, APPID=ow_api)) as response:
+                    response.raise_for_status()
+                    data = await response.json(content_type=None)
+
+            if cache is not None:
+                cache.put(url, params, data)
+
+            return data
+
+        connector = aiohttp.TCPConnector(limit=concurrency)
+
+        async with aiohttp.ClientSession(connector=connector) as session:
+            responses = await asyncio.gather(*[fetch(session, batch) for batch in batches])
+
+        return [city for response in responses for city in response['list']]
+
+
+class SnapLineToPoints():
+    """ Class to snap lines to points. """
+
+    def snapLineToPoints(self, pointshp, lineshp, outshpdir, tolerance=1.0, endpoints_only=False, chunksize=10000, \
+        metrics=None, spatial_index=None, bbox=None, mask=None):
+        """
+        Function to snap lines to points.
+
+        Every vertex of the lines is moved onto the nearest point of pointshp if that point is within tolerance. \
+        The points are indexed once with an STRtree, or loaded from the SpatialIndex sidecar of pointshp, and \
+        the vertices of each chunk of lines are looked up in a single nearest neighbour query.
+
+        PARAMETER(S):
+
+        : pointshp : The point shapefile to snap to.
+
+        : lineshp : The line shapefile to be snapped.
+
+        : outshpdir : Directory of the snapped line shapefile. It will have the same name as lineshp.
+
+        : tolerance : Maximum distance, in crs units, a vertex is moved.
+
+        : endpoints_only : If True, only the first and last vertex of each line are snapped.
+
+        : chunksize, metrics, bbox, mask : Shared options, described in Pipeline.
+
+        : spatial_index : None uses the SpatialIndex sidecar of pointshp if it is up to date, True builds it \
+        if needed, False always indexes in memory.
+
+        RETURN(S)
+
+        : outfile : The path of the snapped line shapefile.
+
+        EXAMPLE(S):
+
+        import bigeo
+        snapper = bigeo.SnapLineToPoints()
+        snapper.snapLineToPoints('/home/point.shp', '/home/line.shp', '/home/outdir', tolerance=5)
+
+        """
+
+        self.pointshp = pointshp
+        self.lineshp = lineshp
+        self.outfile = os.path.join(outshpdir, os.path.basename(lineshp))
+
+        if os.path.abspath(self.outfile) == os.path.abspath(lineshp) or \
+            (os.path.exists(self.outfile) and os.path.samefile(self.outfile, lineshp)):
+            raise ValueError("The snapped lines would overwrite " + lineshp + ". Use another outshpdir.")
+
+        self.metrics = metrics = metrics or Metrics()
+
+        logging.info("Indexing points of: " + self.pointshp)
+
+        with metrics.timer('index'):
+            snapper = _PointSnapper(self.pointshp, tolerance, endpoints_only, spatial_index)
+
+        logging.info("Snapping lines of: " + self.lineshp)
+
+        with _openSource(self.lineshp) as src:
+
+            with _openSink(self.outfile, src.meta) as dst:
+
+                for chunk in _timed(_readChunks(src, chunksize, spatialFilter(bbox, mask)), metrics, 'read'):
+                    with metrics.timer('compute'):
+                        chunk = snapper.snap(chunk)
+                    _writeChunk(dst, chunk, metrics)
+
+        self.snapped = snapper.snapped
+
+        metrics.count('snapped', self.snapped)
+        metrics.read(self.pointshp)
+        metrics.read(self.lineshp)
+        metrics.written(self.outfile)
+
+        logging.info("Snapped %s vertices. Output file: %s", self.snapped, self.outfile)
+
+        return self.outfile
+
+
+class SpatialJoiner():
+    """ Class to join the attributes of polygons to the points within them. """
+
+    def join(self, pointfile, polygonfile, outfile, polygon_fields=None, how='inner', prefix='', predicate='within', \
+        chunksize=100000, fields=None, workers=1, metrics=None, bbox=None, mask=None):
+        """
+        Point in polygon spatial join.
+
+        Writes the points of pointfile with the attributes of the polygon of polygonfile they are in. The \
+        polygons are loaded, prepared and indexed with an STRtree once per process. Each chunk of points is \
+        matched in a single STRtree query followed by a vectorized containment test.
+
+        PARAMETER(S):
+
+        : pointfile : The point layer. (ex. weather stations)
+
+        : polygonfile : The polygon layer whose attributes are joined. (ex. administrative regions)
+
+        : outfile : The joined point layer to be created.
+
+        : polygon_fields : List of the polygon fields to join. None joins all fields.
+
+        : how : 'inner' writes only the points within a polygon, 'left' writes all points, with empty polygon \
+        attributes for the points in no polygon. A point in several polygons is written once per polygon.
+
+        : prefix : Prefix of the names of the joined fields. (ex. 'reg_')
+
+        : predicate : 'within' matches the points inside the polygons, 'intersects' also those on their boundary.
+
+        : workers : Number of processes. The points are split into partitions of consecutive features.
+
+        : chunksize, fields, metrics, bbox, mask : Shared options, described in Pipeline. fields, bbox and mask \
+        apply to the points.
+
+        RETURN(S)
+
+        : count : Number of points written.
+
+        EXAMPLE(S):
+
+        import bigeo
+        joiner = bigeo.SpatialJoiner()
+        joiner.join('/home/stations.shp', '/home/regions.shp', '/home/stations_regions.shp', \
+            polygon_fields=['NAME'], prefix='reg_', workers=8)
+
+        """
+
+        self.pointfile = pointfile
+        self.polygonfile = polygonfile
+        self.outfile = outfile
+
+        logging.info("Joining the polygons of %s to the points of %s", polygonfile, pointfile)
+
+        pipeline = Pipeline(pointfile, chunksize, fields=fields, metrics=metrics, bbox=bbox, mask=mask)
+        pipeline.add('join', polygonfile, how, prefix, predicate, *(polygon_fields or []))
+
+        self.count = pipeline.run(outfile, workers)
+        self.meta = pipeline.meta
+        self.metrics = pipeline.metrics
+
+        self.metrics.read(polygonfile)
+
+        logging.info("Joined %s points. Output file: %s", self.count, outfile)
+
+        return self.count
+
+
+class DuplicatesRemover():
+    """ Class to remove duplicate features in shapefiles. """
+
+    def removeDuplicates(self, srcfile, outfile, tolerance=None, fields=None, memory_limit=256, chunksize=10000, \
+        metrics=None, bbox=None, mask=None):
+        """
+        Removes duplicate features in a single streaming pass. The first feature of each duplicate is kept.
+
+        Features are compared by a 128 bit hash of their normalized WKB geometry, so only the hashes are \
+        kept in memory. When the hashes exceed memory_limit they are spilled to disk partitions.
+
+        PARAMETER(S):
+
+        : srcfile : The source shapefile.
+
+        : outfile : The shapefile without duplicates to be created.
+
+        : tolerance : If given, coordinates are snapped to a grid of this size before hashing so geometries \
+        that differ by less than the grid are duplicates. None compares exact geometries.
+
+        : fields : List of attribute names that must also be equal for features to be duplicates. \
+        None compares only the geometries.
+
+        : memory_limit : Memory in MB the hashes can use before spilling to disk.
+
+        : chunksize, metrics, bbox, mask : Shared options, described in Pipeline.
+
+        RETURN(S)
+
+        : removed : Number of duplicate features removed.
+
+        EXAMPLE(S):
+
+        import bigeo
+        dr = bigeo.DuplicatesRemover()
+        dr.removeDuplicates('/home/polygon.shp', '/home/polygon_nodup.shp', tolerance=0.001, fields=['NAME'])
+
+        """
+
+        self.srcfile = srcfile
+        self.outfile = outfile
+
+        logging.info("Reading file: " + self.srcfile)
+
+        self.metrics = metrics = metrics or Metrics()
+
+        duplicates = _DuplicateFilter(tolerance, fields, memory_limit)
+
+        try:
+            with _openSource(self.srcfile) as src:
+
+                with _openSink(self.outfile, src.meta) as dst:
+
+                    for chunk in _timed(_readChunks(src, chunksize, spatialFilter(bbox, mask)), metrics, 'read'):
+                        with metrics.timer('compute'):
+                            chunk = duplicates.filter(chunk)
+                        _writeChunk(dst, chunk, metrics)
+
+        finally:
+            duplicates.close()
+
+        self.removed = duplicates.removed
+
+        metrics.count('removed', self.removed)
+        metrics.read(self.srcfile)
+        metrics.written(self.outfile)
+
+        logging.info("Removed %s duplicates. Output file: %s", self.removed, self.outfile)
+
+        return self.removed
+
+class PolygonOverlapsRemover():
+    """ Class to remove overlaps in polygons. """
+
+    RULES = ('first', 'largest')
+
+    def removeOverlaps(self, srcfile, outfile, rule='first', tiles=1, workers=1, chunksize=10000, metrics=None, \
+        spatial_index=None, bbox=None, mask=None):
+        """
+        Removes the overlaps between the polygons of a shapefile.
+
+        Candidate pairs are found with an STRtree over all polygons. For each overlapping pair the polygon that \
+        wins by rule keeps the overlapping area and it is cut out of the other one. Polygons completely covered \
+        by winning polygons are dropped. The whole layer is read in memory for the candidate search.
+
+        PARAMETER(S):
+
+        : srcfile : The source polygon shapefile.
+
+        : outfile : The polygon shapefile without overlaps to be created.
+
+        : rule : 'first' keeps the overlap in the polygon that comes first in srcfile. \
+        'largest' keeps it in the polygon with the larger area.
+
+        : tiles : The extent is split in tiles x tiles tiles. The polygons of each tile are resolved \
+        as one job. Pairs are found over the whole layer so polygons on the seams are handled correctly.
+
+        : workers : Number of processes resolving the tiles.
+
+        : chunksize, metrics, bbox, mask : Shared options, described in Pipeline.
+
+        : spatial_index : None uses the SpatialIndex sidecar of srcfile if it is up to date, True builds it \
+        if needed, False always indexes in memory.
+
+        RETURN(S)
+
+        : stats : Dict with the number of features, overlaps resolved, dropped polygons and seconds per phase.
+
+        EXAMPLE(S):
+
+        import bigeo
+        por = bigeo.PolygonOverlapsRemover()
+        por.removeOverlaps('/home/landcover.shp', '/home/landcover_clean.shp', rule='largest', tiles=8, workers=8)
+
+        """
+
+        import numpy as np
+        import shapely
+
+        if rule not in self.RULES:
+            raise ValueError('Unknown overlap rule: ' + str(rule))
+
+        self.srcfile = srcfile
+        self.outfile = outfile
+
+        self.metrics = metrics = metrics or Metrics()
+        phases = ('read', 'index', 'resolve', 'write')
+        before = dict((phase, metrics.timers[phase]) for phase in phases)
+
+        logging.info("Reading file: " + self.srcfile)
+
+        with metrics.timer('read'):
+
+            with _openSource(self.srcfile) as src:
+                meta = src.meta
+                layer = _concatChunks(list(_readChunks(src, chunksize, spatialFilter(bbox, mask))))
+
+            geoms, props = layer.geoms, layer.props
+
+        logging.info("Searching overlapping pairs of %s polygons.", len(geoms))
+
+        with metrics.timer('index'):
+            left, right = _overlappingPairs(geoms, _spatialIndex(self.srcfile, spatial_index), layer.fids)
+
+        with metrics.timer('resolve'):
+
+            if rule == 'largest':
+                # Larger area first, ties go to the first polygon.
+                order = np.lexsort((np.arange(len(geoms)), -np.nan_to_num(shapely.area(geoms))))
+            else:
+                order = np.arange(len(geoms))
+
+            rank = np.empty(len(geoms), dtype=np.int64)
+            rank[order] = np.arange(len(geoms))
+
+            left_wins = rank[left] < rank[right]
+            losers = np.where(left_wins, right, left)
+            winners = np.where(left_wins, left, right)
+
+            geoms = geoms.copy()
+
+            for indices, results in _resolveOverlapTiles(geoms, losers, winners, tiles, workers):
+                geoms[indices] = results
+
+            keep = np.flatnonzero(~shapely.is_empty(geoms))
+            result = _Chunk(geoms, props).take(keep)
+
+        logging.info("Writing output file: " + self.outfile)
+
+        with _openSink(self.outfile, meta) as dst:
+            for start in range(0, len(result), chunksize):
+                _writeChunk(dst, result.slice(start, start + chunksize), metrics)
+
+        self.stats = {'features': len(props), 'overlaps': len(losers), 'dropped': len(props) - len(keep), \
+            'timings': dict((phase, metrics.timers[phase] - before[phase]) for phase in phases)}
+
+        metrics.count('overlaps', self.stats['overlaps'])
+        metrics.read(self.srcfile)
+        metrics.written(self.outfile)
+
+        logging.info("Resolved %s overlaps, dropped %s polygons.", self.stats['overlaps'], self.stats['dropped'])
+
+        return self.stats
+
+class BufferCreator():
+    """ Class to create fixed distance or attribute driven buffers. """
+
+    def getBuffer(self, srcfile, outfile, distance=None, field=None, dissolve=False, resolution=16, workers=1, \
+        chunksize=10000, dissolve_limit=5000000, metrics=None, bbox=None, mask=None):
+        """
+        Creates a polygon shapefile of buffers around the features of srcfile.
+
+        Features are buffered a chunk at a time, in a process pool if workers > 1. Buffers will have the \
+        attributes of their respective features unless they are dissolved.
+
+        PARAMETER(S):
+
+        : srcfile : The source shapefile.
+
+        : outfile : The name of the buffer shapefile to be created.
+
+        : distance : Fixed buffer distance in crs units.
+
+        : field : Name of a numeric field holding the buffer distance of each feature. Used instead of distance.
+
+        : dissolve : If True, all buffers are merged into a single feature with a tree based unary union.
+
+        : resolution : Number of segments used to approximate a quarter circle.
+
+        : workers : Number of processes buffering the chunks.
+
+        : dissolve_limit : Maximum number of vertices held by the partial unions of the dissolve. Past it the \
+        partial unions are merged together, which keeps the memory of large dissolves bounded.
+
+        : chunksize, metrics, bbox, mask : Shared options, described in Pipeline.
+
+        RETURN(S)
+
+        : count : Number of buffers written, 1 when dissolved.
+
+        EXAMPLE(S):
+
+        import bigeo
+        bc = bigeo.BufferCreator()
+        bc.getBuffer('/home/roads.shp', '/home/roads_buffer.shp', distance=50, dissolve=True, workers=8)
+        bc.getBuffer('/home/wells.shp', '/home/wells_buffer.shp', field='RADIUS')
+
+        """
+
+        import numpy as np
+        import shapely
+
+        if distance is None and field is None:
+            raise ValueError("A buffer distance or a distance field is required.")
+
+        self.srcfile = srcfile
+        self.outfile = outfile
+
+        count = 0
+        self.metrics = metrics = metrics or Metrics()
+
+        logging.info("Reading file: " + self.srcfile)
+
+        with _openSource(self.srcfile) as src:
+
+            meta = _withGeometryType(src.meta, 'Polygon')
+            chunks = _timed(_readChunks(src, chunksize, spatialFilter(bbox, mask)), metrics, 'read')
+            buffers = _timed(_bufferChunks(chunks, distance, field, resolution, workers), metrics, 'compute')
+
+            if dissolve:
+                dissolver = _Dissolver(dissolve_limit)
+
+                for chunk in buffers:
+                    with metrics.timer('dissolve'):
+                        dissolver.add(chunk.geoms)
+
+                with metrics.timer('dissolve'):
+                    dissolved = dissolver.result()
+
+                # The union of the buffers is often several polygons, the layer is typed for it.
+                if shapely.get_type_id(dissolved) == 3 and not shapely.is_empty(dissolved):
+                    dissolved = shapely.multipolygons([dissolved])
+
+                meta['schema'] = {'geometry': 'MultiPolygon', 'properties': {'id': 'int'}}
+                buffers = [_Chunk(np.array([dissolved], dtype=object), [{'id': 1}])]
+
+            logging.info("Creating output file: " + self.outfile)
+
+            with _openSink(self.outfile, meta) as dst:
+                for chunk in buffers:
+                    _writeChunk(dst, chunk, metrics)
+                    count += len(chunk)
+
+        metrics.read(self.srcfile)
+        metrics.written(self.outfile)
+
+        logging.info("Done creating buffers. Writing to the specified output file.")
+
+        return count
+
+class InvalidGeomRemover():
+    """ Class to check for invalid geometries and repair or remove them. """
+
+    METHODS = ('make_valid', 'buffer', 'remove')
+
+    def removeInvalid(self, srcfile, outfile, reportfile=None, method='make_valid', workers=1, chunksize=10000, \
+        metrics=None, bbox=None, mask=None):
+        """
+        Checks the validity of every geometry and repairs or removes the invalid ones.
+
+        A cheap pre-check skips geometries that are valid by construction (finite points, lines with length, \
+        convex polygons without holes), the others are checked a chunk at a time. The reason of the invalidity is only \
+        computed for the geometries that fail. Chunks are checked and repaired in a process pool if workers > 1.
+
+        PARAMETER(S):
+
+        : srcfile : The source shapefile.
+
+        : outfile : The shapefile with valid geometries to be created.
+
+        : reportfile : CSV file listing the feature id, reason and repair of each invalid feature. \
+        Defaults to the outfile name ending with _invalid.csv.
+
+        : method : 'make_valid' repairs with shapely make_valid keeping the parts of the original dimension. \
+        'buffer' repairs with buffer(0). Be cautious as parts of self intersecting polygons may be lost. \
+        'remove' drops the invalid features.
+
+        : workers : Number of processes checking and repairing the chunks.
+
+        : chunksize, metrics, bbox, mask : Shared options, described in Pipeline.
+
+        RETURN(S)
+
+        : stats : Dict with the number of features, invalid, repaired and removed features.
+
+        EXAMPLE(S):
+
+        import bigeo
+        igr = bigeo.InvalidGeomRemover()
+        igr.removeInvalid('/home/polygon.shp', '/home/polygon_valid.shp', workers=8)
+
+        """
+
+        import numpy as np
+        import shapely
+
+        if method not in self.METHODS:
+            raise ValueError('Unknown repair method: ' + str(method))
+
+        self.srcfile = srcfile
+        self.outfile = outfile
+        self.reportfile = reportfile or os.path.splitext(outfile)[0] + '_invalid.csv'
+
+        self.stats = {'features': 0, 'invalid': 0, 'repaired': 0, 'removed': 0}
+        self.metrics = metrics = metrics or Metrics()
+
+        logging.info("Reading file: " + self.srcfile)
+
+        with _openSource(self.srcfile) as src, open(self.reportfile, 'w', newline='') as report:
+
+            writer = csv.writer(report)
+            writer.writerow(['fid', 'reason', 'repair'])
+
+            with _openSink(self.outfile, src.meta) as dst:
+
+                offset = 0
+
+                chunks = _timed(_readChunks(src, chunksize, spatialFilter(bbox, mask)), metrics, 'read')
+
+                validated = _timed(_validateChunks(chunks, method, workers), metrics, 'compute')
+
+                for chunk, (invalid, reasons, repaired) in validated:
+
+                    geoms = chunk.geoms.copy()
+                    geoms[invalid] = repaired
+
+                    dropped = invalid[shapely.is_missing(repaired) | shapely.is_empty(repaired)]
+                    keep = np.setdiff1d(np.arange(len(chunk)), dropped)
+
+                    fids = chunk.fids if chunk.fids is not None else np.arange(offset, offset + len(chunk))
+
+                    for i, reason, geom in zip(invalid.tolist(), reasons, repaired):
+                        repair = method if geom is not None and not shapely.is_empty(geom) else 'remove'
+                        writer.writerow([int(fids[i]), reason, repair])
+
+                    _writeChunk(dst, chunk.withGeoms(geoms).take(keep), metrics)
+
+                    self.stats['features'] += len(chunk)
+                    self.stats['invalid'] += len(invalid)
+                    self.stats['removed'] += len(dropped)
+                    offset += len(chunk)
+
+        self.stats['repaired'] = self.stats['invalid'] - self.stats['removed']
+
+        metrics.count('invalid', self.stats['invalid'])
+        metrics.read(self.srcfile)
+        metrics.written(self.outfile)
+
+        logging.info("Found %s invalid geometries, repaired %s, removed %s. Report: %s", self.stats['invalid'], \
+            self.stats['repaired'], self.stats['removed'], self.reportfile)
+
+        return self.stats
+
+class MultipartToSinglepart():
+    """ Class to convert multipart features to singlepart features. """
+
+    def explode(self, srcfile, outfile, partfield=None, chunksize=10000, metrics=None, bbox=None, mask=None):
+        """
+        Writes each part of the multipart features of srcfile as a feature of its own.
+
+        Parts are streamed: at most chunksize parts are converted and written at a time, even for features with \
+        tens of thousands of parts. The parts of a feature share its attribute values. Features without \
+        geometry are written once with no geometry.
+
+        PARAMETER(S):
+
+        : srcfile : The source multipart shapefile.
+
+        : outfile : The singlepart shapefile to be created.
+
+        : partfield : Name of an integer field to be added with the index of the part within its feature.
+
+        : chunksize, metrics, bbox, mask : Shared options, described in Pipeline.
+
+        RETURN(S)
+
+        : count : Number of parts written.
+
+        EXAMPLE(S):
+
+        import bigeo
+        mts = bigeo.MultipartToSinglepart()
+        mts.explode('/home/multipolygon.shp', '/home/polygon.shp', partfield='PART')
+
+        """
+
+        self.srcfile = srcfile
+        self.outfile = outfile
+
+        count = 0
+        self.metrics = metrics = metrics or Metrics()
+
+        logging.info("Reading file: " + self.srcfile)
+
+        with _openSource(self.srcfile) as src:
+
+            meta = _explodeMeta(src.meta, partfield)
+
+            logging.info("Creating output file: " + self.outfile)
+
+            with _openSink(self.outfile, meta) as dst:
+
+                for chunk in _timed(_readChunks(src, chunksize, spatialFilter(bbox, mask)), metrics, 'read'):
+
+                    with metrics.timer('compute'):
+                        index, part = _partIndex(chunk.geoms)
+
+                    for start in range(0, len(index), chunksize):
+
+                        with metrics.timer('compute'):
+                            parts = _explodeChunk(chunk, partfield, index[start:start + chunksize], \
+                                part[start:start + chunksize])
+
+                        _writeChunk(dst, parts, metrics)
+
+                    count += len(index)
+
+        metrics.read(self.srcfile)
+        metrics.written(self.outfile)
+
+        logging.info("Wrote %s parts to: %s", count, self.outfile)
+
+        return count
+
+class FieldTypeRemover():
+    """ Class to remove unnecessary fields according to type. (ex. DATE TYPE FIELD) """
+
+    def removeFieldTypes(self, srcfile, outfile, types=('date',), chunksize=10000, metrics=None, bbox=None, mask=None):
+        """
+        Copies srcfile without the fields of the given types.
+
+        The fields are removed from the schema before reading, so the reader never decodes them.
+
+        PARAMETER(S):
+
+        : srcfile : The source shapefile.
+
+        : outfile : The shapefile without the fields to be created.
+
+        : types : List of field types to remove. (ex. 'date', 'datetime', 'time', 'str', 'int', 'float')
+
+        : chunksize, metrics, bbox, mask : Shared options, described in Pipeline.
+
+        RETURN(S)
+
+        : count : Number of features written.
+
+        EXAMPLE(S):
+
+        import bigeo
+        ftr = bigeo.FieldTypeRemover()
+        ftr.removeFieldTypes('/home/polygon.shp', '/home/polygon_nodates.shp', types=['date', 'datetime'])
+
+        """
+
+        self.srcfile = srcfile
+        self.outfile = outfile
+
+        logging.info("Removing fields of type %s from: %s", ', '.join(types), self.srcfile)
+
+        pipeline = Pipeline(self.srcfile, chunksize, drop_types=types, metrics=metrics, bbox=bbox, mask=mask)
+
+        return pipeline.run(self.outfile)
+
+# TODO
+
+
+class Catalog():
+    """ Class keeping the schema, crs, feature count, extent and fingerprint of the layers of data trees in SQLite. """
+
+    # Extensions of the files cataloged as layers.
+    EXTENSIONS = ('.shp', '.gpkg', '.geojson', '.parquet', '.geoparquet', '.feather', '.arrow')
+
+    DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.bigeo', 'catalog.sqlite')
+
+    def __init__(self, path=None):
+        """
+        Opens or creates the catalog.
+
+        PARAMETER(S):
+
+        : path : The SQLite file of the catalog. None uses ~/.bigeo/catalog.sqlite.
+
+        EXAMPLE(S):
+
+        import bigeo
+        catalog = bigeo.Catalog('/data/catalog.sqlite')
+        catalog.scan('/data/archive', workers=8)
+        catalog.layer('/data/archive/2018/parcels.shp')['count']
+
+        """
+
+        self.path = path or self.DEFAULT_PATH
+        self.db = None
+        self.pid = None
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        with self._connect() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS layers (path TEXT PRIMARY KEY, dir TEXT, size INTEGER, ' \
+                'mtime_ns INTEGER, driver TEXT, schema TEXT, crs TEXT, count INTEGER, minx REAL, miny REAL, ' \
+                'maxx REAL, maxy REAL, fingerprint TEXT, scanned REAL, error TEXT)')
+            db.execute('CREATE INDEX IF NOT EXISTS layers_dir ON layers (dir)')
+
+    def _connect(self):
+
+        # SQLite connections do not survive a fork, each process opens its own.
+        if self.db is None or self.pid != os.getpid():
+            self.db = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+            self.db.row_factory = sqlite3.Row
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.pid = os.getpid()
+
+        return self.db
+
+    def scan(self, root, workers=1, recursive=True):
+        """
+        Catalogs the layers under root. Only the layers added, or whose files changed size or mtime since they \
+        were cataloged, are opened. Layers whose files were removed are dropped from the catalog.
+
+        PARAMETER(S):
+
+        : root : The directory to scan.
+
+        : workers : Number of processes opening the changed layers. 1 opens them in this process.
+
+        : recursive : If True, the subdirectories of root are scanned too.
+
+        RETURN(S)
+
+        : summary : Dict with the number of layers found, scanned (added or changed), unchanged, removed and failed.
+
+        """
+
+        start = time.time()
+        root = os.path.abspath(root)
+        stamps = dict((path, _datasetStamp(path)) for path in self._walk(root, recursive))
+
+        db = self._connect()
+
+        where, params = self._under(root, recursive)
+        # Layers cataloged by a lookup without their extent are scanned again for it.
+        known = dict((row['path'], (row['size'], row['mtime_ns']) if row['complete'] else None) for row in \
+            db.execute('SELECT path, size, mtime_ns, (minx IS NOT NULL OR NOT count OR error IS NOT NULL) AS ' \
+                'complete FROM layers WHERE ' + where, params))
+
+        stale = sorted(path for path, stamp in stamps.items() if known.get(path) != stamp)
+        removed = [(path,) for path in known if path not in stamps]
+
+        if workers > 1 and len(stale) > 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+                entries = list(pool.map(_catalogEntry, stale, chunksize=max(1, min(64, len(stale) // workers))))
+        else:
+            entries = [_catalogEntry(path) for path in stale]
+
+        with db:
+            db.executemany('INSERT OR REPLACE INTO layers VALUES (:path, :dir, :size, :mtime_ns, :driver, :schema, ' \
+                ':crs, :count, :minx, :miny, :maxx, :maxy, :fingerprint, :scanned, :error)', entries)
+            db.executemany('DELETE FROM layers WHERE path = ?', removed)
+
+        failed = [entry for entry in entries if entry['error']]
+
+        for entry in failed:
+            logging.warning("Cannot catalog %s: %s", entry['path'], entry['error'])
+
+        summary = {'layers': len(stamps), 'scanned': len(stale), 'unchanged': len(stamps) - len(stale), \
+            'removed': len(removed), 'failed': len(failed), 'seconds': time.time() - start}
+
+        logging.info("Cataloged %s: %s layers, %s scanned, %s removed.", root, len(stamps), len(stale), len(removed))
+
+        return summary
+
+    def _under(self, directory, recursive):
+        """ SQL condition and parameters selecting the layers in directory. """
+
+        if not recursive:
+            return 'dir = ?', [directory]
+
+        prefix = os.path.join(directory, '')
+
+        return '(dir = ? OR substr(dir, 1, ?) = ?)', [directory, len(prefix), prefix]
+
+    def _walk(self, root, recursive):
+
+        for directory, subdirectories, filenames in os.walk(root):
+
+            # Partition and incremental runs keep their temporary files in .bigeo-* directories.
+            subdirectories[:] = sorted(d for d in subdirectories if recursive and not d.startswith('.'))
+
+            for filename in filenames:
+                if os.path.splitext(filename)[1].lower() in self.EXTENSIONS:
+                    yield os.path.join(directory, filename)
+
+    def layer(self, path, refresh=True):
+        """
+        PARAMETER(S):
+
+        : path : Path of a layer.
+
+        : refresh : If True, a layer missing from the catalog or whose files changed is cataloged first.
+
+        RETURN(S)
+
+        : layer : Dict with the path, driver, schema, crs (fiona CRS), count, extent (minx, miny, maxx, maxy), \
+        fingerprint and error of the layer. None if the layer is not cataloged or could not be read. The extent \
+        of a Feather layer cataloged by a lookup is None until the next scan.
+
+        """
+
+        path = os.path.abspath(path)
+        db = self._connect()
+        row = db.execute('SELECT * FROM layers WHERE path = ?', (path,)).fetchone()
+
+        if refresh and os.path.exists(path) and (row is None or (row['size'], row['mtime_ns']) != _datasetStamp(path)):
+            # Computing a missing extent reads all the geometries, a lookup leaves it to scan.
+            entry = _catalogEntry(path, full_extent=False)
+
+            with db:
+                db.execute('INSERT OR REPLACE INTO layers VALUES (:path, :dir, :size, :mtime_ns, :driver, :schema, ' \
+                    ':crs, :count, :minx, :miny, :maxx, :maxy, :fingerprint, :scanned, :error)', entry)
+
+            row = db.execute('SELECT * FROM layers WHERE path = ?', (path,)).fetchone()
+
+        if row is None or row['error']:
+            return None
+
+        return _catalogLayer(row)
+
+    def layers(self, directory, recursive=False, refresh=True, workers=1):
+        """
+        PARAMETER(S):
+
+        : directory : The directory of the layers.
+
+        : recursive : If True, the layers of the subdirectories are listed too.
+
+        : refresh : If True, directory is scanned first. See scan.
+
+        : workers : Number of processes of the scan.
+
+        RETURN(S)
+
+        : layers : List of the layers in directory sorted by path, as returned by layer.
+
+        """
+
+        directory = os.path.abspath(directory)
+
+        if refresh:
+            self.scan(directory, workers, recursive)
+
+        where, params = self._under(directory, recursive)
+        rows = self._connect().execute('SELECT * FROM layers WHERE error IS NULL AND ' + where + ' ORDER BY path', \
+            params)
+
+        return [_catalogLayer(row) for row in rows]
+
+    def close(self):
+
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+class Daemon():
+    """ Class keeping a pool of warm worker processes that run bigeo algorithms submitted as jobs. """
+
+    # Algorithms of main() a job may run.
+    ALGORITHMS = ('reprojector', 'boundingbox', 'centroids', 'representativepoint', 'multioutput', 'openweather', \
+        'snaplinetopoints', 'spatialjoin', 'duplicatesremover', 'overlapsremover', 'buffer', 'invalidgeomremover', \
+        'multiparttosinglepart', 'fieldtyperemover', 'pipeline', 'spatialindex', 'catalog')
+
+    def __init__(self, workers=2, cache_size=64, max_jobs=10000):
+        """
+        Starts the worker processes. Each worker imports fiona, numpy, shapely and pyproj and registers the GDAL \
+        drivers once, and keeps the metadata, memory maps and spatial indexes of its cache_size most recently \
+        opened layers.
+
+        PARAMETER(S):
+
+        : workers : Number of worker processes, jobs running at a time.
+
+        : cache_size : Number of recently opened layers and spatial indexes cached by each worker.
+
+        : max_jobs : Number of jobs kept in the job table. The oldest finished jobs are forgotten first.
+
+        EXAMPLE(S):
+
+        import bigeo
+        daemon = bigeo.Daemon(workers=4)
+        job_id = daemon.submit('centroids', {'srcfile': '/home/polygon.shp', 'outfile': '/home/point.shp'})
+        daemon.status(job_id, wait=60)
+
+        """
+
+        self.workers = workers
+        self.cache_size = cache_size
+        self.max_jobs = max_jobs
+        self.started = time.time()
+        self.table = collections.OrderedDict()
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.server = None
+        self.pool = self._startPool()
+
+    def _startPool(self):
+
+        pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, initializer=_warmWorker, \
+            initargs=(self.cache_size,))
+
+        # Warm the workers now rather than on the first jobs.
+        concurrent.futures.wait([pool.submit(time.sleep, 0.05) for _ in range(self.workers)])
+
+        return pool
+
+    def submit(self, algo, options=None):
+        """
+        Queues a job.
+
+        PARAMETER(S):
+
+        : algo : The algorithm to run. (ex. 'reprojector', 'centroids', see Daemon.ALGORITHMS)
+
+        : options : Dict of the command line arguments of the job, with '_' or '-' in their names. \
+            (ex. {'srcfile': '/home/polygon.shp', 'outfile': '/home/point.shp', 'chunksize': 50000})
+
+        RETURN(S)
+
+        : job_id : The id of the job, to query its status.
+
+        """
+
+        args = _jobArgs(algo, options)
+        options = dict(options or {})
+
+        with self.lock:
+            job_id = str(next(self.ids))
+            logging.info("Queued job %s: %s", job_id, algo)
+
+            try:
+                future = self.pool.submit(_runJob, algo, args)
+            except concurrent.futures.process.BrokenProcessPool:
+                logging.error("Daemon workers died, starting new ones.")
+                self.pool = self._startPool()
+                future = self.pool.submit(_runJob, algo, args)
+
+            self.table[job_id] = {'id': job_id, 'algo': algo, 'options': options, 'submitted': time.time(), \
+                'future': future}
+
+            finished = [key for key, job in self.table.items() if job['future'].done()]
+
+            for key in finished[:max(0, len(self.table) - self.max_jobs)]:
+                del self.table[key]
+
+        return job_id
+
+    def status(self, job_id, wait=None):
+        """
+        PARAMETER(S):
+
+        : job_id : The id returned by submit.
+
+        : wait : Seconds to wait for the job to finish before returning its status.
+
+        RETURN(S)
+
+        : status : Dict of the job with its status (queued, running, done or failed), timings in seconds, error \
+            and metrics report. None for an unknown job.
+
+        """
+
+        with self.lock:
+            job = self.table.get(job_id)
+
+        if job is None:
+            return None
+
+        future = job['future']
+
+        if wait:
+            concurrent.futures.wait([future], timeout=wait)
+
+        status = {key: job[key] for key in ('id', 'algo', 'options', 'submitted')}
+
+        if not future.done():
+            status['status'] = 'running' if future.running() else 'queued'
+            return status
+
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {'error': '%s: %s' % (type(e).__name__, e)}
+
+        status['status'] = 'failed' if result.get('error') else 'done'
+        status.update(result)
+
+        if 'started' in result:
+            status['queued_seconds'] = result['started'] - job['submitted']
+            status['run_seconds'] = result['finished'] - result['started']
+
+        return status
+
+    def listJobs(self):
+        """
+        RETURN(S)
+
+        : jobs : List of the status of the jobs in the job table, oldest first.
+
+        """
+
+        with self.lock:
+            job_ids = list(self.table)
+
+        return [status for status in map(self.status, job_ids) if status is not None]
+
+    def info(self):
+        """
+        RETURN(S)
+
+        : info : Dict with the uptime, workers and the number of jobs in each status.
+
+        """
+
+        counts = collections.Counter(status['status'] for status in self.listJobs())
+
+        return {'uptime': time.time() - self.started, 'workers': self.workers, 'cache_size': self.cache_size, \
+            'jobs': dict(counts)}
+
+    def listen(self, port=8765, socket_path=None, host='127.0.0.1'):
+        """
+        Starts answering the HTTP API in a background thread.
+
+        POST /jobs {"algo": ..., "options": {...}} queues a job, GET /jobs lists the jobs, \
+        GET /jobs/<id>?wait=<seconds> returns the status of a job and GET /status the info of the daemon.
+
+        PARAMETER(S):
+
+        : port : TCP port on host. 0 picks a free port.
+
+        : socket_path : Local Unix socket to listen on instead of the TCP port.
+
+        : host : Interface of the TCP port.
+
+        RETURN(S)
+
+        : address : The (host, port) or the socket path listened on.
+
+        """
+
+        self.server = _daemonServer(self, port, socket_path, host)
+
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        logging.info("Daemon listening on: %s", self.server.server_address)
+
+        return self.server.server_address
+
+    def serve(self, port=8765, socket_path=None, host='127.0.0.1'):
+        """ Answers the HTTP API until interrupted, then shuts down. See listen. """
+
+        self.listen(port, socket_path, host)
+
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            logging.info("Stopping daemon.")
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        """ Stops the HTTP API and the workers. Running jobs are finished first, queued jobs are cancelled. """
+
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+            if isinstance(self.server.server_address, str) and os.path.exists(self.server.server_address):
+                os.remove(self.server.server_address)
+
+            self.server = None
+
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+
+####################### END SECTION FOR CLASSES ##########################
+
+
+
+####################### BEGIN SECTION FOR HELPER FUNCTIONS ##########################
+
+def getSchema(path):
+    """
+    Get the schema of a shapefile.
+
+    PARAMETER(S)
+
+    : path : Path to the .shp file where to copy the schema. GeoParquet and Feather files are read too.
+
+    RETURN(S)
+
+    : schema :  The schema from source .shp
+
+    """
+
+    return copy.deepcopy(_layerMeta(path)['schema'])
+
+def getCrs(path):
+    """
+    Gets the crs of the given .shp file.
+    
+    PARAMETER(S)
+
+    : path : Path to the .shp file where to copy the crs. GeoParquet and Feather files are read too.
+
+    RETURN(S)
+
+    : crs :  The crs from source .shp
+
+    """
+
+    return _layerMeta(path)['crs']
+
+def ignoredFields(schema, fields=None, drop_types=None):
+    """
+    Gets the fields of a schema that are not needed.
+
+    PARAMETER(S)
+
+    : schema : Schema of a shapefile.
+
+    : fields : List of the fields to keep. None keeps all fields.
+
+    : drop_types : List of field types to drop. (ex. 'date')
+
+    RETURN(S)
+
+    : ignored :  List of the fields to ignore.
+
+    """
+
+    drop_types = set(t.lower() for t in drop_types or ())
+    ignored = []
+
+    for name, field_type in schema['properties'].items():
+        if (fields is not None and name not in fields) or field_type.split(':')[0].lower() in drop_types:
+            ignored.append(name)
+
+    return ignored
+
+def _openSource(path, fields=None, drop_types=None, ignore_geometry=False):
+    """
+    Opens path with fiona, or as a GeoParquet / Feather file by its extension. Fields not in fields or of \
+    drop_types are projected out and never decoded. With ignore_geometry, fiona does not read the geometries.
+    """
+
+    import fiona
+
+    if _columnarFormat(path):
+        return _ArrowSource(path, fields, drop_types)
+
+    ignored = None
+
+    if fields is not None or drop_types:
+        ignored = ignoredFields(getSchema(path), fields, drop_types) or None
+
+    return fiona.open(path, ignore_fields=ignored, ignore_geometry=ignore_geometry)
+
+def _openSink(path, meta):
+    """ Opens path for writing with fiona, or as a GeoParquet / Feather file by its extension. """
+
+    import fiona
+
+    if _columnarFormat(path):
+        return _ArrowSink(path, meta)
+
+    driver = _FIONA_DRIVERS.get(os.path.splitext(path)[1].lower())
+
+    if driver is not None:
+        meta = dict(meta, driver=driver)
+    elif meta.get('driver') in _COLUMNAR_DRIVERS:
+        raise ValueError("Unknown output format of " + path + ". Use .shp, .gpkg, .geojson, .parquet or .feather.")
+
+    return fiona.open(path, 'w', **meta)
+
+_COLUMNAR_FORMATS = {'.parquet': 'parquet', '.geoparquet': 'parquet', '.feather': 'feather', '.arrow': 'feather'}
+
+_COLUMNAR_DRIVERS = {'parquet': 'GeoParquet', 'feather': 'Arrow'}
+
+_FIONA_DRIVERS = {'.shp': 'ESRI Shapefile', '.gpkg': 'GPKG', '.geojson': 'GeoJSON', '.json': 'GeoJSON'}
+
+def _columnarFormat(path):
+
+    return _COLUMNAR_FORMATS.get(os.path.splitext(path)[1].lower())
+
+# Arrow types of the fiona field types. Dates keep their type, time of day is kept as text.
+_ARROW_TYPES = {'int': 'int64', 'int32': 'int64', 'int64': 'int64', 'float': 'float64', 'str': 'string', \
+    'bool': 'bool_', 'date': 'date32', 'time': 'string'}
+
+def _arrowType(field_type):
+
+    import pyarrow as pa
+
+    field_type = field_type.split(':')[0].lower()
+
+    if field_type == 'datetime':
+        return pa.timestamp('ms')
+
+    return getattr(pa, _ARROW_TYPES.get(field_type, 'string'))()
+
+def _fionaType(arrow_type):
+
+    import pyarrow as pa
+
+    if pa.types.is_integer(arrow_type):
+        return 'int'
+    if pa.types.is_floating(arrow_type):
+        return 'float'
+    if pa.types.is_boolean(arrow_type):
+        return 'bool'
+    if pa.types.is_date(arrow_type):
+        return 'date'
+    if pa.types.is_timestamp(arrow_type):
+        return 'datetime'
+
+    return 'str'
+
+class _ArrowSource():
+    """
+    GeoParquet or Feather file read like a fiona collection. Geometries are a WKB column, only the kept columns \
+    are read and chunks are streamed from the row groups (record batches) of the file. The properties of the \
+    chunks are Arrow tables, no per-feature dicts are built.
+    """
+
+    def __init__(self, path, fields=None, drop_types=None):
+
+        import fiona
+        import pyproj
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.path = path
+        self.format = _columnarFormat(path)
+
+        if self.format == 'parquet':
+            self.file = pq.ParquetFile(path)
+            arrow_schema = self.file.schema_arrow
+        else:
+            self.file = pa.ipc.open_file(pa.memory_map(path))
+            arrow_schema = self.file.schema
+
+        # The geo metadata of the Parquet footer has the bbox, written after the schema.
+        metadata = dict(arrow_schema.metadata or {})
+        if self.format == 'parquet':
+            metadata.update(self.file.metadata.metadata or {})
+
+        geo = json.loads(metadata.get(b'geo', b'{}'))
+        self.geometry_column = geo.get('primary_column', 'geometry')
+        column = geo.get('columns', {}).get(self.geometry_column, {})
+
+        if self.geometry_column not in arrow_schema.names:
+            raise ValueError("No WKB geometry column " + repr(self.geometry_column) + " in " + path)
+
+        types = set(t.replace(' Z', '') for t in column.get('geometry_types', []))
+
+        properties = dict((field.name, _fionaType(field.type)) for field in arrow_schema \
+            if field.name != self.geometry_column)
+        schema = {'geometry': types.pop() if len(types) == 1 else 'Unknown', 'properties': properties}
+
+        ignored = set(ignoredFields(schema, fields, drop_types))
+        schema['properties'] = dict((k, v) for k, v in properties.items() if k not in ignored)
+
+        self.columns = list(schema['properties']) + [self.geometry_column]
+        self.schema = schema
+
+        # A missing crs is OGC:CRS84 in GeoParquet, an explicit null an unknown crs.
+        crs = column.get('crs', 'OGC:CRS84') if column else None
+        self.crs = fiona.crs.CRS.from_wkt(pyproj.CRS.from_user_input(crs).to_wkt()) if crs else None
+
+        self.meta = {'driver': _COLUMNAR_DRIVERS[self.format], 'schema': schema, 'crs': self.crs}
+
+        # (minx, miny, maxx, maxy) of the layer when the writer recorded it, like the bounds of a fiona collection.
+        self.bounds = tuple(column['bbox'][:4]) if len(column.get('bbox') or []) == 4 else None
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc):
+
+        self.close()
+
+    def close(self):
+
+        self.file = None
+
+    def batches(self, chunksize=10000, fids=None):
+        """ Yields (row of the first feature, record batch). Row groups without any of fids are skipped. """
+
+        import numpy as np
+
+        def wanted(start, rows):
+            if fids is None:
+                return True
+            i = np.searchsorted(fids, start)
+            return i < len(fids) and fids[i] < start + rows
+
+        start = 0
+
+        if self.format == 'parquet':
+            for i in range(self.file.num_row_groups):
+
+                rows = self.file.metadata.row_group(i).num_rows
+
+                if wanted(start, rows):
+                    offset = start
+                    for batch in self.file.iter_batches(batch_size=chunksize, row_groups=[i], columns=self.columns):
+                        yield offset, batch
+                        offset += batch.num_rows
+
+                start += rows
+        else:
+            for i in range(self.file.num_record_batches):
+
+                batch = self.file.get_batch(i)
+
+                if wanted(start, batch.num_rows):
+                    yield start, batch.select(self.columns)
+
+                start += batch.num_rows
+
+    def chunks(self, chunksize=10000, where=None):
+        """ Yields _Chunk of at most chunksize features, only those selected by the _SpatialFilter where. """
+
+        import numpy as np
+        import shapely
+        import pyarrow as pa
+
+        fids = where.fids(self.path) if where is not None else None
+
+        for offset, batch in self.batches(chunksize, fids):
+
+            for start in range(0, batch.num_rows, chunksize):
+
+                table = pa.Table.from_batches([batch.slice(start, chunksize)])
+                geoms = shapely.from_wkb(table.column(self.geometry_column).to_numpy(zero_copy_only=False))
+                chunk = _Chunk(geoms, table.drop_columns([self.geometry_column]))
+
+                if where is not None:
+                    chunk.fids = np.arange(offset + start, offset + start + len(chunk))
+                    keep = where.test(geoms)
+                    if fids is not None:
+                        keep &= np.isin(chunk.fids, fids)
+                    chunk = chunk.take(np.flatnonzero(keep))
+
+                if len(chunk):
+                    yield chunk
+
+    def __iter__(self):
+
+        for chunk in self.chunks():
+            yield from chunk.records()
+
+    def __len__(self):
+
+        if self.format == 'parquet':
+            return self.file.metadata.num_rows
+
+        return self.file.count_rows()
+
+class _ArrowSink():
+    """ GeoParquet or Feather file written like a fiona collection. Each chunk written is a row group. """
+
+    def __init__(self, path, meta):
+
+        import pyproj
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.path = path
+        self.format = _columnarFormat(path)
+
+        geometry_type = meta['schema'].get('geometry')
+        column = {'encoding': 'WKB', 'geometry_types': [geometry_type] if geometry_type in _COORDINATE_DEPTH else []}
+        column['crs'] = pyproj.CRS.from_user_input(_toPyprojCrs(meta['crs'])).to_json_dict() \
+            if meta.get('crs') else None
+
+        geo = {'version': '1.0.0', 'primary_column': 'geometry', 'columns': {'geometry': column}}
+        self.geo = geo
+        self.bbox = None
+
+        fields = [pa.field(name, _arrowType(field_type)) for name, field_type in meta['schema']['properties'].items()]
+        self.schema = pa.schema(fields + [pa.field('geometry', pa.binary())], metadata={'geo': json.dumps(geo)})
+
+        if self.format == 'parquet':
+            self.writer = pq.ParquetWriter(path, self.schema)
+        else:
+            self.writer = pa.ipc.new_file(path, self.schema)
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc):
+
+        self.close()
+
+    def close(self):
+
+        if self.writer is None:
+            return
+
+        # The bbox of the file is known once all the chunks are written. Parquet key-value metadata is written in
+        # the footer and can still be replaced, the schema of a Feather file is already written.
+        if self.format == 'parquet' and self.bbox is not None and hasattr(self.writer, 'add_key_value_metadata'):
+            self.geo['columns']['geometry']['bbox'] = self.bbox
+            self.writer.add_key_value_metadata({'geo': json.dumps(self.geo)})
+
+        self.writer.close()
+        self.writer = None
+
+    def writeChunk(self, chunk):
+
+        import numpy as np
+        import shapely
+        import pyarrow as pa
+
+        bounds = shapely.bounds(chunk.geoms)
+
+        if len(bounds) and not np.isnan(bounds).all():
+            extent = np.concatenate([np.nanmin(bounds[:, :2], axis=0), np.nanmax(bounds[:, 2:], axis=0)]).tolist()
+            self.bbox = extent if self.bbox is None else [min(self.bbox[0], extent[0]), min(self.bbox[1], extent[1]), \
+                max(self.bbox[2], extent[2]), max(self.bbox[3], extent[3])]
+
+        arrays = []
+
+        for field in self.schema:
+
+            if field.name == 'geometry':
+                arrays.append(pa.array(shapely.to_wkb(chunk.geoms), type=pa.binary()))
+            elif chunk.columns and field.name in chunk.columns:
+                arrays.append(pa.array(chunk.columns[field.name]).cast(field.type))
+            elif isinstance(chunk.props, list):
+                arrays.append(pa.array(chunk.field(field.name)).cast(field.type))
+            else:
+                arrays.append(chunk.props.column(field.name).cast(field.type))
+
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def writerecords(self, records):
+
+        records = list(records)
+
+        self.writeChunk(_Chunk(_fromGeojson([r['geometry'] for r in records]), [r['properties'] for r in records]))
+
+class _ResponseCache():
+    """ Cache of json responses on disk. A response is fresh for ttl seconds after it was written. """
+
+    def __init__(self, cache_dir, ttl=600):
+
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url, params):
+
+        key = json.dumps([url, sorted(params.items())])
+
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, url, params):
+
+        path = self._path(url, params)
+
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, url, params, data):
+
+        path = self._path(url, params)
+
+        # Write then rename, so concurrent runs never read a partial file.
+        with open(path + '.tmp', 'w') as f:
+            json.dump(data, f)
+
+        os.replace(path + '.tmp', path)
+
+# Transformers are expensive to create, keep one per (source crs, target crs) pair in each process.
+_TRANSFORMERS = {}
+
+def getTransformer(src_crs, dst_crs):
+    """
+    Gets a cached pyproj transformer from src_crs to dst_crs.
+
+    PARAMETER(S)
+
+    : src_crs : Source crs. Anything accepted by pyproj (wkt, 'EPSG:4326', fiona CRS).
+
+    : dst_crs : Target crs.
+
+    RETURN(S)
+
+    : transformer :  pyproj Transformer with x, y (lon, lat) axis order.
+
+    """
+
+    import pyproj
+
+    key = (str(src_crs), str(dst_crs))
+
+    transformer = _TRANSFORMERS.get(key)
+
+    if transformer is None:
+        transformer = pyproj.Transformer.from_crs(_toPyprojCrs(src_crs), _toPyprojCrs(dst_crs), always_xy=True)
+        _TRANSFORMERS[key] = transformer
+
+    return transformer
+
+def _toPyprojCrs(crs):
+
+    if hasattr(crs, 'to_wkt'):
+        return crs.to_wkt()
+
+    return crs
+
+def _transformGeoms(geoms, transformer):
+    """ Transforms an array of shapely geometries with a single call to the transformer. """
+
+    import numpy as np
+    import shapely
+
+    def _transformCoords(coords):
+        x, y = transformer.transform(coords[:, 0], coords[:, 1])
+        return np.column_stack([x, y])
+
+    return shapely.transform(geoms, _transformCoords)
+
+def _reprojectFile(shpf, outshp, crs, transform=False, chunksize=10000, fields=None, where=None, read_queue=0, \
+    write_queue=0):
+    """ Reprojects a single shp file. Runs in the worker processes of Reprojector. """
+
+    start = time.time()
+    count = 0
+    metrics = Metrics()
+
+    logging.info('%s %s', "Reprojecting file :", shpf)
+
+    mapped = _MappedShapefile.open(shpf) if transform else None
+
+    if mapped is not None and not mapped.isXYPoint():
+        mapped = None
+
+    with _openSource(shpf, fields, ignore_geometry=mapped is not None) as input_shp:
+
+        schema = mapped.meta(input_shp)['schema'] if mapped is not None else input_shp.schema
+        transformer = None
+
+        if transform:
+            if not input_shp.crs:
+                raise ValueError("Cannot transform " + shpf + ", it has no crs.")
+            transformer = getTransformer(input_shp.crs, crs)
+
+        with _openSink(outshp, {'crs': crs, 'driver': 'ESRI Shapefile', 'schema': schema}) as output_shp:
+
+            if transformer is None and where is None and not isinstance(input_shp, _ArrowSource):
+                chunks = _chunked(input_shp, chunksize)
+                write = functools.partial(_writeFeatures, output_shp, metrics=metrics)
+            else:
+                if mapped is not None:
+                    chunks = _mappedChunks(input_shp, mapped, mapped.points, chunksize, where)
+                else:
+                    chunks = _readChunks(input_shp, chunksize, where)
+                write = functools.partial(_writeChunk, output_shp, metrics=metrics)
+
+            with contextlib.closing(_readAhead(chunks, read_queue, metrics)) as chunks, \
+                _writeBehind(write, write_queue, metrics) as write:
+
+                for chunk in chunks:
+                    if transformer is not None:
+                        with metrics.timer('compute'):
+                            chunk = chunk.withGeoms(_transformGeoms(chunk.geoms, transformer))
+                    write(chunk)
+                    count += len(chunk)
+
+    metrics.read(shpf)
+    metrics.written(outshp)
+
+    return {'file': shpf, 'outfile': outshp, 'features': count, 'seconds': time.time() - start, \
+        'metrics': metrics.report()}
+
+def _reprojectPipeline(shpf, outshp, crs, transform=False, chunksize=10000, fields=None, where=None, workers=1, \
+    incremental=False, read_queue=0, write_queue=0):
+    """ Reprojects a single file with a Pipeline, split into partitions or incrementally. """
+
+    start = time.time()
+
+    pipeline = Pipeline(shpf, chunksize, fields=fields, read_queue=read_queue, write_queue=write_queue)
+    pipeline.where = where
+    pipeline.add('reproject' if transform else 'setcrs', crs)
+    count = pipeline.run(outshp, workers, incremental=incremental)
+
+    return {'file': shpf, 'outfile': outshp, 'features': count, 'seconds': time.time() - start, \
+        'metrics': pipeline.metrics.report()}
+
+def spatialFilter(bbox=None, mask=None):
+    """
+    Makes the spatial filter of the bbox and mask arguments of the operations.
+
+    PARAMETER(S)
+
+    : bbox : (minx, miny, maxx, maxy) in the crs of the filtered layer, or a 'minx,miny,maxx,maxy' string.
+
+    : mask : A shapely geometry, a geojson mapping, WKT, or the path of a layer whose geometries are unioned.
+
+    RETURN(S)
+
+    : where : The _SpatialFilter, None if both bbox and mask are None.
+
+    """
+
+    if bbox is None and mask is None:
+        return None
+
+    return _SpatialFilter(bbox, mask)
+
+class _SpatialFilter():
+    """
+    Selects the features whose geometry intersects a bbox and/or a mask geometry, and / or the features of a \
+    sorted array of ids (a partition of Pipeline.run).
+    """
+
+    def __init__(self, bbox=None, mask=None, fids=None):
+
+        import shapely
+
+        geometry = None
+
+        if bbox is not None:
+            if isinstance(bbox, str):
+                bbox = [float(v) for v in bbox.split(',')]
+            geometry = shapely.box(*bbox)
+
+        if mask is not None:
+            mask = _maskGeometry(mask)
+            geometry = mask if geometry is None else shapely.intersection(geometry, mask)
+
+        self.geometry = geometry
+        self.bounds = tuple(shapely.bounds(geometry).tolist()) if geometry is not None else None
+        self.selection = fids
+
+    def test(self, geoms):
+        """ Boolean array, True for the geometries intersecting the filter. """
+
+        import numpy as np
+        import shapely
+
+        if self.geometry is None:
+            return np.ones(len(geoms), dtype=bool)
+
+        shapely.prepare(self.geometry)
+
+        return shapely.intersects(self.geometry, geoms)
+
+    def fids(self, path):
+        """
+        Sorted ids of the features of path in the selection whose bounds intersect the filter. None without a \
+        selection and an up to date index.
+        """
+
+        import numpy as np
+        import shapely
+
+        candidates = None
+
+        if self.geometry is not None:
+
+            index = _spatialIndex(path)
+
+            if shapely.is_empty(self.geometry):
+                candidates = np.empty(0, dtype=np.int64)
+            elif index is not None:
+                candidates = np.unique(index.queryBulk([self.bounds])[1])
+
+        if self.selection is not None:
+            candidates = self.selection if candidates is None else np.intersect1d(candidates, self.selection)
+
+        return candidates
+
+    def restrict(self, fids):
+        """ The same filter, selecting only the features of the sorted ids fids. """
+
+        import numpy as np
+
+        where = copy.copy(self)
+        where.selection = fids if self.selection is None else np.intersect1d(self.selection, fids)
+
+        return where
+
+def _maskGeometry(mask):
+
+    import numpy as np
+    import shapely
+
+    if isinstance(mask, str):
+        if not os.path.exists(mask):
+            return shapely.from_wkt(mask)
+        with _openSource(mask) as src:
+            return shapely.union_all(np.concatenate([c.geoms for c in _readChunks(src)] or [np.empty(0, dtype=object)]))
+
+    if isinstance(mask, dict):
+        return shapely.geometry.shape(mask)
+
+    return mask
+
+def _layerBounds(path, chunksize=100000):
+    """ Array of the minx, miny, maxx, maxy of each feature of path, NaN for features without geometry. """
+
+    import numpy as np
+    import shapely
+
+    mapped = _MappedShapefile.open(path)
+
+    if mapped is not None:
+        parts = [mapped.bounds(start, start + chunksize) for start in range(0, len(mapped), chunksize)]
+    else:
+        with _openSource(path) as src:
+            parts = [shapely.bounds(chunk.geoms) for chunk in _readChunks(src, chunksize)]
+
+    return np.concatenate(parts) if parts else np.empty((0, 4))
+
+def _featureCount(path):
+
+    mapped = _MappedShapefile.open(path)
+
+    if mapped is not None:
+        return len(mapped)
+
+    with _openSource(path) as src:
+        return len(src)
+
+def _spatialIndex(path, spatial_index=None):
+    """
+    The SpatialIndex of path. spatial_index None uses an up to date sidecar if there is one, True builds a \
+    missing or stale one, False never uses it.
+    """
+
+    if spatial_index is False or (spatial_index is None and not SpatialIndex.isFresh(path)):
+        return None
+
+    if not SpatialIndex.isFresh(path):
+        SpatialIndex.build(path)
+
+    sidecar = SpatialIndex.sidecarPath(path)
+
+    return _LAYER_CACHE.get(('index', os.path.abspath(path)), lambda: SpatialIndex(path, build=False), \
+        _fileStamp(path, sidecar))
+
+class _LRUCache():
+    """
+    Keeps the maxsize most recently used items. A missing item, or one made for another stamp of its key, is \
+    made by its factory. The stale item is dropped, so a replaced file is never held open twice.
+    """
+
+    def __init__(self, maxsize=64):
+
+        self.maxsize = maxsize
+        self.items = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, factory, stamp=None):
+
+        if key in self.items and self.items[key][0] == stamp:
+            self.items.move_to_end(key)
+            self.hits += 1
+            return self.items[key][1]
+
+        self.misses += 1
+        self.items.pop(key, None)
+        value = factory()
+        self.items[key] = (stamp, value)
+
+        while len(self.items) > self.maxsize:
+            self.items.popitem(last=False)
+
+        return value
+
+# Metadata, memory maps and spatial indexes of recently opened layers, in each process. Items are keyed by the
+# absolute path of their layer and stamped with the size, mtime and inode of its files: a modified or replaced
+# layer is opened again and its stale item dropped.
+_LAYER_CACHE = _LRUCache()
+
+def _fileStamp(*paths):
+    """ The (st_size, st_mtime_ns, st_ino) of each of paths, None for the missing ones. """
+
+    stamp = []
+
+    for path in paths:
+        stat = os.stat(path) if os.path.exists(path) else None
+        stamp.append((stat.st_size, stat.st_mtime_ns, stat.st_ino) if stat else None)
+
+    return tuple(stamp)
+
+def _layerMeta(path):
+    """ The meta (driver, schema, crs) of the layer path, from the catalog if one is used. """
+
+    def read():
+        layer = _catalog().layer(path) if _catalog() is not None else None
+
+        if layer is not None:
+            return {'driver': layer['driver'], 'schema': layer['schema'], 'crs': layer['crs']}
+
+        with _openSource(path) as src:
+            return {'driver': src.meta.get('driver'), 'schema': src.schema, 'crs': src.crs}
+
+    return _LAYER_CACHE.get(('meta', os.path.abspath(path)), read, _fileStamp(*_datasetFiles(path)))
+
+def useCatalog(path=None):
+    """
+    Makes getSchema, getCrs and the directory listing of Reprojector read the layer metadata from a Catalog. \
+    The BIGEO_CATALOG environment variable sets the catalog of new processes.
+
+    PARAMETER(S)
+
+    : path : The SQLite file of the catalog. None stops using a catalog.
+
+    RETURN(S)
+
+    : catalog :  The Catalog, or None.
+
+    """
+
+    global _CATALOG
+
+    _CATALOG = Catalog(path) if path else None
+
+    return _CATALOG
+
+# The Catalog set by useCatalog, False until BIGEO_CATALOG was read.
+_CATALOG = False
+
+def _catalog():
+
+    if _CATALOG is False:
+        useCatalog(os.environ.get('BIGEO_CATALOG'))
+
+    return _CATALOG
+
+def _datasetFiles(path):
+
+    base, extension = os.path.splitext(path)
+
+    if extension.lower() != '.shp':
+        return [path]
+
+    return [base + e for e in _SIDECAR_EXTENSIONS if os.path.exists(base + e)]
+
+def _datasetStamp(path):
+    """ (total size, latest mtime in ns) of the files of the dataset path. """
+
+    stats = [os.stat(p) for p in _datasetFiles(path)]
+
+    return sum(s.st_size for s in stats), max([s.st_mtime_ns for s in stats], default=0)
+
+def _datasetFingerprint(path, block=65536):
+    """ Hash of the size, first and last block of each file of the dataset path. """
+
+    digest = hashlib.blake2b(digest_size=16)
+
+    for p in _datasetFiles(path):
+        with open(p, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            digest.update(os.path.splitext(p)[1].lower().encode('utf-8') + size.to_bytes(8, 'little'))
+            digest.update(f.read(block))
+            if size > block:
+                f.seek(max(block, size - block))
+                digest.update(f.read(block))
+
+    return digest.hexdigest()
+
+def _catalogEntry(path, full_extent=True):
+    """
+    The row of the layer path in a Catalog. Runs in the worker processes of Catalog.scan. The extent of a layer \
+    whose format does not record it is computed from all its geometries only with full_extent, else left empty.
+    """
+
+    import numpy as np
+
+    size, mtime_ns = _datasetStamp(path)
+    entry = {'path': path, 'dir': os.path.dirname(path), 'size': size, 'mtime_ns': mtime_ns, 'driver': None, \
+        'schema': None, 'crs': None, 'count': None, 'minx': None, 'miny': None, 'maxx': None, 'maxy': None, \
+        'fingerprint': None, 'scanned': time.time(), 'error': None}
+
+    try:
+        mapped = _MappedShapefile.open(path)
+
+        with _openSource(path) as src:
+            entry['driver'] = src.meta.get('driver')
+            entry['schema'] = json.dumps(src.schema)
+            entry['crs'] = src.crs.to_wkt() if src.crs else None
+            entry['count'] = len(mapped) if mapped is not None else len(src)
+
+            extent = mapped.extent if mapped is not None else src.bounds
+
+            if extent is None and full_extent:
+                bounds = _layerBounds(path)
+                extent = tuple(np.nanmin(bounds[:, :2], axis=0)) + tuple(np.nanmax(bounds[:, 2:], axis=0)) \
+                    if len(bounds) and not np.isnan(bounds).all() else None
+
+        if extent is not None and entry['count']:
+            entry['minx'], entry['miny'], entry['maxx'], entry['maxy'] = [float(v) for v in extent]
+
+        entry['fingerprint'] = _datasetFingerprint(path)
+    except Exception as e:
+        entry['error'] = '%s: %s' % (type(e).__name__, e)
+
+    return entry
+
+def _catalogLayer(row):
+
+    import fiona
+
+    extent = (row['minx'], row['miny'], row['maxx'], row['maxy']) if row['minx'] is not None else None
+
+    return {'path': row['path'], 'driver': row['driver'], 'schema': json.loads(row['schema']), \
+        'crs': fiona.crs.CRS.from_wkt(row['crs']) if row['crs'] else None, 'count': row['count'], \
+        'extent': extent, 'fingerprint': row['fingerprint'], 'size': row['size'], 'mtime_ns': row['mtime_ns']}
+
+def _jobArgs(algo, options=None):
+    """
+    Parses the options of a daemon job, a dict of command line arguments with '_' or '-' in their names, like \
+    the command line. Raises ValueError for an unknown algorithm or option, or a bad value.
+    """
+
+    if algo not in Daemon.ALGORITHMS:
+        raise ValueError("Unknown algorithm: " + repr(algo))
+
+    if not isinstance(options or {}, dict):
+        raise ValueError("Job options must be a dict.")
+
+    parser = _argumentParser()
+    actions = dict((action.dest, action) for action in parser._actions if action.option_strings)
+    argv = [algo]
+
+    for name, value in (options or {}).items():
+
+        action = actions.get(name.replace('-', '_'))
+
+        if action is None:
+            raise ValueError("Unknown job option: " + name)
+
+        if value is None:
+            continue
+
+        if action.nargs == 0:
+            if not isinstance(value, bool):
+                raise ValueError("Job option " + name + " must be true or false.")
+            if value:
+                argv.append(action.option_strings[0])
+            continue
+
+        if isinstance(value, (list, tuple)):
+            value = ','.join(str(v) for v in value)
+
+        # --name=value, so values starting with '-' are not taken for options.
+        argv.append(action.option_strings[0] + '=' + str(value))
+
+    def error(message):
+        raise ValueError("Bad job options: " + message)
+
+    # argparse exits on errors, a job with bad options is refused instead.
+    parser.error = error
+
+    return parser.parse_args(argv)
+
+def _warmWorker(cache_size):
+    """ Initializes a daemon worker: imports the dependencies and registers the GDAL drivers once. """
+
+    import fiona
+    import numpy as np
+    import shapely
+    import pyproj
+
+    global _WORKER_ENV
+
+    for module in (fiona, np, shapely, pyproj):
+        getattr(module, '__file__')
+
+    _LAYER_CACHE.maxsize = cache_size
+
+    # Stays entered for the life of the worker, so the fiona.Env of each job is nested and cheap.
+    _WORKER_ENV = fiona.Env()
+    _WORKER_ENV.__enter__()
+
+def _runJob(algo, args):
+    """ Runs algo of main() in a daemon worker with the command line arguments args parsed by _jobArgs. """
+
+    started = time.time()
+    metrics = Metrics(progress_interval=args.progress)
+    error = None
+
+    # A warm worker runs many jobs, the catalog of a previous job does not carry over.
+    useCatalog(os.environ.get('BIGEO_CATALOG'))
+
+    try:
+        main(algo, args, metrics)
+    except Exception as e:
+        logging.exception("Job failed: " + algo)
+        error = '%s: %s' % (type(e).__name__, e)
+
+    if args.metrics_json and error is None:
+        metrics.dump(args.metrics_json)
+
+    return {'started': started, 'finished': time.time(), 'error': error, 'pid': os.getpid(), \
+        'metrics': metrics.report(), 'cache': {'hits': _LAYER_CACHE.hits, 'misses': _LAYER_CACHE.misses}}
+
+def _daemonServer(daemon, port=8765, socket_path=None, host='127.0.0.1'):
+    """ The HTTP server of the API of daemon, on the Unix socket socket_path or on host:port. """
+
+    import http.server
+    import socketserver
+    import urllib.parse
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+
+        def do_GET(self):
+
+            url = urllib.parse.urlparse(self.path)
+            parts = [part for part in url.path.split('/') if part]
+
+            if parts == ['status']:
+                return self._reply(200, daemon.info())
+
+            if parts == ['jobs']:
+                return self._reply(200, daemon.listJobs())
+
+            if len(parts) == 2 and parts[0] == 'jobs':
+                try:
+                    wait = float(urllib.parse.parse_qs(url.query).get('wait', [0])[0])
+                except ValueError:
+                    return self._reply(400, {'error': 'wait must be a number of seconds.'})
+
+                status = daemon.status(parts[1], wait=wait)
+
+                return self._reply(200, status) if status else self._reply(404, {'error': 'Unknown job.'})
+
+            self._reply(404, {'error': 'Not found.'})
+
+        def do_POST(self):
+
+            if self.path.rstrip('/') != '/jobs':
+                return self._reply(404, {'error': 'Not found.'})
+
+            try:
+                job = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+                job_id = daemon.submit(job.get('algo'), job.get('options'))
+            except (ValueError, AttributeError) as e:
+                return self._reply(400, {'error': str(e)})
+
+            self._reply(202, daemon.status(job_id))
+
+        def _reply(self, code, body):
+
+            data = json.dumps(body, default=str).encode('utf-8')
+
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def address_string(self):
+
+            return str(self.client_address or socket_path)
+
+        def log_message(self, format, *log_args):
+
+            logging.debug("Daemon request: " + format, *log_args)
+
+    if socket_path is None:
+        return http.server.ThreadingHTTPServer((host, port), Handler)
+
+    class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+        daemon_threads = True
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    return UnixServer(socket_path, Handler)
+
+def _chunked(iterable, chunksize):
+    """ Yields lists of at most chunksize items from iterable. """
+
+    iterator = iter(iterable)
+
+    while True:
+        chunk = list(itertools.islice(iterator, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+####################### END SECTION FOR HELPER FUNCTIONS ##########################
+
+####################### BEGIN SECTION FOR BATCH ENGINE ##########################
+
+class _Chunk():
+    """
+    A batch of features. geoms is a numpy array of shapely geometries, props the list of their properties or, \
+    when read from a GeoParquet / Feather file, an Arrow table. fids are the feature ids in the source when \
+    the features were read through a spatial filter, None when they are consecutive. columns is a dict of \
+    numpy arrays of fields added to list props by the stages, so features can share their props dicts.
+    """
+
+    __slots__ = ('geoms', 'props', 'fids', 'columns')
+
+    def __init__(self, geoms, props, fids=None, columns=None):
+
+        self.geoms = geoms
+        self.props = props
+        self.fids = fids
+        self.columns = columns
+
+    def __len__(self):
+
+        return len(self.props)
+
+    def withGeoms(self, geoms):
+        """ Same features with new geometries. """
+
+        return _Chunk(geoms, self.props, self.fids, self.columns)
+
+    def take(self, indices):
+        """ Subset of the features at indices. """
+
+        import numpy as np
+
+        fids = self.fids[indices] if self.fids is not None else None
+
+        if not isinstance(self.props, list):
+            return _Chunk(self.geoms[indices], self.props.take(np.asarray(indices, dtype=np.int64)), fids)
+
+        columns = dict((name, values[indices]) for name, values in self.columns.items()) if self.columns else None
+
+        return _Chunk(self.geoms[indices], [self.props[i] for i in indices], fids, columns)
+
+    def slice(self, start, stop):
+        """ Features from start to stop. """
+
+        fids = self.fids[start:stop] if self.fids is not None else None
+
+        if not isinstance(self.props, list):
+            return _Chunk(self.geoms[start:stop], self.props.slice(start, max(0, stop - start)), fids)
+
+        columns = dict((name, values[start:stop]) for name, values in self.columns.items()) if self.columns else None
+
+        return _Chunk(self.geoms[start:stop], self.props[start:stop], fids, columns)
+
+    def field(self, name):
+        """ List of the values of the field name. """
+
+        if not isinstance(self.props, list):
+            return self.props.column(name).to_pylist()
+
+        if self.columns and name in self.columns:
+            return self.columns[name].tolist()
+
+        return [props[name] for props in self.props]
+
+    def properties(self):
+        """ List of the properties of each feature, with the columns. """
+
+        props = self.props if isinstance(self.props, list) else self.props.to_pylist()
+
+        if not self.columns:
+            return props
+
+        names = list(self.columns)
+        rows = zip(*[self.columns[name].tolist() for name in names])
+
+        # A view over the shared props of each feature, with its own columns first.
+        return [collections.ChainMap(dict(zip(names, row)), p) for p, row in zip(props, rows)]
+
+    def records(self):
+        """ The features as fiona records, ready for writerecords. """
+
+        return [{'geometry': g, 'properties': p} for g, p in zip(_toGeojson(self.geoms), self.properties())]
+
+def _concatChunks(chunks):
+    """ Concatenates _Chunk into a single _Chunk. """
+
+    import numpy as np
+
+    if not chunks:
+        return _Chunk(np.empty(0, dtype=object), [])
+
+    geoms = np.concatenate([c.geoms for c in chunks])
+    fids = np.concatenate([c.fids for c in chunks]) if all(c.fids is not None for c in chunks) else None
+
+    if all(isinstance(c.props, list) for c in chunks):
+        columns = dict((name, np.concatenate([c.columns[name] for c in chunks])) for name in chunks[0].columns) \
+            if chunks[0].columns else None
+        return _Chunk(geoms, [p for c in chunks for p in c.props], fids, columns)
+
+    import pyarrow as pa
+
+    return _Chunk(geoms, pa.concat_tables([pa.Table.from_pylist(c.properties()) if isinstance(c.props, list) \
+        else c.props for c in chunks]), fids)
+
+
+def _readChunks(src, chunksize=10000, where=None):
+    """
+    Yields the features of an open fiona collection (or _ArrowSource) as _Chunk of at most chunksize features. \
+    With a _SpatialFilter where, only the features it selects are read: the ids found in an up to date \
+    SpatialIndex of the source, or else the records whose bounds intersect its bounds.
+    """
+
+    import numpy as np
+
+    if isinstance(src, _ArrowSource):
+        yield from src.chunks(chunksize, where)
+        return
+
+    if where is None:
+        for features in _chunked(src, chunksize):
+
+            geoms = _fromGeojson([f['geometry'] for f in features])
+
+            yield _Chunk(geoms, [f['properties'] for f in features])
+
+        return
+
+    fids = where.fids(src.path)
+    features = _featuresAt(src, fids) if fids is not None else src.filter(bbox=where.bounds)
+
+    for features in _chunked(features, chunksize):
+
+        geoms = _fromGeojson([f['geometry'] for f in features])
+        chunk = _Chunk(geoms, [f['properties'] for f in features], np.array([int(f.id) for f in features]))
+        chunk = chunk.take(np.flatnonzero(where.test(geoms)))
+
+        if len(chunk):
+            yield chunk
+
+def _featuresAt(src, fids):
+    """ Features of the sorted ids fids of an open fiona collection. Consecutive ids are read sequentially. """
+
+    if len(fids) and fids[-1] - fids[0] + 1 == len(fids):
+        return src.filter(int(fids[0]), int(fids[-1]) + 1)
+
+    return (src[int(fid)] for fid in fids)
+
+class _MappedShapefile():
+    """
+    Memory mapped .shp and .shx files. Gives the bounds of the records from their headers and the coordinates of \
+    point layers without parsing geometries.
+
+    A .shp is a 100 byte header followed by records, each an 8 byte header and its content. The .shx holds the \
+    offset and content length of each record in 16 bit words, big endian.
+    """
+
+    HEADER = 100
+
+    NULL, POINT = 0, 1
+
+    # Point, PointZ and PointM records all start with x, y.
+    POINTS = (1, 11, 21)
+
+    # fiona geometry type of each shape type.
+    GEOMETRY_TYPES = {1: 'Point', 3: 'LineString', 5: 'Polygon', 8: 'MultiPoint', 11: '3D Point', \
+        13: '3D LineString', 15: '3D Polygon', 18: '3D MultiPoint', 21: 'Point', 23: 'LineString', 25: 'Polygon', \
+        28: 'MultiPoint'}
+
+    @classmethod
+    def open(cls, path):
+        """ Maps path, or returns None when path is not a shapefile with a .shx. """
+
+        base, extension = os.path.splitext(path)
+
+        if extension.lower() != '.shp':
+            return None
+
+        shx = next((base + e for e in ('.shx', '.SHX') if os.path.exists(base + e)), None)
+
+        if shx is None:
+            return None
+
+        return _LAYER_CACHE.get(('mapped', os.path.abspath(path)), lambda: cls(path, shx), _fileStamp(path, shx))
+
+    def __init__(self, path, shx):
+
+        import numpy as np
+
+        self.path = path
+        self.shp = np.memmap(path, dtype=np.uint8, mode='r')
+        index = np.memmap(shx, dtype=np.uint8, mode='r')
+
+        self.shape_type = int(self.shp[32:36].view('<i4')[0])
+        self.extent = tuple(self.shp[36:68].view('<f8').tolist())
+
+        self.count = (len(index) - self.HEADER) // 8
+        records = index[self.HEADER:self.HEADER + self.count * 8].view('>i4').reshape(self.count, 2)
+
+        # Byte offset and length of the content of each record, after its 8 byte header.
+        self.content = records[:, 0].astype(np.int64) * 2 + 8
+        self.length = records[:, 1].astype(np.int64) * 2
+
+    def __len__(self):
+
+        return self.count
+
+    def isPoint(self):
+        """ True for Point, PointZ and PointM layers, whose records start with x, y. """
+
+        return self.shape_type in self.POINTS
+
+    def isXYPoint(self):
+        """ True for Point layers, whose points read from the records are the whole geometries. """
+
+        return self.shape_type == self.POINT
+
+    def meta(self, src):
+        """ Meta of src, opened with ignore_geometry, with the geometry type of the .shp. """
+
+        return _withGeometryType(src.meta, self.GEOMETRY_TYPES.get(self.shape_type, 'Unknown'))
+
+    def _gather(self, positions, nbytes, dtype):
+        """ Reads nbytes at each byte position as a row of dtype. """
+
+        import numpy as np
+
+        return np.ascontiguousarray(self.shp[positions[:, None] + np.arange(nbytes)]).view(dtype)
+
+    def _content(self, start, stop, fids):
+        """ Content offsets of the records from start to stop, or of the records fids. """
+
+        return self.content[fids] if fids is not None else self.content[start:stop]
+
+    def _read(self, content, doubles):
+        """ Reads the doubles after the shape type of each record, NaN for null records which have none. """
+
+        import numpy as np
+
+        values = np.full((len(content), doubles), np.nan)
+        shapes = np.flatnonzero(self._gather(content, 4, '<i4')[:, 0] != self.NULL)
+        values[shapes] = self._gather(content[shapes] + 4, doubles * 8, '<f8')
+
+        return values
+
+    def coordinates(self, start=0, stop=None, fids=None):
+        """
+        Array of the x, y of the points from start to stop (or of the records fids), NaN for null records. \
+        Without null records, the records are equally apart (28 bytes for Point, 36 for PointM and PointZ \
+        without measures, 44 for PointZ) and the array is a view of the mapped file.
+        """
+
+        import numpy as np
+
+        stop = self.count if stop is None else min(stop, self.count)
+        count = max(0, stop - start)
+
+        # Records of 20 content bytes or more hold a point, null records only their shape type.
+        if fids is None and self.isPoint() and count and self.length[start] >= 20:
+
+            stride = int(self.length[start]) + 8
+            first = self.content[start]
+
+            # A null record shifts the records after it, or ends the range with a shorter record.
+            if self.content[stop - 1] == first + (count - 1) * stride and first == self.HEADER + 8 + start * stride \
+                and self.length[stop - 1] == self.length[start]:
+                return np.ndarray((count, 2), dtype='<f8', buffer=self.shp, offset=first + 4, strides=(stride, 8))
+
+        return self._read(self._content(start, stop, fids), 2)
+
+    def bounds(self, start=0, stop=None, fids=None):
+        """ Array of the minx, miny, maxx, maxy of the records from start to stop, NaN for null records. """
+
+        import numpy as np
+
+        if self.isPoint():
+            coords = self.coordinates(start, stop, fids)
+            return np.column_stack([coords, coords])
+
+        stop = self.count if stop is None else min(stop, self.count)
+
+        return self._read(self._content(start, stop, fids), 4)
+
+    def boxes(self, start=0, stop=None, fids=None):
+        """ Bounding box polygons of the records from start to stop, None for null records. """
+
+        import numpy as np
+        import shapely
+
+        bounds = self.bounds(start, stop, fids)
+        geoms = shapely.box(bounds[:, 0], bounds[:, 1], bounds[:, 2], bounds[:, 3])
+        geoms[np.isnan(bounds[:, 0])] = None
+
+        return geoms
+
+    def points(self, start=0, stop=None, fids=None):
+        """ Points of the records from start to stop, None for null records. """
+
+        import numpy as np
+        import shapely
+
+        coords = self.coordinates(start, stop, fids)
+        geoms = shapely.points(coords)
+        geoms[np.isnan(coords[:, 0])] = None
+
+        return geoms
+
+def _mappedChunks(src, mapped, geometries, chunksize=10000, where=None):
+    """
+    Yields _Chunk with the properties of src, opened with ignore_geometry, and geometries(start, stop) made from \
+    the _MappedShapefile of the same file. A _SpatialFilter where is tested on the points of a point layer, \
+    only the properties of the selected records are read.
+    """
+
+    import numpy as np
+
+    if where is not None:
+
+        candidates = where.fids(mapped.path)
+
+        if candidates is None:
+            candidates = np.arange(len(mapped))
+
+        for start in range(0, len(candidates), chunksize):
+
+            fids = candidates[start:start + chunksize]
+
+            if where.geometry is not None:
+                fids = fids[where.test(mapped.points(fids=fids))]
+
+            if len(fids):
+                yield _Chunk(geometries(fids=fids), [f['properties'] for f in _featuresAt(src, fids)], fids)
+
+        return
+
+    start = 0
+
+    for features in _chunked(src, chunksize):
+
+        stop = start + len(features)
+
+        yield _Chunk(geometries(start, stop), [f['properties'] for f in features])
+
+        start = stop
+
+    if start != len(mapped):
+        raise ValueError("The .shx has " + str(len(mapped)) + " records, the .dbf " + str(start) + ".")
+
+def _timed(iterable, metrics, phase):
+    """ Yields the items of iterable, adding the time spent producing them to phase. """
+
+    iterator = iter(iterable)
+
+    while True:
+        with metrics.timer(phase):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+# Ends the queue of a reader or writer thread.
+_END_OF_QUEUE = object()
+
+def _readAhead(iterable, depth, metrics):
+    """
+    Returns the items of iterable, produced by a reader thread up to depth items ahead of the consumer.
+
+    The time producing the items is added to 'read', the time the reader waits for room in the full queue to \
+    'read_stall' and the time the consumer waits for items to 'compute_stall_read'. A depth of 0 reads in turn \
+    with the consumer.
+    """
+
+    if not depth:
+        return _timed(iterable, metrics, 'read')
+
+    return _readAheadItems(iterable, depth, metrics)
+
+def _readAheadItems(iterable, depth, metrics):
+
+    import queue
+
+    items = queue.Queue(depth)
+    stop = threading.Event()
+
+    def put(item):
+        with metrics.timer('read_stall'):
+            while not stop.is_set():
+                try:
+                    return items.put(item, timeout=0.1)
+                except queue.Full:
+                    pass
+
+    def read():
+        try:
+            for item in _timed(iterable, metrics, 'read'):
+                put((item, None))
+                if stop.is_set():
+                    return
+            put((_END_OF_QUEUE, None))
+        except BaseException as e:
+            put((_END_OF_QUEUE, e))
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+
+    try:
+        while True:
+            with metrics.timer('compute_stall_read'):
+                item, error = items.get()
+
+            if error is not None:
+                raise error
+
+            if item is _END_OF_QUEUE:
+                return
+
+            yield item
+    finally:
+        stop.set()
+        reader.join()
+
+        if hasattr(iterable, 'close'):
+            iterable.close()
+
+@contextlib.contextmanager
+def _writeBehind(write, depth, metrics):
+    """
+    Yields a function queueing items for a writer thread calling write(item), at most depth items behind.
+
+    The time the producer waits for room in the full queue is added to 'compute_stall_write' and the time the \
+    writer waits for items to 'write_stall'. The queued items are written before leaving the block, an error of \
+    write is raised then or by the next queued item. A depth of 0 yields write.
+    """
+
+    if not depth:
+        yield write
+        return
+
+    import queue
+
+    items = queue.Queue(depth)
+    errors = []
+
+    def consume():
+        while True:
+            with metrics.timer('write_stall'):
+                item = items.get()
+
+            if item is _END_OF_QUEUE:
+                return
+
+            # After an error the items are only taken from the queue, so the producer is never blocked.
+            if not errors:
+                try:
+                    write(item)
+                except BaseException as e:
+                    errors.append(e)
+
+    def put(item):
+        if errors:
+            raise errors[0]
+
+        with metrics.timer('compute_stall_write'):
+            items.put(item)
+
+    writer = threading.Thread(target=consume, daemon=True)
+    writer.start()
+
+    try:
+        yield put
+    finally:
+        items.put(_END_OF_QUEUE)
+        writer.join()
+
+    if errors:
+        raise errors[0]
+
+def _writeChunk(dst, chunk, metrics):
+    """ Writes a _Chunk with a single writerecords call, or as Arrow arrays to an _ArrowSink. """
+
+    with metrics.timer('write'):
+        _writeTo(dst, chunk)
+
+    metrics.features(len(chunk))
+
+def _writeFeatures(dst, features, metrics):
+    """ Writes a list of fiona features with a single writerecords call. """
+
+    with metrics.timer('write'):
+        dst.writerecords(features)
+
+    metrics.features(len(features))
+
+def _writeTo(dst, chunk):
+
+    if isinstance(dst, _ArrowSink):
+        dst.writeChunk(chunk)
+    else:
+        dst.writerecords(chunk.records())
+
+# Shapefiles are several files, count them all.
+_SIDECAR_EXTENSIONS = ('.shp', '.shx', '.dbf', '.prj', '.cpg')
+
+def _datasetBytes(path):
+
+    base, extension = os.path.splitext(path)
+    paths = [base + e for e in _SIDECAR_EXTENSIONS] if extension.lower() == '.shp' else [path]
+
+    return sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+
+def _partitions(path, where=None, parts=4, partition='range'):
+    """
+    Splits the ids of the features of path selected by where into at most parts sorted arrays. 'range' makes \
+    ranges of consecutive features, 'tile' groups the features by the cell of a grid over the layer extent \
+    holding the center of their bounds.
+    """
+
+    import numpy as np
+
+    fids = where.fids(path) if where is not None else None
+
+    if fids is None:
+        fids = np.arange(_featureCount(path))
+
+    if partition == 'range':
+        return np.array_split(fids, max(1, min(parts, len(fids))))
+
+    if partition != 'tile':
+        raise ValueError("Unknown partition: " + str(partition) + ". Use range or tile.")
+
+    index = _spatialIndex(path)
+    bounds = (index.bounds if index is not None else _layerBounds(path))[fids]
+    centers = (bounds[:, :2] + bounds[:, 2:]) / 2
+
+    side = int(math.ceil(math.sqrt(parts)))
+    tiles = np.zeros(len(fids), dtype=np.int64)
+    located = ~np.isnan(centers[:, 0])
+
+    # Features without geometry go to the first tile.
+    if located.any():
+        low = centers[located].min(axis=0)
+        size = np.maximum(centers[located].max(axis=0) - low, 1e-12)
+        cells = np.clip(((centers[located] - low) / size * side).astype(np.int64), 0, side - 1)
+        tiles[located] = cells[:, 1] * side + cells[:, 0]
+
+    order = np.argsort(tiles, kind='stable')
+    breaks = np.flatnonzero(np.diff(tiles[order])) + 1
+
+    return np.split(fids[order], breaks)
+
+def _runPartition(pipeline, partfile):
+    """ Runs a partition of a Pipeline to partfile. Runs in the worker processes of Pipeline.run. """
+
+    count, fids = pipeline._write(partfile)
+    report = pipeline.metrics.report()
+
+    # The source and the output are counted once by Pipeline.run.
+    for name in ('dataset_bytes', 'bytes_written'):
+        report['counters'].pop(name, None)
+
+    return {'file': partfile, 'features': count, 'fids': fids, 'meta': pipeline.meta, 'metrics': report}
+
+def _partFeatures(counts):
+    """ The (part, feature) arrays of the features of parts of counts features written one after another. """
+
+    import numpy as np
+
+    counts = np.asarray(counts, dtype=np.int64)
+    firsts = np.cumsum(counts) - counts
+
+    return np.repeat(np.arange(len(counts)), counts), np.arange(counts.sum()) - np.repeat(firsts, counts)
+
+def _sourceOrder(fids):
+    """ The (part, feature) arrays putting the features of the parts, whose source ids are fids, in source order. """
+
+    import numpy as np
+
+    part, feature = _partFeatures([len(f) for f in fids])
+    order = np.argsort(np.concatenate(fids), kind='stable')
+
+    return part[order], feature[order]
+
+def _featureHashes(path, chunksize=10000):
+    """
+    Array of a 16 byte hash of the geometry and attributes of each feature of path. The hashes of a shapefile \
+    are made from the bytes of its .shp and .dbf records, nothing is decoded.
+    """
+
+    import numpy as np
+    import shapely
+
+    mapped = _MappedShapefile.open(path)
+    dbf = os.path.splitext(path)[0] + '.dbf'
+
+    if mapped is not None and os.path.exists(dbf):
+
+        dbf = np.memmap(dbf, dtype=np.uint8, mode='r')
+        header_size, record_size = (int(v) for v in dbf[8:12].view('<u2'))
+        shp, dbf = memoryview(mapped.shp), memoryview(dbf)
+
+        hashes = []
+        record = header_size
+
+        for content, length in zip(mapped.content.tolist(), mapped.length.tolist()):
+            digest = hashlib.blake2b(shp[content:content + length], digest_size=16)
+            digest.update(dbf[record:record + record_size])
+            hashes.append(digest.digest())
+            record += record_size
+
+        return np.array(hashes, dtype='S16')
+
+    hashes = []
+
+    with _openSource(path) as src:
+        for chunk in _readChunks(src, chunksize):
+
+            props = chunk.props if isinstance(chunk.props, list) else chunk.props.to_pylist()
+
+            for wkb, properties in zip(shapely.to_wkb(chunk.geoms).tolist(), props):
+                digest = hashlib.blake2b(wkb or b'', digest_size=16)
+                digest.update(json.dumps(dict(properties), sort_keys=True, default=str).encode('utf-8'))
+                hashes.append(digest.digest())
+
+    return np.array(hashes, dtype='S16')
+
+def _manifestPath(path):
+    """ Path of the incremental manifest of the output path. """
+
+    base, extension = os.path.splitext(path)
+
+    return (base if extension.lower() == '.shp' else path) + '.manifest.npz'
+
+def _loadManifest(path, key):
+    """
+    The (hashes, first, count) arrays of the manifest of the output path: the hash of each source feature and the \
+    first and number of output features made from it. None when there is no manifest, it was made by another \
+    operation than key or path changed since.
+    """
+
+    import numpy as np
+
+    manifest = _manifestPath(path)
+
+    if not os.path.exists(manifest) or not os.path.exists(path):
+        return None
+
+    stat = os.stat(path)
+
+    with np.load(manifest) as data:
+
+        if str(data['key']) != key or data['output'].tolist() != [stat.st_size, stat.st_mtime_ns]:
+            logging.info("The manifest of %s is stale, recomputing all features.", path)
+            return None
+
+        return data['hashes'], data['first'], data['count']
+
+def _saveManifest(path, key, hashes, first, count):
+
+    import numpy as np
+
+    stat = os.stat(path)
+
+    with open(_manifestPath(path), 'wb') as f:
+        np.savez(f, key=np.array(key), output=np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64), \
+            hashes=hashes, first=first, count=count)
+
+def _replaceDataset(src, dst):
+    """ Moves the dataset src over dst, with all the files of a shapefile. """
+
+    if os.path.splitext(dst)[1].lower() != '.shp':
+        os.replace(src, dst)
+        return
+
+    for extension in _SIDECAR_EXTENSIONS:
+        if os.path.exists(os.path.splitext(src)[0] + extension):
+            os.replace(os.path.splitext(src)[0] + extension, os.path.splitext(dst)[0] + extension)
+
+def _mergeParts(parts, outfile, meta, order=None):
+    """
+    Merges the partial outputs parts into outfile, one after another or in order, the (part, feature) arrays of \
+    the features of outfile. Shapefiles are merged by copying the bytes of their records, GeoParquet and \
+    Feather as Arrow tables, other formats through fiona.
+
+    RETURN(S)
+
+    : count : Number of features written.
+
+    """
+
+    import numpy as np
+
+    if os.path.splitext(outfile)[1].lower() == '.shp':
+        count = _mergeShapefiles(parts, outfile, order)
+        if count is not None:
+            return count
+
+    if _columnarFormat(outfile):
+        return _mergeColumnar(parts, outfile, order)
+
+    chunks = []
+
+    for part in parts:
+        with _openSource(part) as src:
+            chunks.append(_concatChunks(list(_readChunks(src))))
+
+    if order is not None:
+        offsets = np.cumsum([0] + [len(c) for c in chunks])
+        chunks = [_concatChunks(chunks).take(offsets[order[0]] + order[1])]
+
+    with _openSink(outfile, meta) as dst:
+        for chunk in chunks:
+            if len(chunk):
+                _writeTo(dst, chunk)
+
+    return sum(len(c) for c in chunks)
+
+def _mergeShapefiles(parts, outfile, order=None):
+    """
+    Merges shapefiles into outfile by copying the bytes of their records. The .shp records are renumbered, the \
+    .shx offsets and the headers rewritten. Returns None and writes nothing when the .dbf fields of the parts \
+    differ.
+    """
+
+    import numpy as np
+
+    shps = [_MappedShapefile.open(part) for part in parts]
+    dbfs = [np.memmap(os.path.splitext(part)[0] + '.dbf', dtype=np.uint8, mode='r') for part in parts]
+
+    # The .dbf header holds the number of records at byte 4, the header and record sizes at bytes 8 and 10.
+    header_size, record_size = (int(v) for v in dbfs[0][8:12].view('<u2'))
+
+    if any(bytes(dbf[8:header_size]) != bytes(dbfs[0][8:header_size]) for dbf in dbfs):
+        return None
+
+    if order is None:
+        order = _partFeatures([len(shp) for shp in shps])
+
+    part, feature = order
+    total = len(part)
+
+    sizes = np.empty(total, dtype=np.int64)
+    for i, shp in enumerate(shps):
+        selected = part == i
+        sizes[selected] = shp.length[feature[selected]] + 8
+
+    offsets = _MappedShapefile.HEADER + np.cumsum(sizes) - sizes
+
+    header = np.array(shps[0].shp[:_MappedShapefile.HEADER])
+    header[24:28] = np.array([(_MappedShapefile.HEADER + sizes.sum()) // 2], dtype='>i4').view(np.uint8)
+
+    # xmin, ymin, xmax, ymax, zmin, zmax, mmin, mmax of the non empty parts.
+    ranges = np.array([shp.shp[36:100].view('<f8') for shp in shps if len(shp)]).reshape(-1, 8)
+    if len(ranges):
+        header[36:100] = np.concatenate([ranges[:, [0, 1]].min(axis=0), ranges[:, [2, 3]].max(axis=0), \
+            ranges[:, [4]].min(axis=0), ranges[:, [5]].max(axis=0), ranges[:, [6]].min(axis=0), \
+            ranges[:, [7]].max(axis=0)]).view(np.uint8)
+
+    dbf_header = np.array(dbfs[0][:header_size])
+    dbf_header[4:8] = np.array([total], dtype='<u4').view(np.uint8)
+
+    # Runs of features consecutive in the same part are copied at once.
+    breaks = np.flatnonzero((np.diff(part) != 0) | (np.diff(feature) != 1)) + 1
+    starts = np.concatenate([[0], breaks]) if total else breaks
+    stops = np.concatenate([breaks, [total]]) if total else breaks
+
+    base = os.path.splitext(outfile)[0]
+
+    with open(base + '.shp', 'wb') as shp_file, open(base + '.dbf', 'wb') as dbf_file:
+
+        shp_file.write(header.tobytes())
+        dbf_file.write(dbf_header.tobytes())
+
+        for start, stop in zip(starts.tolist(), stops.tolist()):
+
+            shp, dbf = shps[part[start]], dbfs[part[start]]
+            first, last = int(feature[start]), int(feature[stop - 1])
+            content, length = shp.content[first:last + 1], shp.length[first:last + 1]
+
+            if content[-1] + length[-1] - content[0] == (length + 8).sum() - 8:
+                block = np.array(shp.shp[content[0] - 8:content[-1] + length[-1]])
+            else:
+                block = np.concatenate([shp.shp[c - 8:c + n] for c, n in zip(content.tolist(), length.tolist())])
+
+            positions = np.cumsum(length + 8) - (length + 8)
+            numbers = np.arange(start + 1, stop + 1).astype('>i4').view(np.uint8).reshape(-1, 4)
+            block[positions[:, None] + np.arange(4)] = numbers
+
+            shp_file.write(block.tobytes())
+            dbf_file.write(dbf[header_size + first * record_size:header_size + (last + 1) * record_size].tobytes())
+
+        dbf_file.write(b'\x1a')
+
+    header[24:28] = np.array([(_MappedShapefile.HEADER + total * 8) // 2], dtype='>i4').view(np.uint8)
+    records = np.column_stack([offsets // 2, (sizes - 8) // 2]).astype('>i4')
+
+    with open(base + '.shx', 'wb') as shx_file:
+        shx_file.write(header.tobytes())
+        shx_file.write(records.tobytes())
+
+    for extension in ('.prj', '.cpg'):
+        source = os.path.splitext(parts[0])[0] + extension
+        if os.path.exists(source):
+            shutil.copyfile(source, base + extension)
+
+    return total
+
+def _mergeColumnar(parts, outfile, order=None, chunksize=65536):
+    """ Merges GeoParquet or Feather files into outfile, written in row groups (record batches) of chunksize. """
+
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if _columnarFormat(outfile) == 'parquet':
+        tables = [pq.read_table(part) for part in parts]
+    else:
+        tables = [pa.ipc.open_file(pa.memory_map(part)).read_all() for part in parts]
+
+    table = pa.concat_tables(tables)
+
+    if order is not None:
+        offsets = np.cumsum([0] + [t.num_rows for t in tables])
+        table = table.take(offsets[order[0]] + order[1])
+
+    if _columnarFormat(outfile) == 'parquet':
+        pq.write_table(table, outfile, row_group_size=chunksize)
+    else:
+        with pa.ipc.new_file(outfile, table.schema) as writer:
+            writer.write_table(table, max_chunksize=chunksize)
+
+    return table.num_rows
+
+# Nesting depth of the coordinates of each geojson geometry type.
+_COORDINATE_DEPTH = {'Point': 0, 'LineString': 1, 'Polygon': 2, 'MultiPoint': 1, 'MultiLineString': 2, 'MultiPolygon': 3}
+
+def _fromGeojson(geometries):
+    """
+    Converts a list of geojson like geometries to an array of shapely geometries.
+
+    Geometries of each type are flattened into one coordinate array with offsets and built with a single
+    shapely.from_ragged_array call, instead of a shape() call per feature.
+    """
+
+    import numpy as np
+    import shapely
+
+    geoms = np.empty(len(geometries), dtype=object)
+    groups = {}
+
+    for i, g in enumerate(geometries):
+        if g:
+            groups.setdefault(g['type'], []).append(i)
+
+    for geometry_type, indices in groups.items():
+
+        depth = _COORDINATE_DEPTH.get(geometry_type)
+
+        try:
+            if depth is None:
+                raise ValueError(geometry_type)
+
+            current = [geometries[i]['coordinates'] for i in indices]
+            offsets = []
+
+            for _ in range(depth):
+                nested, offset = [], [0]
+                for item in current:
+                    nested.extend(item)
+                    offset.append(len(nested))
+                offsets.insert(0, np.array(offset, dtype=np.int64))
+                current = nested
+
+            coords = np.array(current, dtype=float).reshape(len(current), -1)
+
+            geoms[indices] = shapely.from_ragged_array(getattr(shapely.GeometryType, geometry_type.upper()), \
+                coords, tuple(offsets) or None)
+
+        except ValueError:
+            # Collections, empty parts and mixed 2D/3D coordinates.
+            geoms[indices] = [shapely.geometry.shape(geometries[i]) for i in indices]
+
+    return geoms
+
+def _toGeojson(geoms):
+    """
+    Converts an array of shapely geometries to geojson like dicts. Missing and empty geometries become None.
+
+    Geometries of each type are converted with a single shapely.to_ragged_array call and the coordinate lists
+    are cut out of its offsets, instead of a mapping() call per feature.
+    """
+
+    import numpy as np
+    import shapely
+
+    out = [None] * len(geoms)
+
+    present = ~(shapely.is_missing(geoms) | shapely.is_empty(geoms))
+    type_ids = shapely.get_type_id(geoms)
+
+    for type_id in np.unique(type_ids[present]).tolist():
+
+        indices = np.flatnonzero(present & (type_ids == type_id))
+
+        # Collections and linear rings have no ragged array form.
+        if type_id not in _GEOJSON_TYPES:
+            for i in indices.tolist():
+                out[i] = shapely.geometry.mapping(geoms[i])
+            continue
+
+        geometry_type, coords, offsets = shapely.to_ragged_array(geoms[indices])
+        name = _GEOJSON_TYPES[type_id]
+
+        nested = coords.tolist()
+
+        for offset in offsets:
+            offset = offset.tolist()
+            nested = [nested[offset[k]:offset[k + 1]] for k in range(len(offset) - 1)]
+
+        for i, coordinates in zip(indices.tolist(), nested):
+            out[i] = {'type': name, 'coordinates': coordinates}
+
+    return out
+
+_GEOJSON_TYPES = {0: 'Point', 1: 'LineString', 3: 'Polygon', 4: 'MultiPoint', 5: 'MultiLineString', 6: 'MultiPolygon'}
+
+def _deriveBbox(chunk):
+
+    import shapely
+
+    bounds = shapely.bounds(chunk.geoms)
+
+    return chunk.withGeoms(shapely.box(bounds[:, 0], bounds[:, 1], bounds[:, 2], bounds[:, 3]))
+
+def _deriveCentroids(chunk):
+
+    import shapely
+
+    return chunk.withGeoms(shapely.centroid(chunk.geoms))
+
+def _deriveRepresentativePoints(chunk):
+
+    import shapely
+
+    return chunk.withGeoms(shapely.point_on_surface(chunk.geoms))
+
+def _geometryStage(derive, geometry_type):
+    """ Makes a pipeline stage from a derive function that replaces the geometries by geometry_type geometries. """
+
+    def stage(meta):
+        return _withGeometryType(meta, geometry_type), derive
+
+    return stage
+
+def _withGeometryType(meta, geometry_type):
+
+    meta = dict(meta, schema=dict(meta['schema'], geometry=geometry_type))
+
+    return meta
+
+def _crsStage(meta, crs):
+
+    meta = dict(meta, crs=crs)
+    meta.pop('crs_wkt', None)
+
+    return meta, lambda chunk: chunk
+
+def _reprojectStage(meta, crs):
+
+    transformer = getTransformer(meta['crs'], crs)
+
+    meta = dict(meta, crs=crs)
+    meta.pop('crs_wkt', None)
+
+    return meta, lambda chunk: chunk.withGeoms(_transformGeoms(chunk.geoms, transformer))
+
+class _PointSnapper():
+    """ Snaps the vertices of geometries to the nearest point of a point shapefile within tolerance. """
+
+    def __init__(self, pointshp, tolerance, endpoints_only=False, spatial_index=None):
+
+        import numpy as np
+        import shapely
+
+        self.index = _spatialIndex(pointshp, spatial_index)
+
+        # The bounds of a point are its coordinates repeated, those of a multipoint are not.
+        if self.index is not None and np.any(self.index.bounds[:, :2] < self.index.bounds[:, 2:]):
+            logging.info("Indexing the parts of the multipoints of " + pointshp + " in memory.")
+            self.index = None
+
+        if self.index is not None:
+            self.coords = self.index.bounds[:, :2]
+        else:
+            mapped = _MappedShapefile.open(pointshp)
+
+            if mapped is not None and mapped.isPoint():
+                points = mapped.points(0, len(mapped))
+            else:
+                with _openSource(pointshp) as src:
+                    points = np.concatenate([chunk.geoms for chunk in _readChunks(src)] or [np.empty(0, dtype=object)])
+
+            # The tree and the coordinates are indexed part by part, so that they line up for multipoints.
+            points = shapely.get_parts(points[~(shapely.is_missing(points) | shapely.is_empty(points))])
+
+            self.tree = shapely.STRtree(points)
+            self.coords = shapely.get_coordinates(points)
+
+        self.tolerance = float(tolerance)
+        self.endpoints_only = endpoints_only
+        self.snapped = 0
+
+    def snap(self, chunk):
+
+        import numpy as np
+        import shapely
+
+        coords = shapely.get_coordinates(chunk.geoms)
+
+        if self.endpoints_only:
+            # Coordinates come part after part, so the endpoints are at the part boundaries.
+            counts = shapely.get_num_coordinates(shapely.get_parts(chunk.geoms))
+            ends = np.cumsum(counts)
+            positions = np.unique(np.concatenate([ends - counts, ends - 1]))
+        else:
+            positions = np.arange(len(coords))
+
+        if not len(positions) or not len(self.coords):
+            return chunk
+
+        if self.index is not None:
+            vertex_index, point_index = self.index.nearest(coords[positions], self.tolerance)
+        else:
+            vertex_index, point_index = self.tree.query_nearest(shapely.points(coords[positions]), \
+                max_distance=self.tolerance, all_matches=False)
+
+        coords[positions[vertex_index]] = self.coords[point_index]
+        self.snapped += len(vertex_index)
+
+        return chunk.withGeoms(shapely.set_coordinates(chunk.geoms.copy(), coords))
+
+def _snapStage(meta, pointshp, tolerance, mode='vertices'):
+
+    return meta, _PointSnapper(pointshp, float(tolerance), mode == 'endpoints').snap
+
+class _PolygonJoiner():
+    """ Finds the polygons of a polygon layer containing points and joins their attributes. """
+
+    def __init__(self, polygonfile, fields=None, prefix='', predicate='within'):
+
+        import shapely
+
+        if predicate not in ('within', 'intersects'):
+            raise ValueError("Unknown join predicate: " + str(predicate) + ". Use within or intersects.")
+
+        with _openSource(polygonfile, fields) as src:
+            chunk = _concatChunks(list(_readChunks(src, 100000)))
+            properties = src.meta['schema']['properties']
+
+        self.schema = dict((prefix + name, field_type) for name, field_type in properties.items())
+        self.geoms = chunk.geoms
+        self.table = None
+        self.records = None
+
+        if isinstance(chunk.props, list):
+            self.records = [dict((prefix + name, value) for name, value in props.items()) for props in chunk.props]
+        else:
+            self.table = chunk.props.rename_columns([prefix + name for name in chunk.props.column_names])
+
+        # Prepared polygons are reused by the containment test of every chunk.
+        shapely.prepare(self.geoms)
+
+        self.tree = shapely.STRtree(self.geoms)
+        self.test = shapely.contains_xy if predicate == 'within' else shapely.intersects_xy
+
+    def match(self, x, y):
+        """ Arrays of the (point, polygon) pairs of the points x, y inside a polygon, by point. """
+
+        import numpy as np
+        import shapely
+
+        point, polygon = self.tree.query(shapely.points(x, y))
+        inside = self.test(self.geoms[polygon], x[point], y[point])
+        point, polygon = point[inside], polygon[inside]
+        order = np.lexsort((polygon, point))
+
+        return point[order], polygon[order]
+
+    def join(self, chunk, how='inner'):
+        """ The points of chunk with the attributes of their polygons, once per polygon. """
+
+        import numpy as np
+        import shapely
+
+        x, y = shapely.get_x(chunk.geoms), shapely.get_y(chunk.geoms)
+        point, polygon = self.match(x, y)
+
+        if how == 'left':
+            # Points in no polygon are kept with polygon -1, no attributes.
+            alone = np.setdiff1d(np.arange(len(chunk)), point)
+            point = np.concatenate([point, alone])
+            polygon = np.concatenate([polygon, np.full(len(alone), -1, dtype=polygon.dtype)])
+            order = np.argsort(point, kind='stable')
+            point, polygon = point[order], polygon[order]
+
+        joined = chunk.take(point)
+
+        if isinstance(joined.props, list):
+            records = self._records()
+            empty = dict.fromkeys(self.schema)
+            joined.props = [dict(props, **(records[i] if i >= 0 else empty)) \
+                for props, i in zip(joined.props, polygon.tolist())]
+        else:
+            import pyarrow as pa
+            columns = self._table().take(pa.array(polygon, mask=polygon < 0))
+            for name in columns.column_names:
+                joined.props = joined.props.append_column(name, columns.column(name))
+
+        return joined
+
+    def _records(self):
+
+        if self.records is None:
+            self.records = self.table.to_pylist()
+
+        return self.records
+
+    def _table(self):
+
+        import pyarrow as pa
+
+        if self.table is None:
+            schema = pa.schema([pa.field(name, _arrowType(t)) for name, t in self.schema.items()])
+            self.table = pa.Table.from_pylist(self.records, schema=schema)
+
+        return self.table
+
+# Polygon layers are loaded and indexed once per process, partitions of a join reuse them.
+_JOINERS = {}
+
+def _joinStage(meta, polygonfile, how='inner', prefix='', predicate='within', *fields):
+
+    if how not in ('inner', 'left'):
+        raise ValueError("Unknown join: " + str(how) + ". Use inner or left.")
+
+    stat = os.stat(polygonfile)
+    key = (polygonfile, stat.st_size, stat.st_mtime_ns, prefix, predicate, fields)
+    joiner = _JOINERS.get(key)
+
+    if joiner is None:
+        _JOINERS.clear()
+        joiner = _PolygonJoiner(polygonfile, list(fields) or None, prefix, predicate)
+        _JOINERS[key] = joiner
+
+    properties = meta['schema']['properties']
+    clashes = [name for name in joiner.schema if name in properties]
+
+    if clashes:
+        raise ValueError("Fields " + ', '.join(clashes) + " are in both layers. Join them with a prefix.")
+
+    meta = dict(meta, schema=dict(meta['schema'], properties=dict(properties, **joiner.schema)))
+
+    return meta, lambda chunk: joiner.join(chunk, how)
+
+class _DuplicateFilter():
+    """ Drops the features whose geometry (and fields) hash has been seen before. """
+
+    def __init__(self, tolerance=None, fields=None, memory_limit=256):
+
+        self.tolerance = float(tolerance) if tolerance else None
+        self.fields = list(fields) if fields else []
+        self.seen = _SpillingHashSet(memory_limit)
+        self.removed = 0
+
+    def hashes(self, chunk):
+
+        import shapely
+
+        geoms = chunk.geoms
+
+        if self.tolerance:
+            geoms = shapely.set_precision(geoms, self.tolerance, mode='pointwise')
+
+        wkbs = shapely.to_wkb(shapely.normalize(geoms))
+        values = zip(*[chunk.field(field) for field in self.fields]) if self.fields else itertools.repeat(None)
+        hashes = []
+
+        for wkb, value in zip(wkbs, values):
+
+            h = hashlib.blake2b(wkb if wkb is not None else b'', digest_size=16)
+
+            if self.fields:
+                h.update(repr(list(value)).encode('utf-8'))
+
+            hashes.append(h.digest())
+
+        return hashes
+
+    def filter(self, chunk):
+
+        keep = self.seen.addNew(self.hashes(chunk))
+        self.removed += len(chunk) - len(keep)
+
+        return chunk.take(keep)
+
+    def close(self):
+
+        self.seen.close()
+
+def _duplicatesStage(meta, tolerance=None, *fields):
+
+    return meta, _DuplicateFilter(tolerance or None, fields).filter
+
+class _SpillingHashSet():
+    """
+    Set of 16 byte hashes. Past memory_limit MB the hashes move to sqlite partitions in a temporary directory.
+    """
+
+    # Approximate memory of one 16 byte bytes object in a python set.
+    ENTRY_BYTES = 100
+
+    def __init__(self, memory_limit=256, partitions=16):
+
+        self.max_entries = max(1, int(memory_limit * 1024 * 1024 / self.ENTRY_BYTES))
+        self.partitions = partitions
+        self.memory = set()
+        self.tmpdir = None
+        self.db = None
+
+    def addNew(self, hashes):
+        """ Adds hashes to the set. Returns the indices of the hashes that were not in it yet. """
+
+        candidates = [i for i, h in enumerate(hashes) if h not in self.memory]
+        spilled = self._spilled([hashes[i] for i in candidates]) if self.db is not None else ()
+
+        new = []
+
+        for i in candidates:
+            h = hashes[i]
+            if h not in spilled and h not in self.memory:
+                self.memory.add(h)
+                new.append(i)
+
+        if len(self.memory) > self.max_entries:
+            self._spill()
+
+        return new
+
+    def _partition(self, h):
+
+        return h[0] % self.partitions
+
+    def _spilled(self, hashes):
+        """ The subset of hashes found in the partitions on disk. """
+
+        by_partition = {}
+        for h in hashes:
+            by_partition.setdefault(self._partition(h), []).append(h)
+
+        found = set()
+
+        for partition, keys in by_partition.items():
+            for batch in _chunked(keys, 500):
+                query = 'SELECT h FROM p{0} WHERE h IN ({1})'.format(partition, ','.join('?' * len(batch)))
+                found.update(row[0] for row in self.db.execute(query, batch))
+
+        return found
+
+    def _spill(self):
+
+        if self.db is None:
+            self.tmpdir = tempfile.mkdtemp(prefix='bigeo_hashes_')
+            # Pipeline stages are never closed, so the partitions are also removed with the set.
+            self.cleanup = weakref.finalize(self, shutil.rmtree, self.tmpdir, True)
+            self.db = sqlite3.connect(os.path.join(self.tmpdir, 'hashes.sqlite'))
+            self.db.execute('PRAGMA journal_mode=OFF')
+            self.db.execute('PRAGMA synchronous=OFF')
+            for partition in range(self.partitions):
+                self.db.execute('CREATE TABLE p{0} (h BLOB PRIMARY KEY) WITHOUT ROWID'.format(partition))
+
+        logging.info("Spilling %s hashes to disk: %s", len(self.memory), self.tmpdir)
+
+        by_partition = {}
+        for h in self.memory:
+            by_partition.setdefault(self._partition(h), []).append((h,))
+
+        with self.db:
+            for partition, rows in by_partition.items():
+                self.db.executemany('INSERT OR IGNORE INTO p{0} VALUES (?)'.format(partition), rows)
+
+        self.memory = set()
+
+    def close(self):
+
+        if self.db is not None:
+            self.db.close()
+            self.cleanup()
+            self.db = None
+
+def _overlappingPairs(geoms, index=None, fids=None):
+    """
+    Pairs (left, right) of geometries, left < right, whose interiors intersect. index is the SpatialIndex of \
+    the layer geoms were read from, if any, fids the feature ids of geoms when they are not all the features.
+    """
+
+    import numpy as np
+    import shapely
+
+    if index is not None:
+        left, right = index.queryBulk(shapely.bounds(geoms))
+
+        if fids is not None:
+            # Feature ids to positions in geoms, dropping the features that were filtered out.
+            positions = np.minimum(np.searchsorted(fids, right), max(len(fids) - 1, 0))
+            read = fids[positions] == right if len(fids) else np.zeros(len(right), dtype=bool)
+            left, right = left[read], positions[read]
+    else:
+        tree = shapely.STRtree(geoms)
+        left, right = tree.query(geoms, predicate='intersects')
+
+    keep = left < right
+    left, right = left[keep], right[keep]
+
+    # Interiors intersect: touching polygons are not overlaps.
+    keep = shapely.relate_pattern(geoms[left], geoms[right], 'T********')
+
+    return left[keep], right[keep]
+
+def _resolveOverlapTiles(geoms, losers, winners, tiles=1, workers=1):
+    """
+    Cuts the winning polygons out of the losing ones, tile by tile. Yields (indices, new geometries).
+    """
+
+    import numpy as np
+    import shapely
+
+    if not len(losers):
+        return
+
+    order = np.argsort(losers, kind='stable')
+    losers, winners = losers[order], winners[order]
+
+    indices, starts = np.unique(losers, return_index=True)
+    groups = np.split(winners, starts[1:])
+
+    # Each losing polygon belongs to the tile holding the center of its bounding box.
+    bounds = shapely.bounds(geoms[indices])
+    extent = shapely.bounds(geoms)
+    minx, miny = np.nanmin(extent[:, 0]), np.nanmin(extent[:, 1])
+    width = max(np.nanmax(extent[:, 2]) - minx, 1e-12)
+    height = max(np.nanmax(extent[:, 3]) - miny, 1e-12)
+
+    tx = np.clip(((bounds[:, 0] + bounds[:, 2]) / 2 - minx) / width * tiles, 0, tiles - 1).astype(np.int64)
+    ty = np.clip(((bounds[:, 1] + bounds[:, 3]) / 2 - miny) / height * tiles, 0, tiles - 1).astype(np.int64)
+    tile_of = ty * tiles + tx
+
+    jobs = []
+    for tile in np.unique(tile_of):
+        members = np.flatnonzero(tile_of == tile)
+        jobs.append((indices[members], [groups[m] for m in members]))
+
+    if workers > 1 and len(jobs) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [(job[0], pool.submit(_cutOverlaps, shapely.to_wkb(geoms[job[0]]), \
+                [shapely.to_wkb(geoms[group]) for group in job[1]])) for job in jobs]
+            for tile_indices, future in futures:
+                yield tile_indices, shapely.from_wkb(future.result())
+    else:
+        for tile_indices, tile_groups in jobs:
+            yield tile_indices, _cutOverlaps(geoms[tile_indices], [geoms[group] for group in tile_groups])
+
+def _cutOverlaps(losers, winners):
+    """ Each loser minus the union of its winners. Takes and returns WKB when run in a worker process. """
+
+    import numpy as np
+    import shapely
+
+    wkb = len(losers) and isinstance(losers[0], bytes)
+
+    if wkb:
+        losers = shapely.from_wkb(losers)
+        winners = [shapely.from_wkb(group) for group in winners]
+
+    unions = np.empty(len(winners), dtype=object)
+    unions[:] = [shapely.union_all(group) for group in winners]
+
+    result = shapely.difference(losers, unions)
+
+    return shapely.to_wkb(result) if wkb else result
+
+def _bufferDistances(chunk, distance=None, field=None):
+
+    import numpy as np
+
+    if field is not None:
+        return np.array([value if value is not None else np.nan for value in chunk.field(field)], dtype=float)
+
+    return np.full(len(chunk), float(distance))
+
+def _bufferGeoms(geoms, distances, resolution=16):
+    """ Buffers an array of geometries. Takes and returns WKB when run in a worker process. """
+
+    import shapely
+
+    wkb = len(geoms) and isinstance(geoms[0], bytes)
+
+    if wkb:
+        geoms = shapely.from_wkb(geoms)
+
+    result = shapely.buffer(geoms, distances, quad_segs=resolution)
+
+    return shapely.to_wkb(result) if wkb else result
+
+def _bufferChunks(chunks, distance=None, field=None, resolution=16, workers=1):
+    """ Yields the chunks with buffered geometries. """
+
+    import shapely
+
+    if workers <= 1:
+        for chunk in chunks:
+            yield chunk.withGeoms(_bufferGeoms(chunk.geoms, _bufferDistances(chunk, distance, field), resolution))
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+
+        def submit(chunk):
+            return pool.submit(_bufferGeoms, shapely.to_wkb(chunk.geoms), _bufferDistances(chunk, distance, field), \
+                resolution)
+
+        for chunk, result in _mapBounded(submit, chunks, workers * 2):
+            yield chunk.withGeoms(shapely.from_wkb(result))
+
+def _mapBounded(submit, items, max_pending):
+    """
+    Yields (item, result) in order for each future returned by submit(item). At most max_pending
+    futures are in flight, so the items are not all read in memory ahead of the workers.
+    """
+
+    pending = collections.deque()
+
+    for item in items:
+
+        pending.append((item, submit(item)))
+
+        if len(pending) >= max_pending:
+            item, future = pending.popleft()
+            yield item, future.result()
+
+    while pending:
+        item, future = pending.popleft()
+        yield item, future.result()
+
+class _Dissolver():
+    """ Unions geometries a chunk at a time, merging the partial unions when they exceed max_vertices. """
+
+    def __init__(self, max_vertices=5000000):
+
+        self.max_vertices = max_vertices
+        self.partials = []
+        self.vertices = 0
+
+    def add(self, geoms):
+
+        import shapely
+
+        partial = shapely.union_all(geoms)
+
+        self.partials.append(partial)
+        self.vertices += shapely.get_num_coordinates(partial)
+
+        if self.vertices > self.max_vertices and len(self.partials) > 1:
+            self._merge()
+
+    def _merge(self):
+
+        import shapely
+
+        merged = shapely.union_all(self.partials)
+
+        self.partials = [merged]
+        self.vertices = shapely.get_num_coordinates(merged)
+
+    def result(self):
+
+        if len(self.partials) != 1:
+            self._merge()
+
+        return self.partials[0]
+
+def _bufferStage(meta, distance):
+
+    import shapely
+
+    try:
+        distance, field = float(distance), None
+    except ValueError:
+        distance, field = None, distance
+
+    return _withGeometryType(meta, 'Polygon'), \
+        lambda chunk: chunk.withGeoms(shapely.buffer(chunk.geoms, _bufferDistances(chunk, distance, field)))
+
+def _clearlyValid(geoms):
+    """
+    Cheap pre-check of the geometries that are valid by construction: finite points and multipoints,
+    lines with a length and polygons without holes whose ring is strictly convex. Everything else needs
+    a full validity check.
+    """
+
+    import numpy as np
+    import shapely
+
+    coords, index = shapely.get_coordinates(geoms, return_index=True)
+    finite = np.bincount(index, weights=~np.isfinite(coords).all(axis=1), minlength=len(geoms)) == 0
+
+    type_id = shapely.get_type_id(geoms)
+
+    points = np.isin(type_id, (0, 4))
+    lines = (type_id == 1) & (shapely.length(geoms) > 0)
+
+    polygons = np.flatnonzero((type_id == 3) & (shapely.get_num_interior_rings(geoms) == 0))
+    convex = np.zeros(len(geoms), dtype=bool)
+    convex[polygons] = _strictlyConvex(shapely.get_exterior_ring(geoms[polygons]))
+
+    return finite & (points | lines | convex)
+
+def _strictlyConvex(rings):
+    """
+    True for the closed rings that turn the same way, never straight, at each vertex and go round once. \
+    Such a ring cannot touch or cross itself, so its polygon is valid.
+    """
+
+    import numpy as np
+    import shapely
+
+    # The closing coordinate repeats the first one.
+    counts = shapely.get_num_coordinates(rings) - 1
+    coords, index = shapely.get_coordinates(rings, return_index=True)
+    starts = np.cumsum(counts + 1) - counts - 1
+    keep = np.ones(len(coords), dtype=bool)
+    keep[(starts + counts)[counts >= 0]] = False
+    vertices, index = coords[keep], index[keep]
+
+    # Positions of the previous and the next vertex of each vertex in its own ring.
+    first = np.cumsum(np.maximum(counts, 0)) - np.maximum(counts, 0)
+    position = np.arange(len(vertices)) - first[index]
+    previous = first[index] + (position - 1) % np.maximum(counts[index], 1)
+    following = first[index] + (position + 1) % np.maximum(counts[index], 1)
+
+    incoming = vertices - vertices[previous]
+    outgoing = vertices[following] - vertices
+    cross = incoming[:, 0] * outgoing[:, 1] - incoming[:, 1] * outgoing[:, 0]
+    turn = np.arctan2(cross, (incoming * outgoing).sum(axis=1))
+
+    left = np.bincount(index, weights=cross > 0, minlength=len(rings))
+    right = np.bincount(index, weights=cross < 0, minlength=len(rings))
+    # A star turns the same way at each vertex but goes round twice or more.
+    winding = np.abs(np.bincount(index, weights=turn, minlength=len(rings)))
+
+    return (counts >= 3) & ((left == counts) | (right == counts)) & (winding < 3 * np.pi)
+
+def _validateGeoms(geoms, method='make_valid'):
+    """
+    Finds and repairs the invalid geometries of an array.
+
+    Returns (indices of the invalid geometries, reasons, repaired geometries). Repaired geometries are None
+    if method is 'remove' or the repair left nothing of the original dimension. Takes and returns WKB
+    when run in a worker process.
+    """
+
+    import numpy as np
+    import shapely
+
+    wkb = len(geoms) and isinstance(geoms[0], bytes)
+
+    if wkb:
+        geoms = shapely.from_wkb(geoms)
+
+    present = ~(shapely.is_missing(geoms) | shapely.is_empty(geoms))
+    check = np.flatnonzero(present & ~_clearlyValid(geoms))
+    invalid = check[~shapely.is_valid(geoms[check])]
+
+    reasons = shapely.is_valid_reason(geoms[invalid]).tolist()
+    repaired = _repairGeoms(geoms[invalid], method)
+
+    return invalid, reasons, shapely.to_wkb(repaired) if wkb else repaired
+
+def _repairGeoms(geoms, method='make_valid'):
+
+    import numpy as np
+    import shapely
+
+    repaired = np.empty(len(geoms), dtype=object)
+
+    if method == 'remove' or not len(geoms):
+        return repaired
+
+    if method == 'buffer':
+        repaired[:] = shapely.buffer(geoms, 0)
+    else:
+        repaired[:] = shapely.make_valid(geoms)
+
+    # make_valid may return collections with collapsed parts, keep the parts of the original dimension.
+    dimensions = shapely.get_dimensions(geoms)
+    mixed = (shapely.get_type_id(repaired) == 7) | (shapely.get_dimensions(repaired) != dimensions)
+
+    for i in np.flatnonzero(mixed).tolist():
+        parts = shapely.get_parts(repaired[i])
+        parts = parts[shapely.get_dimensions(parts) == dimensions[i]]
+        repaired[i] = shapely.union_all(parts) if len(parts) else None
+
+    repaired[shapely.is_empty(repaired)] = None
+
+    return repaired
+
+def _validateChunks(chunks, method='make_valid', workers=1):
+    """ Yields (chunk, (invalid indices, reasons, repaired geometries)). """
+
+    import shapely
+
+    if workers <= 1:
+        for chunk in chunks:
+            yield chunk, _validateGeoms(chunk.geoms, method)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+
+        def submit(chunk):
+            return pool.submit(_validateGeoms, shapely.to_wkb(chunk.geoms), method)
+
+        for chunk, (invalid, reasons, repaired) in _mapBounded(submit, chunks, workers * 2):
+            yield chunk, (invalid, reasons, shapely.from_wkb(repaired))
+
+def _repairStage(meta, method='make_valid'):
+
+    import numpy as np
+    import shapely
+
+    def repair(chunk):
+        invalid, reasons, repaired = _validateGeoms(chunk.geoms, method)
+        geoms = chunk.geoms.copy()
+        geoms[invalid] = repaired
+        return chunk.withGeoms(geoms).take(np.flatnonzero(~shapely.is_missing(geoms) | shapely.is_missing(chunk.geoms)))
+
+    return meta, repair
+
+_SINGLEPART_TYPES = {'MultiPoint': 'Point', 'MultiLineString': 'LineString', 'MultiPolygon': 'Polygon'}
+
+def _explodeMeta(meta, partfield=None):
+
+    geometry = meta['schema']['geometry']
+    meta = _withGeometryType(meta, _SINGLEPART_TYPES.get(geometry, geometry))
+
+    if partfield:
+        meta['schema']['properties'] = dict(meta['schema']['properties'], **{partfield: 'int'})
+
+    return meta
+
+def _partIndex(geoms):
+    """ The feature and the part number of each part of geoms. A feature without parts has one, with no geometry. """
+
+    import numpy as np
+    import shapely
+
+    counts = np.maximum(shapely.get_num_geometries(geoms), 1)
+    index = np.repeat(np.arange(len(geoms)), counts)
+
+    return index, np.arange(len(index)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+def _explodeChunk(chunk, partfield=None, index=None, part=None):
+    """
+    One feature per part, or only the parts of _partIndex at index and part. Parts share the properties object \
+    of their feature, partfield is a column.
+    """
+
+    import shapely
+
+    if index is None:
+        index, part = _partIndex(chunk.geoms)
+
+    # Parts are taken one by one, so a slice of the index only converts its own parts.
+    parts = shapely.get_geometry(chunk.geoms[index], part)
+
+    props = chunk.props
+    fids = chunk.fids[index] if chunk.fids is not None else None
+
+    if not isinstance(props, list):
+        props = props.take(index)
+        if partfield:
+            props = props.append_column(partfield, _arrowArray(part))
+        return _Chunk(parts, props, fids)
+
+    columns = dict((name, values[index]) for name, values in chunk.columns.items()) if chunk.columns else {}
+
+    # The part numbers are a column, the parts share the properties dict of their feature.
+    if partfield:
+        columns[partfield] = part
+
+    return _Chunk(parts, [props[feature] for feature in index.tolist()], fids, columns or None)
+
+def _arrowArray(values):
+
+    import pyarrow as pa
+
+    return pa.array(values)
+
+def _explodeStage(meta, partfield=None):
+
+    return _explodeMeta(meta, partfield), lambda chunk: _explodeChunk(chunk, partfield)
+
+# Pipeline stages by name. A stage is called with the meta of its input and its arguments and returns
+# the meta of its output with a function mapping an input _Chunk to an output _Chunk.
+PIPELINE_STAGES = {
+    'reproject': _reprojectStage,
+    'setcrs': _crsStage,
+    'bbox': _geometryStage(_deriveBbox, 'Polygon'),
+    'centroids': _geometryStage(_deriveCentroids, 'Point'),
+    'representativepoint': _geometryStage(_deriveRepresentativePoints, 'Point'),
+    'snap': _snapStage,
+    'dedup': _duplicatesStage,
+    'buffer': _bufferStage,
+    'repair': _repairStage,
+    'explode': _explodeStage,
+    'join': _joinStage,
+}
+
+# Stages whose output depends on the other features. Pipelines with them do not run in partitions or incrementally.
+_WHOLE_LAYER_STAGES = {'dedup'}
+
+def parsePipelineSpec(spec):
+    """
+    Parses a pipeline spec into a list of (stage name, arguments).
+
+    Stages are separated by ';'. Arguments follow the stage name after ':' and are separated by ','.
+
+    PARAMETER(S)
+
+    : spec : Pipeline spec. (ex. 'reproject:EPSG:3857;centroids')
+
+    RETURN(S)
+
+    : stages :  List of (name, args) tuples.
+
+    """
+
+    stages = []
+
+    for step in spec.split(';'):
+
+        step = step.strip()
+
+        if not step:
+            continue
+
+        name, _, rest = step.partition(':')
+        stages.append((name.strip().lower(), tuple(rest.split(',')) if rest else ()))
+
+    return stages
+
+####################### END SECTION FOR BATCH ENGINE ##########################
+
+#################### BEGIN SECTION FOR RUNNING PROCESSING FUNCTIONS ###################
+
+def _fieldsArg(args):
+
+    return args.fields.split(',') if args.fields else None
+
+def _filterArgs(args):
+
+    return {'bbox': args.bbox, 'mask': args.mask}
+
+def _queueArgs(args):
+
+    return {'read_queue': args.read_queue, 'write_queue': args.write_queue}
+
+def _partitionArgs(args):
+
+    return {'workers': args.workers, 'partition': args.partition, 'keep_order': not args.unordered, \
+        'incremental': args.incremental}
+
+def __run_reprojection(args, metrics):
+
+    logging.info("Running reprojection algorithm.")
+
+    projector = Reprojector()
+
+    projector.reproject(args.indir, args.outdir, args.crs, transform=args.transform, workers=args.workers, \
+        chunksize=args.chunksize, fields=_fieldsArg(args), metrics=metrics, incremental=args.incremental, **_filterArgs(args), \
+        **_queueArgs(args))
+
+def __run_boundingbox(args, metrics):
+
+    logging.info("Running bounding box algorithm.")
+
+    bb = BoundingBoxCreator()
+
+    bb.getBbox(args.srcfile, args.outfile, chunksize=args.chunksize, fields=_fieldsArg(args), metrics=metrics, \
+        **_filterArgs(args), **_partitionArgs(args), **_queueArgs(args))
+
+def __run_centroids(args, metrics):
+
+    logging.info("Running centroids algorithm.")
+
+    cc = CentroidCreator()
+
+    cc.getCentroids(args.srcfile, args.outfile, chunksize=args.chunksize, fields=_fieldsArg(args), metrics=metrics, \
+        **_filterArgs(args), **_partitionArgs(args), **_queueArgs(args))
+
+def __run_representativepoint(args, metrics):
+
+    logging.info("Running representative point algorithm.")
+
+    rp = RepresentativePointCreator()
+
+    rp.getRepresentativePoint(args.srcfile, args.outfile, chunksize=args.chunksize, fields=_fieldsArg(args), metrics=metrics, \
+        **_filterArgs(args), **_partitionArgs(args), **_queueArgs(args))
+
+def __run_multioutput(args, metrics):
+
+    logging.info("Running multi output algorithm.")
+
+    mo = MultiOutputCreator()
+
+    mo.getOutputs(args.srcfile, {'bbox': args.bbox_outfile, 'centroids': args.centroids_outfile, \
+        'representativepoint': args.representativepoint_outfile}, chunksize=args.chunksize, fields=_fieldsArg(args), \
+        metrics=metrics, **_filterArgs(args))
+
+def __run_openweather(args, metrics):
+
+    logging.info("Running openweather algorithm.")
+
+    ow = OpenWeather()
+
+    ow.getWeather(args.path_ids_file, args.ow_api, args.outfile, concurrency=args.concurrency, \
+        cache_dir=args.cache_dir, ttl=args.ttl, url=args.ow_url, metrics=metrics)
+
+def __run_snaplinetopoints(args, metrics):
+
+    logging.info("Running snap line to points algorithm.")
+
+    snapper = SnapLineToPoints()
+
+    snapper.snapLineToPoints(args.pointfile, args.srcfile, args.outdir, \
+        tolerance=args.tolerance if args.tolerance is not None else 1.0, \
+        endpoints_only=args.endpoints_only, chunksize=args.chunksize, metrics=metrics, \
+        spatial_index=args.spatial_index or None, **_filterArgs(args))
+
+def __run_spatialjoin(args, metrics):
+
+    logging.info("Running spatial join algorithm.")
+
+    joiner = SpatialJoiner()
+
+    joiner.join(args.srcfile, args.polygonfile, args.outfile, \
+        polygon_fields=args.join_fields.split(',') if args.join_fields else None, how=args.how, prefix=args.prefix, \
+        predicate=args.predicate, chunksize=args.chunksize, fields=_fieldsArg(args), workers=args.workers, \
+        metrics=metrics, **_filterArgs(args))
+
+def __run_duplicatesremover(args, metrics):
+
+    logging.info("Running duplicates remover algorithm.")
+
+    dr = DuplicatesRemover()
+
+    dr.removeDuplicates(args.srcfile, args.outfile, tolerance=args.tolerance, \
+        fields=args.match_fields.split(',') if args.match_fields else None, \
+        memory_limit=args.memory_limit, chunksize=args.chunksize, metrics=metrics, **_filterArgs(args))
+
+def __run_overlapsremover(args, metrics):
+
+    logging.info("Running polygon overlaps remover algorithm.")
+
+    por = PolygonOverlapsRemover()
+
+    stats = por.removeOverlaps(args.srcfile, args.outfile, rule=args.rule, tiles=args.tiles, workers=args.workers, \
+        chunksize=args.chunksize, metrics=metrics, spatial_index=args.spatial_index or None, \
+        **_filterArgs(args))
+
+    logging.info("Timings: " + json.dumps(stats['timings']))
+
+def __run_buffer(args, metrics):
+
+    logging.info("Running buffer algorithm.")
+
+    bc = BufferCreator()
+
+    bc.getBuffer(args.srcfile, args.outfile, distance=args.distance, field=args.distance_field, \
+        dissolve=args.dissolve, workers=args.workers, chunksize=args.chunksize, metrics=metrics, **_filterArgs(args))
+
+def __run_invalidgeomremover(args, metrics):
+
+    logging.info("Running invalid geometry remover algorithm.")
+
+    igr = InvalidGeomRemover()
+
+    igr.removeInvalid(args.srcfile, args.outfile, reportfile=args.report, method=args.repair_method, \
+        workers=args.workers, chunksize=args.chunksize, metrics=metrics, **_filterArgs(args))
+
+def __run_multiparttosinglepart(args, metrics):
+
+    logging.info("Running multipart to singlepart algorithm.")
+
+    mts = MultipartToSinglepart()
+
+    mts.explode(args.srcfile, args.outfile, partfield=args.partfield, chunksize=args.chunksize, metrics=metrics, \
+        **_filterArgs(args))
+
+def __run_fieldtyperemover(args, metrics):
+
+    logging.info("Running field type remover algorithm.")
+
+    ftr = FieldTypeRemover()
+
+    ftr.removeFieldTypes(args.srcfile, args.outfile, types=(args.drop_types or 'date').split(','), \
+        chunksize=args.chunksize, metrics=metrics, **_filterArgs(args))
+
+def __run_spatialindex(args, metrics):
+
+    logging.info("Running spatial index algorithm.")
+
+    SpatialIndex.build(args.srcfile)
+
+def __run_pipeline(args, metrics):
+
+    logging.info("Running pipeline: " + args.steps)
+
+    pipeline = Pipeline(args.srcfile, args.chunksize, fields=_fieldsArg(args), \
+        drop_types=args.drop_types.split(',') if args.drop_types else None, metrics=metrics, **_filterArgs(args), \
+        **_queueArgs(args))
+
+    for name, stage_args in parsePipelineSpec(args.steps):
+        pipeline.add(name, *stage_args)
+
+    pipeline.run(args.outfile, **_partitionArgs(args))
+
+def __run_catalog(args, metrics):
+
+    logging.info("Running catalog algorithm.")
+
+    Catalog(args.catalog).scan(args.indir, workers=args.workers)
+
+def __run_daemon(args, metrics):
+
+    logging.info("Running daemon algorithm.")
+
+    Daemon(workers=args.workers, cache_size=args.cache_size).serve(args.port, args.socket)
+
+
+
+#################### END SECTION FOR RUNNING PROCESSING FUNCTIONS #####################
+
+
+#################### BEGIN MAIN #####################
+
+
+def main(algo, args=None, metrics=None):
+    """ Runs algo with the parsed command line arguments args. metrics collects the counters and timers of the run. """
+
+    if args is None:
+        args = _argumentParser().parse_args([algo])
+
+    if metrics is None:
+        metrics = Metrics(progress_interval=args.progress)
+
+    if args.catalog and algo != 'catalog':
+        useCatalog(args.catalog)
+
+    if algo == 'reprojector':
+        __run_reprojection(args, metrics)
+
+    elif algo == 'boundingbox':
+        __run_boundingbox(args, metrics)
+
+    elif algo == 'centroids':
+        __run_centroids(args, metrics)
+
+    elif algo == 'representativepoint':
+        __run_representativepoint(args, metrics)
+
+    elif algo == 'multioutput':
+        __run_multioutput(args, metrics)
+
+    elif algo == 'openweather':
+        __run_openweather(args, metrics)
+
+    elif algo == 'snaplinetopoints':
+        __run_snaplinetopoints(args, metrics)
+
+    elif algo == 'spatialjoin':
+        __run_spatialjoin(args, metrics)
+
+    elif algo == 'duplicatesremover':
+        __run_duplicatesremover(args, metrics)
+
+    elif algo == 'overlapsremover':
+        __run_overlapsremover(args, metrics)
+
+    elif algo == 'buffer':
+        __run_buffer(args, metrics)
+
+    elif algo == 'invalidgeomremover':
+        __run_invalidgeomremover(args, metrics)
+
+    elif algo == 'multiparttosinglepart':
+        __run_multiparttosinglepart(args, metrics)
+
+    elif algo == 'fieldtyperemover':
+        __run_fieldtyperemover(args, metrics)
+
+    elif algo == 'pipeline':
+        __run_pipeline(args, metrics)
+
+    elif algo == 'spatialindex':
+        __run_spatialindex(args, metrics)
+
+    elif algo == 'catalog':
+        __run_catalog(args, metrics)
+
+    elif algo == 'daemon':
+        __run_daemon(args, metrics)
+
+    else:
+        logging.error('Unkown algorithm: ' + algo)
+
+def _argumentParser():
+    """ The parser of the command line arguments, also used to make the arguments of daemon jobs. """
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("algo_processor", help="The processing algorithm to use.")
+
+    parser.add_argument("--indir", help="Directory of shapefiles to reproject.")
+
+    parser.add_argument("--outdir", help="Directory to store the reprojected shapefiles.")
+
+    parser.add_argument("--crs", help="CRS string to use. See fiona documentation for crs available")
+
+    parser.add_argument("--transform", action="store_true", help="Transform the coordinates to --crs, not only the crs of the header.")
+
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes to use.")
+
+    parser.add_argument("--partition", default="range", help="Partitions run by the --workers: range or tile.")
+
+    parser.add_argument("--unordered", action="store_true", help="Merge tile partitions without restoring the source order.")
+
+    parser.add_argument("--incremental", action="store_true", help="Only recompute the features changed since the last --incremental run.")
+
+    parser.add_argument("--srcfile", help="Source shapefile.")
+
+    parser.add_argument("--outfile", help="Output shapefile.")
+
+    parser.add_argument("--bbox_outfile", help="Bounding box output of multioutput.")
+
+    parser.add_argument("--centroids_outfile", help="Centroids output of multioutput.")
+
+    parser.add_argument("--representativepoint_outfile", help="Representative points output of multioutput.")
+
+    parser.add_argument("--chunksize", type=int, default=10000, help="Number of features processed at a time.")
+
+    parser.add_argument("--pointfile", help="Point shapefile to snap to.")
+
+    parser.add_argument("--tolerance", type=float, help="Snapping (default 1.0) or duplicate matching tolerance in crs units.")
+
+    parser.add_argument("--polygonfile", help="Polygon layer whose fields are joined to the points of --srcfile.")
+
+    parser.add_argument("--join_fields", help="Comma separated polygon fields to join. All fields by default.")
+
+    parser.add_argument("--how", default="inner", help="Spatial join: inner (points in a polygon) or left (all points).")
+
+    parser.add_argument("--prefix", default="", help="Prefix of the names of the joined fields.")
+
+    parser.add_argument("--predicate", default="within", help="Spatial join predicate: within or intersects.")
+
+    parser.add_argument("--endpoints_only", action="store_true", help="Snap only the first and last vertex of the lines.")
+
+    parser.add_argument("--match_fields", help="Comma separated fields that must also match for duplicates.")
+
+    parser.add_argument("--memory_limit", type=int, default=256, help="Memory in MB before spilling to disk.")
+
+    parser.add_argument("--rule", default="first", help="Overlap rule: first or largest.")
+
+    parser.add_argument("--tiles", type=int, default=1, help="Number of tiles per side the extent is split in.")
+
+    parser.add_argument("--distance", type=float, help="Buffer distance in crs units.")
+
+    parser.add_argument("--distance_field", help="Field holding the buffer distance of each feature.")
+
+    parser.add_argument("--dissolve", action="store_true", help="Dissolve the buffers into a single feature.")
+
+    parser.add_argument("--repair_method", default="make_valid", help="Repair of invalid geometries: make_valid, buffer or remove.")
+
+    parser.add_argument("--report", help="CSV report of the invalid geometries.")
+
+    parser.add_argument("--partfield", help="Name of the part index field added to singlepart features.")
+
+    parser.add_argument("--fields", help="Comma separated fields to keep. Other fields are never read.")
+
+    parser.add_argument("--drop_types", help="Comma separated field types to remove. (ex. date,datetime)")
+
+    parser.add_argument("--steps", help="Pipeline spec. Stages separated by ';', arguments after ':'. (ex. 'reproject:EPSG:3857;centroids')")
+
+    parser.add_argument("--path_ids_file", help="Open weather city ids text file.")
+
+    parser.add_argument("--ow_api", help="Your open weather API key.")
+
+    parser.add_argument("--ow_url", default=OpenWeather.URL, help="Open weather group endpoint URL.")
+
+    parser.add_argument("--concurrency", type=int, default=4, help="Open weather requests in flight.")
+
+    parser.add_argument("--cache_dir", help="Directory of the open weather response cache.")
+
+    parser.add_argument("--ttl", type=int, default=600, help="Seconds cached open weather responses stay fresh.")
+
+    parser.add_argument("--bbox", help="Only process the features intersecting 'minx,miny,maxx,maxy', in the crs of the source.")
+
+    parser.add_argument("--mask", help="Only process the features intersecting this polygon layer or WKT geometry.")
+
+    parser.add_argument("--spatial_index", action="store_true", help="Build or refresh the spatial index sidecar of the indexed layer and use it.")
+
+    parser.add_argument("--metrics_json", "--metrics-json", dest="metrics_json", help="JSON file the run metrics are written to.")
+
+    parser.add_argument("--progress", type=float, help="Log progress at most every --progress seconds.")
+
+    parser.add_argument("--read_queue", type=int, default=0, help="Chunks a reader thread reads ahead of the computation. 0 reads in turn.")
+
+    parser.add_argument("--write_queue", type=int, default=0, help="Chunks a writer thread writes behind the computation. 0 writes in turn.")
+
+    parser.add_argument("--catalog", help="SQLite layer catalog to scan --indir into, or to read the layer metadata from.")
+
+    parser.add_argument("--port", type=int, default=8765, help="Local TCP port of the daemon HTTP API.")
+
+    parser.add_argument("--socket", help="Unix socket of the daemon HTTP API, instead of the --port.")
+
+    parser.add_argument("--cache_size", type=int, default=64, help="Recently opened layers cached by each daemon worker.")
+
+    return parser
+
+if __name__ == "__main__":
+
+    parser = _argumentParser()
+
+    args = parser.parse_args()
+
+    algo = args.algo_processor
+
+    metrics = Metrics(progress_interval=args.progress)
+    
+    main(algo, args, metrics)
+
+    if args.metrics_json:
+        metrics.dump(args.metrics_json)
 
 #################### END MAIN #####################
 
@@ -0,0 +1,59 @@
+"""
+Local stand-in for the open weather group endpoint, used by the tests and the startup benchmark.
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class StubOpenWeatherServer():
+    """ Local stand-in for the open weather group endpoint. Counts the requests and ids it served. """
+
+    def __init__(self, max_ids=20):
+
+        self.requests = 0
+        self.max_ids = max_ids
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+
+                query = parse_qs(urlparse(self.path).query)
+                ids = query['id'][0].split(',')
+                stub.requests += 1
+
+                if len(ids) > stub.max_ids:
+                    self.send_response(400)
+                    self.end_headers()
+                    return
+
+                cities = [{'name': 'city' + i, 'coord': {'lon': int(i) % 180, 'lat': int(i) % 90}, \
+                    'main': {'humidity': 80, 'pressure': 1010, 'temp': 30}, 'weather': [{'main': 'Rain'}], \
+                    'wind': {'deg': 90.0, 'speed': 2.5}} for i in ids]
+
+                body = json.dumps({'cnt': len(cities), 'list': cities}).encode('utf-8')
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{0}/data/2.5/group'.format(self.server.server_address[1])
+
+    def __enter__(self):
+
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+
+        self.server.shutdown()
+        self.server.server_close()
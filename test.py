@@ -1,11 +1,59 @@
 
 import bigeo
 import unittest
+import os
+import shutil
+import tempfile
+import json
+from openweather_stub import StubOpenWeatherServer
+
+import fiona
+import numpy
+from fiona.crs import CRS
+from shapely.geometry import Point, Polygon, LineString, MultiPoint, MultiPolygon, GeometryCollection, mapping, shape
+from shapely.ops import unary_union
 
 import logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s :    %(message)s')
 
 
+def writeShp(path, geometry_type, geoms, properties=None, crs=CRS.from_epsg(4326)):
+    """ Writes a small shapefile used as test data. properties is a list of dicts, one per geometry. """
+
+    if properties is None:
+        properties = [{'id': i} for i in range(len(geoms))]
+
+    schema = {'geometry': geometry_type, 'properties': {k: type(v).__name__ for k, v in properties[0].items()}}
+
+    with fiona.open(path, 'w', driver='ESRI Shapefile', crs=crs, schema=schema) as dst:
+        for g, p in zip(geoms, properties):
+            dst.write({'geometry': mapping(g) if g is not None else None, 'properties': p})
+
+def readShp(path):
+    """ Reads back a shapefile as a list of (shapely geometry, properties dict). """
+
+    with fiona.open(path) as src:
+        return [(shape(f['geometry']) if f['geometry'] else None, dict(f['properties'])) for f in src]
+
+def squares(n, size=1.0):
+    """ n unit squares placed next to each other along x. """
+
+    return [Polygon.from_bounds(i * 2 * size, 0, i * 2 * size + size, size) for i in range(n)]
+
+
+class BigeoTestCase(unittest.TestCase):
+    """ Test case with a temporary directory for test data. """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def path(self, *names):
+        return os.path.join(self.tmpdir, *names)
+
+
 # class Test_Reprojector(unittest.TestCase):    
     
 #     def test_reprojector(self):
@@ -69,16 +117,1099 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s :
 #         ow.getWeather('/home/dantex/Documents/DEVELOPMENTS/Test Data/openweather_id.txt', 'BLEH', "/home/dantex/Documents/DEVELOPMENTS/Test Data/output_weather/wx.shp")
 
 
-class Test_SnapLineToPoints(unittest.TestCase):
+class Test_ReprojectorTransform(BigeoTestCase):
+
+    def test_reproject_transform_workers(self):
+
+        os.mkdir(self.path('in'))
+        os.mkdir(self.path('out'))
+
+        for name in ('a.shp', 'b.shp'):
+            writeShp(self.path('in', name), 'Point', [Point(0, 0), Point(1, 1), Point(10, 20)])
+
+        projector = bigeo.Reprojector()
+
+        summary = projector.reproject(self.path('in'), self.path('out'), 'EPSG:3857', transform=True, workers=2)
+
+        self.assertEqual([os.path.basename(s['file']) for s in summary], ['a.shp', 'b.shp'])
+        self.assertEqual([s['features'] for s in summary], [3, 3])
+
+        features = readShp(self.path('out', 'b.shp'))
+
+        self.assertAlmostEqual(features[1][0].x, 111319.49, places=1)
+        self.assertEqual(features[2][1], {'id': 2})
+
+    def test_reproject_header_only(self):
+
+        os.mkdir(self.path('in'))
+        os.mkdir(self.path('out'))
+
+        writeShp(self.path('in', 'a.shp'), 'Point', [Point(1, 1)])
+
+        bigeo.Reprojector().reproject(self.path('in'), self.path('out'), 'EPSG:3857')
+
+        self.assertEqual(readShp(self.path('out', 'a.shp'))[0][0].x, 1)
+        self.assertEqual(bigeo.getCrs(self.path('out', 'a.shp')).to_epsg(), 3857)
+
+
+class Test_BatchCreators(BigeoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        polygons = squares(5) + [None, Polygon([(0, 0), (4, 0), (4, 1), (1, 1), (1, 4), (0, 4)])]
+        writeShp(self.path('polygon.shp'), 'Polygon', polygons)
+
+    def test_getBbox(self):
+
+        bigeo.BoundingBoxCreator().getBbox(self.path('polygon.shp'), self.path('bbox.shp'), chunksize=2)
+
+        features = readShp(self.path('bbox.shp'))
+
+        self.assertEqual(len(features), 7)
+        self.assertEqual(features[1][0].bounds, (2.0, 0.0, 3.0, 1.0))
+        self.assertIsNone(features[5][0])
+        self.assertEqual(features[6][0].area, 16)
+        self.assertEqual(features[6][1], {'id': 6})
+
+    def test_getCentroids(self):
+
+        bigeo.CentroidCreator().getCentroids(self.path('polygon.shp'), self.path('centroids.shp'), chunksize=3)
+
+        features = readShp(self.path('centroids.shp'))
+
+        self.assertEqual((features[2][0].x, features[2][0].y), (4.5, 0.5))
+        self.assertIsNone(features[5][0])
+
+    def test_getRepresentativePoint(self):
+
+        bigeo.RepresentativePointCreator().getRepresentativePoint(self.path('polygon.shp'), self.path('rp.shp'))
+
+        features = readShp(self.path('rp.shp'))
+
+        self.assertTrue(all(squares(5)[i].contains(features[i][0]) for i in range(5)))
+        self.assertTrue(Polygon([(0, 0), (4, 0), (4, 1), (1, 1), (1, 4), (0, 4)]).contains(features[6][0]))
+
+
+class Test_MappedShapefile(BigeoTestCase):
+
+    def test_bounds(self):
+
+        polygons = squares(3) + [None, MultiPolygon(squares(2))]
+        writeShp(self.path('polygon.shp'), 'Polygon', polygons)
+
+        mapped = bigeo._MappedShapefile.open(self.path('polygon.shp'))
+        bounds = mapped.bounds()
+
+        self.assertEqual(len(mapped), 5)
+        self.assertEqual(bounds[1].tolist(), [2.0, 0.0, 3.0, 1.0])
+        self.assertTrue(numpy.isnan(bounds[3]).all())
+        self.assertEqual(bounds[4].tolist(), [0.0, 0.0, 3.0, 1.0])
+        self.assertEqual(mapped.boxes(3, 5)[0], None)
+        self.assertIsNone(bigeo._MappedShapefile.open(self.path('polygon.dbf')))
+
+    def test_points(self):
+
+        writeShp(self.path('point.shp'), 'Point', [Point(i, -i) for i in range(4)])
+        writeShp(self.path('nulls.shp'), 'Point', [Point(1, 2), None, Point(3, 4)])
+
+        mapped = bigeo._MappedShapefile.open(self.path('point.shp'))
+        coords = mapped.coordinates(1, 3)
+
+        self.assertTrue(numpy.shares_memory(coords, mapped.shp))
+        self.assertEqual(coords.tolist(), [[1.0, -1.0], [2.0, -2.0]])
+
+        nulls = bigeo._MappedShapefile.open(self.path('nulls.shp')).points(0, 3)
+
+        self.assertEqual([None if g is None else (g.x, g.y) for g in nulls], [(1, 2), None, (3, 4)])
+
+        bigeo.CentroidCreator().getCentroids(self.path('nulls.shp'), self.path('centroids.shp'), fields=[])
+
+        features = readShp(self.path('centroids.shp'))
+
+        self.assertEqual(features[2][0].coords[0], (3, 4))
+        self.assertIsNone(features[1][0])
+
+    def test_points_z(self):
+
+        writeShp(self.path('pointz.shp'), '3D Point', [Point(i, -i, 10 * i) for i in range(4)])
+        writeShp(self.path('nullz.shp'), '3D Point', [Point(1, 2, 3), None, Point(4, 5, 6)])
+
+        mapped = bigeo._MappedShapefile.open(self.path('pointz.shp'))
+
+        self.assertTrue(mapped.isPoint())
+        self.assertFalse(mapped.isXYPoint())
+        self.assertEqual(mapped.coordinates(1, 3).tolist(), [[1.0, -1.0], [2.0, -2.0]])
+        self.assertEqual(bigeo._MappedShapefile.open(self.path('nullz.shp')).bounds()[2].tolist(), [4, 5, 4, 5])
+
+        bigeo.BoundingBoxCreator().getBbox(self.path('nullz.shp'), self.path('bbox.shp'))
+        bigeo.Pipeline(self.path('pointz.shp')).run(self.path('copy.shp'))
+
+        self.assertEqual(readShp(self.path('bbox.shp'))[2][0].bounds, (4, 5, 4, 5))
+        self.assertEqual(readShp(self.path('copy.shp'))[3][0].coords[0], (3, -3, 30))
+
+
+class Test_SpatialIndex(BigeoTestCase):
+
+    def test_queryBulk_and_invalidation(self):
+
+        polygons = squares(40) + [None, Polygon.from_bounds(0, 0, 80, 1)]
+        writeShp(self.path('polygon.shp'), 'Polygon', polygons)
+
+        self.assertFalse(bigeo.SpatialIndex.isFresh(self.path('polygon.shp')))
+
+        index = bigeo.SpatialIndex(self.path('polygon.shp'))
+
+        self.assertTrue(os.path.exists(self.path('polygon.bgx')))
+        self.assertEqual(len(index), 42)
+        self.assertEqual([ids.tolist() for ids in index.queryBulk([[4.5, 0.5, 6.5, 0.6], [100, 100, 101, 101]])], \
+            [[0, 0, 0], [2, 3, 41]])
+
+        writeShp(self.path('polygon.shp'), 'Polygon', squares(3))
+
+        self.assertFalse(bigeo.SpatialIndex.isFresh(self.path('polygon.shp')))
+        self.assertRaises(ValueError, bigeo.SpatialIndex, self.path('polygon.shp'), build=False)
+        self.assertEqual(len(bigeo.SpatialIndex(self.path('polygon.shp'))), 3)
+
+    def test_operations_use_sidecar(self):
+
+        writeShp(self.path('point.shp'), 'Point', [Point(0, 0), Point(10, 0), Point(5, 3)])
+        writeShp(self.path('line.shp'), 'LineString', [LineString([(0.2, 0.1), (5, 2.5), (9.5, 0)])])
+        writeShp(self.path('polygon.shp'), 'Polygon', [Polygon.from_bounds(0, 0, 2, 2), Polygon.from_bounds(1, 0, 5, 2)])
+        os.mkdir(self.path('outdir'))
+
+        snapper = bigeo.SnapLineToPoints()
+        outfile = snapper.snapLineToPoints(self.path('point.shp'), self.path('line.shp'), self.path('outdir'), \
+            spatial_index=True)
+
+        self.assertTrue(bigeo.SpatialIndex.isFresh(self.path('point.shp')))
+        self.assertEqual(list(readShp(outfile)[0][0].coords), [(0, 0), (5, 3), (10, 0)])
+
+        bigeo.SpatialIndex.build(self.path('polygon.shp'))
+        stats = bigeo.PolygonOverlapsRemover().removeOverlaps(self.path('polygon.shp'), self.path('clean.shp'))
+
+        self.assertEqual(stats['overlaps'], 1)
+        self.assertEqual(readShp(self.path('clean.shp'))[1][0].bounds, (2, 0, 5, 2))
+
+    def test_points_z(self):
+
+        writeShp(self.path('pointz.shp'), '3D Point', [Point(i, i, 5) for i in range(10)] + [None])
+
+        index = bigeo.SpatialIndex(self.path('pointz.shp'))
+
+        self.assertEqual(len(index), 11)
+        self.assertEqual(index.queryBulk([[2.5, 2.5, 4.5, 4.5]])[1].tolist(), [3, 4])
+
+        bigeo.CentroidCreator().getCentroids(self.path('pointz.shp'), self.path('tiles.shp'), bbox=(0, 0, 4, 4), \
+            workers=2, partition='tile')
+
+        self.assertEqual(len(readShp(self.path('tiles.shp'))), 5)
+
+
+class Test_SpatialFilter(BigeoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        writeShp(self.path('polygon.shp'), 'Polygon', squares(10) + [None])
+        writeShp(self.path('point.shp'), 'Point', [Point(i, i) for i in range(10)])
+
+    def centroids(self, srcfile, **kwargs):
+
+        bigeo.CentroidCreator().getCentroids(self.path(srcfile), self.path('centroids.shp'), chunksize=3, **kwargs)
+
+        return [p['id'] for g, p in readShp(self.path('centroids.shp'))]
+
+    def test_bbox_and_mask(self):
+
+        mask = 'POLYGON ((4 0, 9.5 0, 9.5 1, 4 1, 4 0))'
+
+        for build in (False, True):
+            if build:
+                bigeo.SpatialIndex.build(self.path('polygon.shp'))
+
+            self.assertEqual(self.centroids('polygon.shp', bbox=(3.5, 0.5, 8.5, 0.6)), [2, 3, 4])
+            self.assertEqual(self.centroids('polygon.shp', bbox='3.5,0.5,8.5,0.6', mask=mask), [2, 3, 4])
+            self.assertEqual(self.centroids('polygon.shp', mask=mask), [2, 3, 4])
+            self.assertEqual(self.centroids('polygon.shp', bbox=(100, 100, 101, 101)), [])
+
+        bigeo.BoundingBoxCreator().getBbox(self.path('polygon.shp'), self.path('bbox.shp'), bbox=(15, 0, 17, 1))
+
+        self.assertEqual([p['id'] for g, p in readShp(self.path('bbox.shp'))], [7, 8])
+
+        igr = bigeo.InvalidGeomRemover()
+        writeShp(self.path('invalid.shp'), 'Polygon', squares(4) + [Polygon([(0, 0), (2, 2), (2, 0), (0, 2)])])
+        igr.removeInvalid(self.path('invalid.shp'), self.path('valid.shp'), bbox=(5, 0, 6, 1))
+
+        with open(igr.reportfile) as f:
+            self.assertEqual(f.read().splitlines()[1:], [])
+
+        igr.removeInvalid(self.path('invalid.shp'), self.path('valid.shp'), bbox=(1, 0, 7, 1))
+
+        with open(igr.reportfile) as f:
+            self.assertEqual(f.read().splitlines()[1].split(',')[0], '4')
+
+    def test_points_and_columnar(self):
+
+        self.assertEqual(self.centroids('point.shp', bbox=(2.5, 2.5, 5, 5)), [3, 4, 5])
+
+        bigeo.SpatialIndex.build(self.path('point.shp'))
+
+        self.assertEqual(self.centroids('point.shp', mask=Polygon([(0, 0), (9, 0), (9, 9)])), list(range(10)))
+        self.assertEqual(self.centroids('point.shp', mask=self.path('polygon.shp')), [0, 1])
+
+        bigeo.Pipeline(self.path('polygon.shp'), 4).run(self.path('polygon.parquet'))
+
+        self.assertEqual(self.centroids('polygon.parquet', bbox=(13, 0.5, 17, 0.5)), [6, 7, 8])
+
+        bigeo.SpatialIndex.build(self.path('polygon.parquet'))
+
+        self.assertEqual(self.centroids('polygon.parquet', bbox=(13, 0.5, 17, 0.5)), [6, 7, 8])
+
+
+class Test_GeojsonConversion(unittest.TestCase):
+
+    def test_round_trip(self):
+
+        geoms = [Point(1, 2), Polygon([(0, 0), (4, 0), (4, 4), (0, 0)], [[(1, 0.5), (3, 0.5), (3, 2.5), (1, 0.5)]]), \
+            None, MultiPolygon(squares(2)), LineString([(0, 0, 1), (1, 1, 2)]), Point(3, 4), \
+            GeometryCollection([Point(0, 0), LineString([(0, 0), (1, 1)])])]
+
+        converted = bigeo._fromGeojson([mapping(g) if g is not None else None for g in geoms])
+
+        self.assertTrue(all(a is None and b is None or a.equals(b) for a, b in zip(converted, geoms)))
+        self.assertTrue(converted[4].has_z)
+
+        back = bigeo._toGeojson(converted)
+
+        self.assertIsNone(back[2])
+        self.assertTrue(all(g is None or shape(b).equals(g) for g, b in zip(geoms, back)))
+        self.assertEqual(back[0], {'type': 'Point', 'coordinates': [1.0, 2.0]})
+
+
+class Test_Pipeline(BigeoTestCase):
+
+    def test_pipeline_reproject_centroids(self):
+
+        writeShp(self.path('polygon.shp'), 'Polygon', squares(25))
+
+        count = bigeo.Pipeline(self.path('polygon.shp'), chunksize=4).reproject('EPSG:3857').centroids().run(self.path('out.shp'))
+
+        features = readShp(self.path('out.shp'))
+
+        self.assertEqual(count, 25)
+        self.assertEqual(bigeo.getSchema(self.path('out.shp'))['geometry'], 'Point')
+        self.assertEqual(bigeo.getCrs(self.path('out.shp')).to_epsg(), 3857)
+        self.assertAlmostEqual(features[0][0].x, 55659.75, places=1)
+        self.assertEqual(features[24][1], {'id': 24})
+
+    def test_parsePipelineSpec(self):
+
+        self.assertEqual(bigeo.parsePipelineSpec('reproject:EPSG:3857; centroids;'), \
+            [('reproject', ('EPSG:3857',)), ('centroids', ())])
+
+    def test_unknown_stage(self):
+
+        with self.assertRaises(ValueError):
+            bigeo.Pipeline(self.path('polygon.shp')).add('nope')
+
+
+class Test_SnapLineToPoints(BigeoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        writeShp(self.path('point.shp'), 'Point', [Point(0, 0), Point(10, 0), Point(5, 3)])
+        writeShp(self.path('unsnap_line.shp'), 'LineString', \
+            [LineString([(0.2, 0.1), (5, 2.5), (9.5, 0)]), LineString([(20, 20), (30, 30)])])
+        os.mkdir(self.path('outdir'))
 
     def test_snapLineToPoints(self):
 
         snapper = bigeo.SnapLineToPoints()
 
-        snapper.snapLineToPoints('/home/dantex/Documents/DEVELOPMENTS/Test Data/Basic Test Data/point.shp', \
-            '/home/dantex/Documents/DEVELOPMENTS/Test Data/Basic Test Data/unsnap_line.shp', \
-            '/home/dantex/Documents/DEVELOPMENTS/Test Data/Basic Test Data/outdir')
+        outfile = snapper.snapLineToPoints(self.path('point.shp'), self.path('unsnap_line.shp'), self.path('outdir'))
+
+        features = readShp(outfile)
+
+        self.assertEqual(list(features[0][0].coords), [(0, 0), (5, 3), (10, 0)])
+        self.assertEqual(list(features[1][0].coords), [(20, 20), (30, 30)])
+        self.assertEqual(snapper.snapped, 3)
+
+    def test_snapLineToPoints_endpoints_only(self):
+
+        snapper = bigeo.SnapLineToPoints()
+
+        outfile = snapper.snapLineToPoints(self.path('point.shp'), self.path('unsnap_line.shp'), self.path('outdir'), \
+            tolerance=0.6, endpoints_only=True)
+
+        self.assertEqual(list(readShp(outfile)[0][0].coords), [(0, 0), (5, 2.5), (10, 0)])
+
+    def test_snapLineToPoints_multipoints(self):
+
+        writeShp(self.path('multipoint.shp'), 'MultiPoint', [MultiPoint([(50, 50), (100, 100)]), MultiPoint([(0, 0)])])
+        writeShp(self.path('far_line.shp'), 'LineString', [LineString([(100.2, 100.2), (0.1, 0)])])
+
+        for spatial_index in (False, True):
+            outfile = bigeo.SnapLineToPoints().snapLineToPoints(self.path('multipoint.shp'), self.path('far_line.shp'), \
+                self.path('outdir'), spatial_index=spatial_index)
+            self.assertEqual(list(readShp(outfile)[0][0].coords), [(100, 100), (0, 0)])
+
+    def test_snapLineToPoints_overwrite(self):
+
+        with self.assertRaises(ValueError):
+            bigeo.SnapLineToPoints().snapLineToPoints(self.path('point.shp'), self.path('unsnap_line.shp'), self.tmpdir)
+
+        self.assertEqual(len(readShp(self.path('unsnap_line.shp'))), 2)
+
+
+class Test_SpatialJoiner(BigeoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        writeShp(self.path('regions.shp'), 'Polygon', squares(3, 2.0), [{'id': i, 'name': 'r%s' % i} for i in range(3)])
+        points = [Point(1, 1), Point(20, 1), Point(5, 1), Point(4, 2), Point(8.5, 0.5), Point(9, 1)]
+        writeShp(self.path('stations.shp'), 'Point', points, [{'id': i} for i in range(6)])
+
+    def test_join_inner_left(self):
+
+        joiner = bigeo.SpatialJoiner()
+        count = joiner.join(self.path('stations.shp'), self.path('regions.shp'), self.path('joined.shp'), \
+            polygon_fields=['name'], chunksize=2)
+
+        self.assertEqual(count, 4)
+        self.assertEqual([p for g, p in readShp(self.path('joined.shp'))], \
+            [{'id': 0, 'name': 'r0'}, {'id': 2, 'name': 'r1'}, {'id': 4, 'name': 'r2'}, {'id': 5, 'name': 'r2'}])
+
+        # (4, 2) is on the boundary of r1, only intersects matches it.
+        joiner.join(self.path('stations.shp'), self.path('regions.shp'), self.path('left.parquet'), how='left', \
+            prefix='reg_', predicate='intersects', workers=2)
+
+        with bigeo._openSource(self.path('left.parquet')) as src:
+            self.assertEqual([(f['properties']['id'], f['properties']['reg_name']) for f in src], \
+                [(0, 'r0'), (1, None), (2, 'r1'), (3, 'r1'), (4, 'r2'), (5, 'r2')])
+
+    def test_join_errors(self):
+
+        with self.assertRaises(ValueError):
+            bigeo.SpatialJoiner().join(self.path('stations.shp'), self.path('regions.shp'), self.path('out.shp'))
+
+        with self.assertRaises(ValueError):
+            bigeo.Pipeline(self.path('stations.shp')).join(self.path('regions.shp'), how='right', prefix='r_') \
+                .run(self.path('out.shp'))
+
+
+class Test_DuplicatesRemover(BigeoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        polygons = [Polygon([(0, 0), (1, 0), (1, 1)]), Polygon([(1, 1), (0, 0), (1, 0)]), \
+            Polygon([(0, 0), (1.001, 0), (1, 1)]), Point(5, 5).buffer(1), Point(5, 5).buffer(1)]
+        properties = [{'name': n} for n in ('a', 'b', 'a', 'c', 'c')]
+        writeShp(self.path('polygon.shp'), 'Polygon', polygons, properties)
+
+    def test_removeDuplicates_exact(self):
+
+        removed = bigeo.DuplicatesRemover().removeDuplicates(self.path('polygon.shp'), self.path('out.shp'))
+
+        self.assertEqual(removed, 2)
+        self.assertEqual([p['name'] for g, p in readShp(self.path('out.shp'))], ['a', 'a', 'c'])
+
+    def test_removeDuplicates_tolerance_fields(self):
+
+        removed = bigeo.DuplicatesRemover().removeDuplicates(self.path('polygon.shp'), self.path('out.shp'), \
+            tolerance=0.01, fields=['name'])
+
+        self.assertEqual(removed, 2)
+        self.assertEqual([p['name'] for g, p in readShp(self.path('out.shp'))], ['a', 'b', 'c'])
+
+    def test_spilling(self):
+
+        hashes = bigeo._SpillingHashSet(memory_limit=0.0001)
+
+        try:
+            first = hashes.addNew([bytes([i]) * 16 for i in range(50)])
+            second = hashes.addNew([bytes([i]) * 16 for i in range(40, 60)] * 2)
+        finally:
+            hashes.close()
+
+        self.assertEqual(first, list(range(50)))
+        self.assertEqual(second, list(range(10, 20)))
+
+
+class Test_PolygonOverlapsRemover(BigeoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        polygons = [Polygon.from_bounds(0, 0, 2, 2), Polygon.from_bounds(1, 0, 5, 2), Polygon.from_bounds(5, 0, 6, 2), \
+            Polygon.from_bounds(1.2, 0.5, 1.8, 1.5), Polygon.from_bounds(10, 10, 12, 12), Polygon.from_bounds(11, 11, 13, 13)]
+        writeShp(self.path('polygon.shp'), 'Polygon', polygons)
+
+    def test_removeOverlaps_first(self):
+
+        stats = bigeo.PolygonOverlapsRemover().removeOverlaps(self.path('polygon.shp'), self.path('out.shp'))
+
+        features = readShp(self.path('out.shp'))
+
+        self.assertEqual(stats['overlaps'], 4)
+        self.assertEqual(stats['dropped'], 1)
+        self.assertEqual([p['id'] for g, p in features], [0, 1, 2, 4, 5])
+        self.assertEqual(features[1][0].bounds, (2.0, 0.0, 5.0, 2.0))
+        self.assertEqual(features[4][0].area, 3)
+        self.assertEqual(set(stats['timings']), {'read', 'index', 'resolve', 'write'})
+
+    def test_removeOverlaps_largest_tiles_workers(self):
+
+        stats = bigeo.PolygonOverlapsRemover().removeOverlaps(self.path('polygon.shp'), self.path('out.shp'), \
+            rule='largest', tiles=4, workers=2)
+
+        features = readShp(self.path('out.shp'))
+
+        self.assertEqual(stats['overlaps'], 4)
+        self.assertEqual(features[0][0].area, 2)
+        self.assertEqual(features[1][0].area, 8)
+        total = sum(g.area for g, p in features)
+        self.assertAlmostEqual(total, unary_union([g for g, p in features]).area)
+
+
+class Test_BufferCreator(BigeoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        writeShp(self.path('point.shp'), 'Point', [Point(0, 0), Point(1, 0), Point(10, 0), None], \
+            [{'radius': r} for r in (1.0, 1.0, 2.0, 1.0)])
+
+    def test_getBuffer_distance(self):
+
+        count = bigeo.BufferCreator().getBuffer(self.path('point.shp'), self.path('out.shp'), distance=1, chunksize=2)
+
+        self.assertEqual(count, 4)
+
+        features = readShp(self.path('out.shp'))
+
+        self.assertEqual(len(features), 4)
+        self.assertAlmostEqual(features[2][0].area, 3.14, places=1)
+        self.assertEqual(features[2][1], {'radius': 2.0})
+        self.assertIsNone(features[3][0])
+
+    def test_getBuffer_field_dissolve_workers(self):
+
+        bigeo.BufferCreator().getBuffer(self.path('point.shp'), self.path('out.shp'), field='radius', dissolve=True, \
+            workers=2, chunksize=1, dissolve_limit=10)
+
+        features = readShp(self.path('out.shp'))
+
+        self.assertEqual(len(features), 1)
+        self.assertEqual(len(features[0][0].geoms), 2)
+        self.assertEqual(features[0][0].bounds, (-1.0, -2.0, 12.0, 2.0))
+
+        count = bigeo.BufferCreator().getBuffer(self.path('point.shp'), self.path('out.gpkg'), distance=1, \
+            dissolve=True, bbox=(-1, -1, 2, 1))
+
+        self.assertEqual(count, 1)
+        self.assertEqual(bigeo.getSchema(self.path('out.gpkg'))['geometry'], 'MultiPolygon')
+
+        with fiona.open(self.path('out.gpkg')) as src:
+            self.assertEqual(next(iter(src))['geometry']['type'], 'MultiPolygon')
+
+
+class Test_InvalidGeomRemover(BigeoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        polygons = [Polygon([(0, 0), (1, 0), (1, 1)]), Polygon([(0, 0), (1, 1), (1, 0), (0, 1)]), squares(1)[0], \
+            Polygon([(0, 0), (1, 1), (2, 2), (0, 0)]), None]
+        writeShp(self.path('polygon.shp'), 'Polygon', polygons)
+
+    def test_removeInvalid_make_valid(self):
+
+        igr = bigeo.InvalidGeomRemover()
+
+        stats = igr.removeInvalid(self.path('polygon.shp'), self.path('out.shp'), workers=2, chunksize=2)
+
+        features = readShp(self.path('out.shp'))
+
+        self.assertEqual(stats, {'features': 5, 'invalid': 2, 'repaired': 1, 'removed': 1})
+        self.assertEqual([p['id'] for g, p in features], [0, 1, 2, 4])
+        self.assertAlmostEqual(features[1][0].area, 0.5)
+
+        with open(self.path('out_invalid.csv')) as report:
+            rows = report.read().splitlines()
+
+        self.assertEqual(rows[0], 'fid,reason,repair')
+        self.assertTrue(rows[1].startswith('1,Self-intersection'))
+        self.assertTrue(rows[1].endswith(',make_valid'))
+        self.assertTrue(rows[2].startswith('3,'))
+        self.assertTrue(rows[2].endswith(',remove'))
+
+    def test_removeInvalid_remove(self):
+
+        stats = bigeo.InvalidGeomRemover().removeInvalid(self.path('polygon.shp'), self.path('out.shp'), method='remove')
+
+        self.assertEqual(stats['removed'], 2)
+        self.assertEqual([p['id'] for g, p in readShp(self.path('out.shp'))], [0, 2, 4])
+
+    def test_clearlyValid(self):
+
+        star = Polygon([(0, 0), (2, 6), (4, 0), (-1, 4), (5, 4)])
+        holed = Polygon([(0, 0), (4, 0), (4, 4), (0, 4)], [[(1, 1), (2, 1), (2, 2)]])
+        concave = Polygon([(0, 0), (2, 0), (1, 1), (2, 2), (0, 2)])
+        geoms = numpy.array(squares(2) + [Polygon([(0, 0), (1, 0), (1, 1)]), Polygon([(0, 0), (1, 1), (1, 0), (0, 1)]), \
+            star, holed, concave, Polygon(), None], dtype=object)
+
+        self.assertEqual(bigeo._clearlyValid(geoms).tolist(), [True, True, True, False, False, False, False, False, False])
+
+
+class Test_MultipartToSinglepart(BigeoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        multipolygons = [MultiPolygon(squares(3)), MultiPolygon(squares(1)), None]
+        writeShp(self.path('multipolygon.shp'), 'MultiPolygon', multipolygons, [{'name': n} for n in 'abc'])
+
+    def test_explode(self):
+
+        count = bigeo.MultipartToSinglepart().explode(self.path('multipolygon.shp'), self.path('out.shp'), \
+            partfield='part', chunksize=2)
+
+        features = readShp(self.path('out.shp'))
+
+        self.assertEqual(count, 5)
+        self.assertEqual([(p['name'], p['part']) for g, p in features], \
+            [('a', 0), ('a', 1), ('a', 2), ('b', 0), ('c', 0)])
+        self.assertEqual(features[2][0].bounds, (4.0, 0.0, 5.0, 1.0))
+        self.assertIsNone(features[4][0])
+        self.assertEqual(bigeo.getSchema(self.path('out.shp'))['geometry'], 'Polygon')
+
+    def test_explode_shares_properties(self):
+
+        chunk = bigeo._Chunk(numpy.array([MultiPolygon(squares(2))], dtype=object), [{'name': 'a'}])
+
+        parts = bigeo._explodeChunk(chunk)
+
+        self.assertIs(parts.props[0], parts.props[1])
+
+        parts = bigeo._explodeChunk(chunk, 'part')
+
+        self.assertIs(parts.props[0], parts.props[1])
+        self.assertEqual(parts.field('part'), [0, 1])
+        self.assertEqual(parts.take([1]).properties(), [{'name': 'a', 'part': 1}])
+
+        chunk = bigeo._Chunk(numpy.array([None, MultiPolygon(squares(3))], dtype=object), [{'name': 'a'}, {'name': 'b'}])
+        index, part = bigeo._partIndex(chunk.geoms)
+
+        self.assertEqual((index.tolist(), part.tolist()), ([0, 1, 1, 1], [0, 0, 1, 2]))
+
+        parts = bigeo._explodeChunk(chunk, 'part', index[2:], part[2:])
+
+        self.assertEqual([g.bounds[0] for g in parts.geoms], [2.0, 4.0])
+        self.assertEqual(parts.properties(), [{'name': 'b', 'part': 1}, {'name': 'b', 'part': 2}])
+
+        bigeo.Pipeline(self.path('multipolygon.shp')).explode('part').run(self.path('out.parquet'))
+
+        with bigeo._openSource(self.path('out.parquet')) as src:
+            self.assertEqual([f['properties']['part'] for f in src], [0, 1, 2, 0, 0])
+
+
+class Test_FieldTypeRemover(BigeoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        schema = {'geometry': 'Polygon', 'properties': {'name': 'str', 'area': 'float', 'created': 'date'}}
+        with fiona.open(self.path('polygon.shp'), 'w', driver='ESRI Shapefile', crs=CRS.from_epsg(4326), schema=schema) as dst:
+            for i, polygon in enumerate(squares(3)):
+                dst.write({'geometry': mapping(polygon), 'properties': {'name': str(i), 'area': 1.0, 'created': '2018-01-01'}})
+
+    def test_removeFieldTypes(self):
+
+        count = bigeo.FieldTypeRemover().removeFieldTypes(self.path('polygon.shp'), self.path('out.shp'))
+
+        self.assertEqual(count, 3)
+        self.assertEqual(list(bigeo.getSchema(self.path('out.shp'))['properties']), ['name', 'area'])
+
+    def test_fields_on_operations(self):
+
+        bigeo.CentroidCreator().getCentroids(self.path('polygon.shp'), self.path('centroids.shp'), fields=['name'])
+
+        self.assertEqual(readShp(self.path('centroids.shp'))[2][1], {'name': '2'})
+
+    def test_ignoredFields(self):
+
+        schema = bigeo.getSchema(self.path('polygon.shp'))
+
+        self.assertEqual(bigeo.ignoredFields(schema, fields=['name', 'created'], drop_types=['DATE']), ['area', 'created'])
+
+
+class Test_Columnar(BigeoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        properties = [{'id': i, 'name': 'n%s' % (i % 2), 'size': float(i)} for i in range(5)]
+        writeShp(self.path('polygon.shp'), 'Polygon', squares(5), properties)
+
+    def test_parquet_feather_round_trip(self):
+
+        import pyarrow.parquet as pq
+
+        self.assertEqual(bigeo.Pipeline(self.path('polygon.shp'), 2).run(self.path('polygon.parquet')), 5)
+
+        parquet = pq.ParquetFile(self.path('polygon.parquet'))
+        geo = json.loads(parquet.schema_arrow.metadata[b'geo'])
+
+        self.assertEqual(parquet.num_row_groups, 3)
+        self.assertEqual(geo['columns']['geometry']['encoding'], 'WKB')
+        self.assertEqual(bigeo.getCrs(self.path('polygon.parquet')).to_epsg(), 4326)
+        self.assertEqual(bigeo.getSchema(self.path('polygon.parquet')), \
+            {'geometry': 'Polygon', 'properties': {'id': 'int', 'name': 'str', 'size': 'float'}})
+
+        bigeo.CentroidCreator().getCentroids(self.path('polygon.parquet'), self.path('centroids.feather'), \
+            chunksize=2, fields=['name'])
+        bigeo.MultipartToSinglepart().explode(self.path('centroids.feather'), self.path('centroids.shp'))
+
+        features = readShp(self.path('centroids.shp'))
+
+        self.assertEqual([(g.x, g.y) for g, p in features], [(i * 2 + 0.5, 0.5) for i in range(5)])
+        self.assertEqual([p for g, p in features], [{'name': 'n%s' % (i % 2)} for i in range(5)])
+
+    def test_operations_on_arrow_props(self):
+
+        bigeo.Pipeline(self.path('polygon.shp')).run(self.path('polygon.parquet'))
+
+        dr = bigeo.DuplicatesRemover()
+        dr.removeDuplicates(self.path('polygon.parquet'), self.path('unique.parquet'), tolerance=100, fields=['name'])
+        self.assertEqual(dr.removed, 3)
+
+        bigeo.BufferCreator().getBuffer(self.path('polygon.parquet'), self.path('buffer.feather'), field='size')
+        stats = bigeo.PolygonOverlapsRemover().removeOverlaps(self.path('buffer.feather'), self.path('clean.shp'))
+
+        features = readShp(self.path('clean.shp'))
+
+        self.assertGreater(stats['overlaps'], 0)
+        self.assertEqual([p['id'] for g, p in features], [0, 1, 2, 3, 4])
+        self.assertFalse(features[1][0].intersection(features[2][0]).area)
+
+
+class Test_Metrics(BigeoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        writeShp(self.path('polygon.shp'), 'Polygon', squares(10))
+
+    def test_pipeline_metrics(self):
+
+        metrics = bigeo.Metrics()
+        bigeo.CentroidCreator().getCentroids(self.path('polygon.shp'), self.path('centroids.shp'), chunksize=3, \
+            metrics=metrics)
+
+        report = metrics.report()
+
+        self.assertEqual(report['features'], 10)
+        self.assertEqual(set(report['timers']), {'read', 'compute', 'write'})
+        self.assertEqual(report['counters']['dataset_bytes'], bigeo._datasetBytes(self.path('polygon.shp')))
+        self.assertGreater(report['counters']['bytes_written'], 0)
+
+        metrics.dump(self.path('metrics.json'))
+
+        with open(self.path('metrics.json')) as f:
+            self.assertEqual(json.load(f)['features'], 10)
+
+    def test_progress_and_merge(self):
+
+        metrics = bigeo.Metrics(progress_interval=0)
+
+        with self.assertLogs(level='INFO') as logs:
+            bigeo.MultipartToSinglepart().explode(self.path('polygon.shp'), self.path('parts.shp'), chunksize=4, \
+                metrics=metrics)
+
+        self.assertEqual(sum('Processed' in line for line in logs.output), 3)
+
+        os.makedirs(self.path('out'))
+        summary = bigeo.Reprojector().reproject(self.path(), self.path('out'), 'EPSG:3857', transform=True, \
+            metrics=metrics)
+
+        self.assertEqual([s['metrics']['features'] for s in summary], [s['features'] for s in summary])
+        self.assertEqual(metrics.counters['features'], 10 + sum(s['features'] for s in summary))
+
+
+class Test_PartitionedPipeline(BigeoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Squares placed so that the tiles do not follow the feature order.
+        geoms = [Polygon.from_bounds(x, y, x + 1, y + 1) for x, y in zip(range(0, 60, 3), [7, 1, 5, 0, 9] * 4)]
+        writeShp(self.path('polygon.shp'), 'Polygon', geoms, [{'id': i, 'name': 'n%s' % i} for i in range(20)])
+
+    def test_range_and_tile_keep_order(self):
+
+        bigeo.CentroidCreator().getCentroids(self.path('polygon.shp'), self.path('centroids.shp'), chunksize=3)
+
+        for partition in ('range', 'tile'):
+
+            cc = bigeo.CentroidCreator()
+            cc.getCentroids(self.path('polygon.shp'), self.path(partition + '.shp'), chunksize=3, workers=2, \
+                partition=partition)
+
+            self.assertEqual(cc.metrics.counters['features'], 20)
+            self.assertEqual(readShp(self.path(partition + '.shp')), readShp(self.path('centroids.shp')))
+
+            # Shapefiles are merged record by record, only the .dbf date may differ.
+            for extension in ('.shp', '.shx', '.dbf'):
+                with open(self.path(partition + extension), 'rb') as merged:
+                    with open(self.path('centroids' + extension), 'rb') as sequential:
+                        self.assertEqual(merged.read()[4:], sequential.read()[4:])
+
+    def test_tile_unordered_filtered_formats(self):
+
+        pipeline = bigeo.Pipeline(self.path('polygon.shp'), 4, bbox=(0, 0, 29, 10))
+        pipeline.explode('part').bbox()
+
+        self.assertEqual(pipeline.run(self.path('tiles.parquet'), workers=3, partition='tile', keep_order=False), 10)
+
+        with bigeo._openSource(self.path('tiles.parquet')) as src:
+            ids = [f['properties']['id'] for f in src]
+
+        self.assertEqual(sorted(ids), list(range(10)))
+        self.assertNotEqual(ids, list(range(10)))
+
+        pipeline = bigeo.Pipeline(self.path('polygon.shp'), 4, bbox=(0, 0, 29, 10)).add('centroids')
+        pipeline.run(self.path('tiles.geojson'), workers=3, partition='tile')
+
+        self.assertEqual([p['id'] for g, p in readShp(self.path('tiles.geojson'))], list(range(10)))
+
+        with self.assertRaises(ValueError):
+            bigeo.Pipeline(self.path('polygon.shp')).bbox().run(self.path('out.shp'), workers=2, partition='hex')
+
+
+class Test_Incremental(BigeoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        writeShp(self.path('polygon.shp'), 'Polygon', squares(10), [{'id': i, 'name': 'n'} for i in range(10)])
+
+    def test_recomputes_changed_features(self):
+
+        metrics = bigeo.Metrics()
+        bigeo.CentroidCreator().getCentroids(self.path('polygon.shp'), self.path('centroids.shp'), incremental=True, \
+            metrics=metrics)
+
+        self.assertEqual(metrics.counters['features_recomputed'], 10)
+        self.assertTrue(os.path.exists(self.path('centroids.manifest.npz')))
+
+        # Drops feature 3, moves feature 5, renames feature 7 and adds a feature.
+        geoms, properties = squares(12), [{'id': i, 'name': 'n'} for i in range(12)]
+        properties[7]['name'] = 'changed'
+        order = [0, 1, 2, 5, 4, 6, 7, 8, 9, 11]
+        writeShp(self.path('polygon.shp'), 'Polygon', [geoms[i] for i in order], [properties[i] for i in order])
+
+        metrics = bigeo.Metrics()
+        bigeo.CentroidCreator().getCentroids(self.path('polygon.shp'), self.path('centroids.shp'), incremental=True, \
+            metrics=metrics)
+        bigeo.CentroidCreator().getCentroids(self.path('polygon.shp'), self.path('full.shp'))
+
+        self.assertEqual(metrics.counters['features_recomputed'], 2)
+        self.assertEqual(metrics.counters['features_reused'], 8)
+        self.assertEqual(readShp(self.path('centroids.shp')), readShp(self.path('full.shp')))
+
+        metrics = bigeo.Metrics()
+        bigeo.CentroidCreator().getCentroids(self.path('polygon.shp'), self.path('centroids.shp'), incremental=True, \
+            metrics=metrics)
+
+        self.assertEqual(dict(metrics.counters), {'features_reused': 10})
+
+    def test_stale_manifest(self):
+
+        pipeline = bigeo.Pipeline(self.path('polygon.shp')).explode('part').bbox()
+        self.assertEqual(pipeline.run(self.path('boxes.parquet'), incremental=True), 10)
+
+        # Another operation on the same output recomputes everything.
+        pipeline = bigeo.Pipeline(self.path('polygon.shp')).centroids()
+        pipeline.run(self.path('boxes.parquet'), incremental=True)
+
+        self.assertEqual(pipeline.metrics.counters['features_recomputed'], 10)
+
+        writeShp(self.path('polygon.shp'), 'Polygon', squares(10)[::-1], [{'id': i, 'name': 'n'} for i in range(10)])
+        pipeline = bigeo.Pipeline(self.path('polygon.shp'), bbox=(0, 0, 9, 1)).centroids()
+        pipeline.run(self.path('boxes.parquet'), incremental=True)
+
+        self.assertEqual(pipeline.metrics.counters['features_recomputed'], 10)
+
+        with bigeo._openSource(self.path('boxes.parquet')) as src:
+            self.assertEqual([f['properties']['id'] for f in src], [5, 6, 7, 8, 9])
+
+
+class Test_PipelinedIO(BigeoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        writeShp(self.path('polygon.shp'), 'Polygon', squares(10), [{'id': i} for i in range(10)])
+
+    def test_queues(self):
+
+        metrics = bigeo.Metrics()
+        bigeo.CentroidCreator().getCentroids(self.path('polygon.shp'), self.path('queued.shp'), chunksize=3, \
+            metrics=metrics, read_queue=2, write_queue=1)
+        bigeo.CentroidCreator().getCentroids(self.path('polygon.shp'), self.path('single.shp'), chunksize=3)
+
+        self.assertEqual(readShp(self.path('queued.shp')), readShp(self.path('single.shp')))
+        self.assertEqual(metrics.counters['features'], 10)
+        self.assertTrue({'read_stall', 'compute_stall_read', 'compute_stall_write', 'write_stall'} <= set(metrics.timers))
+
+        os.mkdir(self.path('out'))
+        reproj = bigeo.Reprojector()
+        reproj.reproject(self.tmpdir, self.path('out'), 'EPSG:3857', read_queue=2, write_queue=2, chunksize=4)
+        self.assertEqual([s['features'] for s in reproj.summary], [10, 10, 10])
+
+    def test_errors(self):
+
+        def failing():
+            yield 1
+            raise ValueError('read')
+
+        with self.assertRaises(ValueError):
+            list(bigeo._readAhead(failing(), 1, bigeo.Metrics()))
+
+        written = []
+
+        def write(item):
+            if item == 2:
+                raise IOError('write')
+            written.append(item)
+
+        with self.assertRaises(IOError):
+            with bigeo._writeBehind(write, 1, bigeo.Metrics()) as put:
+                for item in range(5):
+                    put(item)
+
+        self.assertEqual(written, [0, 1])
+
+
+class Test_MultiOutputCreator(BigeoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        writeShp(self.path('polygon.shp'), 'Polygon', squares(4), [{'id': i, 'name': 'n%s' % i} for i in range(4)])
+
+    def test_getOutputs(self):
+
+        mo = bigeo.MultiOutputCreator()
+        counts = mo.getOutputs(self.path('polygon.shp'), {'bbox': self.path('bbox.shp'), \
+            'centroids': self.path('centroids.shp'), 'representativepoint': self.path('reppoints.parquet')}, chunksize=3)
+
+        self.assertEqual(counts, {'bbox': 4, 'centroids': 4, 'representativepoint': 4})
+        self.assertEqual(mo.metrics.counters['dataset_bytes'], bigeo._datasetBytes(self.path('polygon.shp')))
+
+        bigeo.CentroidCreator().getCentroids(self.path('polygon.shp'), self.path('single.shp'))
+
+        self.assertEqual(readShp(self.path('centroids.shp')), readShp(self.path('single.shp')))
+        self.assertEqual([g.bounds for g, p in readShp(self.path('bbox.shp'))], [g.bounds for g in squares(4)])
+
+        with bigeo._openSource(self.path('reppoints.parquet')) as src:
+            self.assertEqual([f['properties']['name'] for f in src], ['n0', 'n1', 'n2', 'n3'])
+
+        with self.assertRaises(ValueError):
+            mo.getOutputs(self.path('polygon.shp'), {'convexhull': self.path('hull.shp')})
+
+        with self.assertRaises(ValueError):
+            mo.getOutputs(self.path('polygon.shp'), {'bbox': self.path('out.shp'), 'centroids': self.path('out.shp')})
+
+    def test_runOutputs_branches(self):
+
+        pipeline = bigeo.Pipeline(self.path('polygon.shp'), bbox=(0, 0, 3, 1)).reproject('EPSG:3857')
+        counts = pipeline.runOutputs({self.path('points.shp'): 'centroids;buffer:1', self.path('all.shp'): []})
+
+        self.assertEqual(list(counts.values()), [2, 2])
+        self.assertEqual(bigeo.getSchema(self.path('points.shp'))['geometry'], 'Polygon')
+        self.assertEqual(bigeo.getCrs(self.path('all.shp')).to_epsg(), 3857)
+
+
+class Test_Daemon(BigeoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        writeShp(self.path('polygon.shp'), 'Polygon', squares(4), [{'id': i} for i in range(4)])
+
+    def request(self, method, url, body=None):
+
+        from urllib.request import Request, urlopen
+        from urllib.error import HTTPError
+
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+
+        try:
+            with urlopen(Request(url, data=data, method=method)) as response:
+                return response.status, json.loads(response.read())
+        except HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    def test_http_jobs(self):
+
+        daemon = bigeo.Daemon(workers=1)
+
+        try:
+            host, port = daemon.listen(port=0)
+            url = 'http://%s:%s' % (host, port)
+
+            code, job = self.request('POST', url + '/jobs', {'algo': 'centroids', \
+                'options': {'srcfile': self.path('polygon.shp'), 'outfile': self.path('point.shp')}})
+            self.assertEqual(code, 202)
+
+            code, status = self.request('GET', url + '/jobs/%s?wait=60' % job['id'])
+            self.assertEqual(status['status'], 'done')
+            self.assertEqual(status['metrics']['features'], 4)
+            self.assertGreaterEqual(status['run_seconds'], 0)
+            self.assertEqual([g.bounds for g, p in readShp(self.path('point.shp'))][1], (2.5, 0.5, 2.5, 0.5))
+
+            code, job = self.request('POST', url + '/jobs', {'algo': 'centroids', \
+                'options': {'srcfile': self.path('missing.shp'), 'outfile': self.path('none.shp')}})
+            self.assertEqual(daemon.status(job['id'], wait=60)['status'], 'failed')
+
+            self.assertEqual(self.request('POST', url + '/jobs', {'algo': 'rm'})[0], 400)
+            self.assertEqual(self.request('POST', url + '/jobs', {'algo': 'centroids', 'options': {'nope': 1}})[0], 400)
+            self.assertEqual(self.request('GET', url + '/jobs/99')[0], 404)
+            self.assertEqual(self.request('GET', url + '/status')[1]['jobs'], {'done': 1, 'failed': 1})
+        finally:
+            daemon.shutdown()
+
+    def test_jobArgs(self):
+
+        args = bigeo._jobArgs('boundingbox', {'srcfile': 'p.shp', 'chunksize': '2', 'incremental': True, \
+            'fields': ['id', 'name'], 'metrics-json': 'm.json', 'mask': None})
+
+        self.assertEqual((args.chunksize, args.incremental, args.fields, args.metrics_json), (2, True, 'id,name', 'm.json'))
+
+        for options in ({'chunksize': 'two'}, {'incremental': 'yes'}, {'algo_processor': 'buffer'}):
+            with self.assertRaises(ValueError):
+                bigeo._jobArgs('boundingbox', options)
+
+    def test_layer_cache(self):
+
+        cache = bigeo._LRUCache(2)
+        cache.get('a', lambda: 1)
+        cache.get('b', lambda: 2)
+        cache.get('a', lambda: 0)
+        cache.get('c', lambda: 3)
+
+        self.assertEqual(list(cache.items), ['a', 'c'])
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+
+        schema = bigeo.getSchema(self.path('polygon.shp'))
+        schema['properties'].clear()
+        self.assertEqual(list(bigeo.getSchema(self.path('polygon.shp'))['properties']), ['id'])
+
+        writeShp(self.path('polygon.shp'), 'Polygon', squares(2), [{'name': 'a'}, {'name': 'b'}])
+        self.assertEqual(list(bigeo.getSchema(self.path('polygon.shp'))['properties']), ['name'])
+        self.assertEqual(bigeo._MappedShapefile.open(self.path('polygon.shp')).count, 2)
+
+    def test_layer_cache_replaced(self):
+
+        writeShp(self.path('a.shp'), 'Point', [Point(1, 1)])
+        writeShp(self.path('b.shp'), 'Point', [Point(2, 2)])
+
+        mapped = bigeo._MappedShapefile.open(self.path('a.shp'))
+        stat = os.stat(self.path('a.shp'))
+
+        # Same size and mtime, only the replaced file tells them apart.
+        for extension in ('.shp', '.shx', '.dbf'):
+            os.replace(self.path('b' + extension), self.path('a' + extension))
+        os.utime(self.path('a.shp'), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        replaced = bigeo._MappedShapefile.open(self.path('a.shp'))
+
+        self.assertIsNot(replaced, mapped)
+        self.assertEqual(replaced.coordinates(0, 1).tolist(), [[2.0, 2.0]])
+        self.assertIs(bigeo._MappedShapefile.open(os.path.join(self.tmpdir, '.', 'a.shp')), replaced)
+        self.assertEqual([key for key in bigeo._LAYER_CACHE.items if key[1] == os.path.abspath(self.path('a.shp'))], \
+            [('mapped', os.path.abspath(self.path('a.shp')))])
+
+
+class Test_Catalog(BigeoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs(self.path('data', 'sub'))
+        writeShp(self.path('data', 'polygon.shp'), 'Polygon', squares(3), [{'id': i} for i in range(3)])
+        writeShp(self.path('data', 'sub', 'point.shp'), 'Point', [Point(1, 2), Point(3, 4)], [{'name': 'a'}, {'name': 'b'}])
+
+    def test_scan(self):
+
+        catalog = bigeo.Catalog(self.path('catalog.sqlite'))
+
+        summary = catalog.scan(self.path('data'), workers=1)
+        self.assertEqual((summary['layers'], summary['scanned'], summary['failed']), (2, 2, 0))
+        self.assertEqual(catalog.scan(self.path('data'), workers=1)['unchanged'], 2)
+
+        layer = catalog.layer(self.path('data', 'sub', 'point.shp'), refresh=False)
+        self.assertEqual((layer['count'], layer['extent'], layer['crs'].to_epsg()), (2, (1, 2, 3, 4), 4326))
+        self.assertEqual(list(layer['schema']['properties']), ['name'])
+
+        writeShp(self.path('data', 'polygon.shp'), 'Polygon', squares(5), [{'id': i} for i in range(5)])
+        os.remove(self.path('data', 'sub', 'point.shp'))
+
+        summary = catalog.scan(self.path('data'), workers=1)
+        self.assertEqual((summary['scanned'], summary['removed']), (1, 1))
+        self.assertEqual(catalog.layer(self.path('data', 'polygon.shp'), refresh=False)['count'], 5)
+        self.assertEqual([layer['count'] for layer in catalog.layers(self.path('data'), recursive=True)], [5])
+
+    def test_columnar_extent(self):
+
+        bigeo.Pipeline(self.path('data', 'polygon.shp')).run(self.path('data', 'polygon.parquet'))
+        bigeo.Pipeline(self.path('data', 'polygon.shp')).run(self.path('data', 'polygon.feather'))
+
+        with bigeo._openSource(self.path('data', 'polygon.parquet')) as src:
+            self.assertEqual(src.bounds, (0, 0, 5, 1))
+
+        catalog = bigeo.Catalog(self.path('catalog.sqlite'))
+
+        self.assertEqual(catalog.layer(self.path('data', 'polygon.parquet'))['extent'], (0, 0, 5, 1))
+        self.assertIsNone(catalog.layer(self.path('data', 'polygon.feather'))['extent'])
+
+        self.assertEqual(catalog.scan(self.path('data'), workers=1)['scanned'], 3)
+        self.assertEqual(catalog.layer(self.path('data', 'polygon.feather'))['extent'], (0, 0, 5, 1))
+
+    def test_useCatalog(self):
+
+        catalog = bigeo.useCatalog(self.path('catalog.sqlite'))
+
+        try:
+            self.assertEqual(list(bigeo.getSchema(self.path('data', 'polygon.shp'))['properties']), ['id'])
+            self.assertIsNotNone(catalog.layer(self.path('data', 'polygon.shp'), refresh=False))
+
+            os.mkdir(self.path('out'))
+            reproj = bigeo.Reprojector()
+            reproj.reproject(self.path('data'), self.path('out'), 'EPSG:3857')
+            self.assertEqual([s['features'] for s in reproj.summary], [3])
+            self.assertEqual(bigeo.getCrs(self.path('out', 'polygon.shp')).to_epsg(), 3857)
+        finally:
+            bigeo.useCatalog(None)
+
+
+class Test_OpenWeatherBatched(BigeoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        with open(self.path('openweather_id.txt'), 'w') as f:
+            f.write(','.join(str(1701668 + i) for i in range(45)))
+
+    def test_getWeather_batches(self):
+
+        with StubOpenWeatherServer() as stub:
+            count = bigeo.OpenWeather().getWeather(self.path('openweather_id.txt'), 'KEY', self.path('wx.shp'), url=stub.url)
+
+        features = readShp(self.path('wx.shp'))
+
+        self.assertEqual(count, 45)
+        self.assertEqual(stub.requests, 3)
+        self.assertEqual(features[44][1]['city'], 'city1701712')
+
+    def test_getWeather_cache(self):
+
+        with StubOpenWeatherServer() as stub:
+            ow = bigeo.OpenWeather()
+            ow.getWeather(self.path('openweather_id.txt'), 'KEY', self.path('wx.shp'), url=stub.url, cache_dir=self.path('cache'))
+            ow.getWeather(self.path('openweather_id.txt'), 'KEY', self.path('wx2.shp'), url=stub.url, cache_dir=self.path('cache'))
+            self.assertEqual(stub.requests, 3)
+
+            ow.getWeather(self.path('openweather_id.txt'), 'KEY', self.path('wx3.shp'), url=stub.url, cache_dir=self.path('cache'), ttl=-1)
+            self.assertEqual(stub.requests, 6)
 
+        self.assertEqual(len(readShp(self.path('wx2.shp'))), 45)
 
 
 if __name__ == '__main__':